@@ -1,5 +1,6 @@
 # aarogya_buddy_backend/settings.py
 
+import tempfile
 from pathlib import Path
 from decouple import config
 from datetime import timedelta
@@ -165,5 +166,153 @@ EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='your-email@gmail.com')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='your-password')
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Medicine lookup settings
+# 'live' hits the real sites, 'record' also saves every response as a fixture,
+# 'replay' serves saved fixtures only (for CI and air-gapped machines).
+MEDICINE_HTTP_MODE = config('MEDICINE_HTTP_MODE', default='live')
+MEDICINE_HTTP_FIXTURES_DIR = config('MEDICINE_HTTP_FIXTURES_DIR', default=str(BASE_DIR / 'medicines' / 'http_fixtures'))
+
+# Circuit breakers for the fallback drug sites (drugs.com, rxlist, webmd, medscape)
+MEDICINE_SOURCE_WINDOW_SIZE = config('MEDICINE_SOURCE_WINDOW_SIZE', default=20, cast=int)  # Calls kept per source
+MEDICINE_SOURCE_WINDOW_SECONDS = config('MEDICINE_SOURCE_WINDOW_SECONDS', default=600, cast=int)
+MEDICINE_SOURCE_MIN_CALLS = config('MEDICINE_SOURCE_MIN_CALLS', default=4, cast=int)  # Before a breaker may open
+MEDICINE_SOURCE_FAILURE_RATE = config('MEDICINE_SOURCE_FAILURE_RATE', default=0.5, cast=float)
+MEDICINE_SOURCE_SLOW_CALL_SECONDS = config('MEDICINE_SOURCE_SLOW_CALL_SECONDS', default=8.0, cast=float)
+MEDICINE_SOURCE_OPEN_SECONDS = config('MEDICINE_SOURCE_OPEN_SECONDS', default=120, cast=int)  # Cool-down before a probe
+
+# Phrases in the medicine dataset's contraindication / side-effect / treats
+# columns that name no condition; the interaction index drops them as terms
+# (re-run load_medicines after changing this list)
+MEDICINE_IGNORED_TERMS = [
+    'rare', 'other', 'varies', 'none widely', 'consult practitioner', 'generally safe', 'known hypersensitivity',
+    'hypersensitivity', 'allergy to ingredients', 'caution with meds', 'to be used under medical supervision',
+    'long-term use may affect b12 levels',
+]
+
+# Single-flight coalescing of identical concurrent external lookups (shared by all workers on a host)
+MEDICINE_SINGLE_FLIGHT_DIR = config('MEDICINE_SINGLE_FLIGHT_DIR', default=str(Path(tempfile.gettempdir()) / 'aarogya_buddy_lookups'))
+MEDICINE_SINGLE_FLIGHT_WAIT_SECONDS = config('MEDICINE_SINGLE_FLIGHT_WAIT_SECONDS', default=60, cast=int)
+MEDICINE_SINGLE_FLIGHT_RESULT_TTL = config('MEDICINE_SINGLE_FLIGHT_RESULT_TTL', default=30, cast=int)
+
+# Cached external lookups: served as-is before the soft TTL, served stale while a
+# background refresh runs until the hard TTL, fetched synchronously after that
+MEDICINE_EXTERNAL_SOFT_TTL_SECONDS = config('MEDICINE_EXTERNAL_SOFT_TTL_SECONDS', default=24 * 3600, cast=int)
+MEDICINE_EXTERNAL_HARD_TTL_SECONDS = config('MEDICINE_EXTERNAL_HARD_TTL_SECONDS', default=30 * 24 * 3600, cast=int)
+# "Not found" results (every source answered without the drug) expire sooner and are not served stale;
+# results missing because sources failed are never cached
+MEDICINE_NEGATIVE_TTL_SECONDS = config('MEDICINE_NEGATIVE_TTL_SECONDS', default=3600, cast=int)
+MEDICINE_REFRESH_WORKERS = config('MEDICINE_REFRESH_WORKERS', default=2, cast=int)
+
+# Bulk lookup endpoint (prescriptions): max names per call and shared deadline for external misses
+MEDICINE_BULK_LOOKUP_MAX_NAMES = config('MEDICINE_BULK_LOOKUP_MAX_NAMES', default=25, cast=int)
+MEDICINE_BULK_LOOKUP_DEADLINE_SECONDS = config('MEDICINE_BULK_LOOKUP_DEADLINE_SECONDS', default=20, cast=float)
+# Threads shared by all bulk lookups; lookups past the deadline finish here and are still cached
+MEDICINE_BULK_LOOKUP_WORKERS = config('MEDICINE_BULK_LOOKUP_WORKERS', default=8, cast=int)
+
+# Uploaded files (report uploads waiting for analysis)
+MEDIA_URL = 'media/'
+MEDIA_ROOT = config('MEDIA_ROOT', default=str(BASE_DIR / 'media'))
+# Uploads bigger than FILE_UPLOAD_MAX_MEMORY_SIZE are spooled to a temporary file
+# instead of memory; report files bigger than REPORT_UPLOAD_MAX_BYTES are refused
+FILE_UPLOAD_MAX_MEMORY_SIZE = config('FILE_UPLOAD_MAX_MEMORY_SIZE', default=2 * 1024 * 1024, cast=int)
+REPORT_UPLOAD_MAX_BYTES = config('REPORT_UPLOAD_MAX_BYTES', default=10 * 1024 * 1024, cast=int)
+
+# Report analysis jobs. Jobs are queued in the database and picked up by the
+# process_report_jobs command; REPORT_JOB_IN_PROCESS_WORKERS threads inside the
+# web process also pick them up (set it to 0 when dedicated workers run).
+REPORT_JOB_IN_PROCESS_WORKERS = config('REPORT_JOB_IN_PROCESS_WORKERS', default=2, cast=int)
+REPORT_JOB_POLL_SECONDS = config('REPORT_JOB_POLL_SECONDS', default=2.0, cast=float)
+REPORT_JOB_STALE_SECONDS = config('REPORT_JOB_STALE_SECONDS', default=600, cast=int)  # Claimed jobs older than this are retried
+# Running jobs refresh their updated_at this often, so only a dead worker's jobs go stale
+REPORT_JOB_HEARTBEAT_SECONDS = config('REPORT_JOB_HEARTBEAT_SECONDS', default=60, cast=float)
+REPORT_JOB_MAX_ATTEMPTS = config('REPORT_JOB_MAX_ATTEMPTS', default=2, cast=int)
+
+# OCR of scanned PDF reports. Only pages whose text layer has fewer than
+# REPORT_PAGE_MIN_TEXT_CHARS characters are OCR'd, at most REPORT_OCR_MAX_PAGES
+# of them; REPORT_OCR_WORKERS processes OCR pages in parallel (0 = one per CPU core)
+REPORT_PAGE_MIN_TEXT_CHARS = config('REPORT_PAGE_MIN_TEXT_CHARS', default=50, cast=int)
+REPORT_OCR_MAX_PAGES = config('REPORT_OCR_MAX_PAGES', default=20, cast=int)
+REPORT_OCR_WORKERS = config('REPORT_OCR_WORKERS', default=0, cast=int)
+# Image preprocessing before OCR: PDF pages are rendered at REPORT_OCR_DPI, any
+# image is shrunk to REPORT_OCR_MAX_SIDE pixels on its long side (0 = no limit),
+# then converted by REPORT_OCR_COLOR_MODE ('none', 'gray' or 'binary') and
+# optionally deskewed. Compare settings with `manage.py benchmark_ocr`.
+REPORT_OCR_DPI = config('REPORT_OCR_DPI', default=200, cast=int)
+REPORT_OCR_MAX_SIDE = config('REPORT_OCR_MAX_SIDE', default=2500, cast=int)
+REPORT_OCR_COLOR_MODE = config('REPORT_OCR_COLOR_MODE', default='gray')
+REPORT_OCR_DESKEW = config('REPORT_OCR_DESKEW', default=False, cast=bool)
+# OCR each worker's pages with a single Tesseract run over a list of image files
+REPORT_OCR_BATCH = config('REPORT_OCR_BATCH', default=True, cast=bool)
+
+# Caches. 'reports' holds extracted text and analyses of uploaded reports keyed
+# by the SHA-256 of the file, on disk so all workers share it; when it is full
+# a quarter of the entries are evicted. 'medicines' holds the version of the
+# interaction index's terms, so a rebuild in any process reloads all of them.
+# 'dashboard' holds each user's rendered
+# dashboard under a versioned key; it is shared by all workers so a change
+# made through one worker invalidates the payload for all of them.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'reports': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('REPORT_CACHE_DIR', default=str(Path(tempfile.gettempdir()) / 'aarogya_buddy_reports')),
+        'TIMEOUT': config('REPORT_CACHE_TTL_SECONDS', default=30 * 24 * 3600, cast=int),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('REPORT_CACHE_MAX_ENTRIES', default=2000, cast=int),
+            'CULL_FREQUENCY': 4,
+        },
+    },
+    'medicines': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('MEDICINE_CACHE_DIR', default=str(Path(tempfile.gettempdir()) / 'aarogya_buddy_medicines')),
+        'TIMEOUT': None,
+    },
+    'dashboard': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('DASHBOARD_CACHE_DIR', default=str(Path(tempfile.gettempdir()) / 'aarogya_buddy_dashboard')),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('DASHBOARD_CACHE_MAX_ENTRIES', default=10000, cast=int),
+            'CULL_FREQUENCY': 4,
+        },
+    },
+}
+# Upper bound on how long a cached dashboard is served; edits invalidate it sooner
+DASHBOARD_CACHE_TTL_SECONDS = config('DASHBOARD_CACHE_TTL_SECONDS', default=15 * 60, cast=int)
+
+# Gemini (report analysis). The base URL can point at a local stub server for tests.
+GEMINI_API_BASE_URL = config('GEMINI_API_BASE_URL', default='https://generativelanguage.googleapis.com/v1beta')
+GEMINI_MODEL = config('GEMINI_MODEL', default='gemini-1.5-flash')
+GEMINI_STREAM_READ_TIMEOUT_SECONDS = config('GEMINI_STREAM_READ_TIMEOUT_SECONDS', default=30, cast=float)  # Max gap between chunks
+# Cleaned report text above REPORT_LLM_MAX_INPUT_TOKENS (estimated) is split into
+# REPORT_LLM_CHUNK_TOKENS chunks, condensed by up to REPORT_LLM_MAX_PARALLEL_CALLS
+# concurrent calls, and the notes are combined in one final call
+REPORT_LLM_MAX_INPUT_TOKENS = config('REPORT_LLM_MAX_INPUT_TOKENS', default=8000, cast=int)
+REPORT_LLM_CHUNK_TOKENS = config('REPORT_LLM_CHUNK_TOKENS', default=3000, cast=int)
+REPORT_LLM_MAX_PARALLEL_CALLS = config('REPORT_LLM_MAX_PARALLEL_CALLS', default=4, cast=int)
+# Every LLM call goes through report_analysis/llm_client.py. REPORT_LLM_BACKEND is
+# 'gemini', 'stub' (a canned answer after REPORT_LLM_STUB_DELAY_SECONDS, for tests
+# and load tests) or the dotted path of a backend class. At most
+# REPORT_LLM_MAX_CONCURRENT_CALLS calls run at once per process, and each must
+# finish within REPORT_LLM_TIMEOUT_SECONDS, including up to REPORT_LLM_MAX_RETRIES
+# retries of 429/5xx/connection errors with jittered exponential backoff
+REPORT_LLM_BACKEND = config('REPORT_LLM_BACKEND', default='gemini')
+REPORT_LLM_MAX_CONCURRENT_CALLS = config('REPORT_LLM_MAX_CONCURRENT_CALLS', default=8, cast=int)
+REPORT_LLM_TIMEOUT_SECONDS = config('REPORT_LLM_TIMEOUT_SECONDS', default=60.0, cast=float)
+REPORT_LLM_CONNECT_TIMEOUT_SECONDS = config('REPORT_LLM_CONNECT_TIMEOUT_SECONDS', default=5.0, cast=float)
+REPORT_LLM_MAX_RETRIES = config('REPORT_LLM_MAX_RETRIES', default=2, cast=int)
+REPORT_LLM_RETRY_BACKOFF_SECONDS = config('REPORT_LLM_RETRY_BACKOFF_SECONDS', default=0.5, cast=float)
+REPORT_LLM_STUB_DELAY_SECONDS = config('REPORT_LLM_STUB_DELAY_SECONDS', default=0.2, cast=float)
+# Lab values recognised in the report text are flagged locally against a
+# reference-range table. REPORT_LLM_ENRICHMENT says when the LLM is asked as
+# well: 'auto' only when no lab values were recognised, 'always' or 'never'.
+# Clients can override it per upload with the `enrich` field
+REPORT_LLM_ENRICHMENT = config('REPORT_LLM_ENRICHMENT', default='auto')
+# If the LLM has not answered within REPORT_LLM_LATENCY_BUDGET_SECONDS, the local
+# summary is returned and the LLM answer is attached to the report job when it
+# arrives (0 = always wait for the LLM)
+REPORT_LLM_LATENCY_BUDGET_SECONDS = config('REPORT_LLM_LATENCY_BUDGET_SECONDS', default=4.0, cast=float)
+
 # --- VERIFICATION PRINT STATEMENT ---
 print("!!! AAROGYA BUDDY SETTINGS LOADED - PERMISSIONS ARE SET TO AllowAny !!!")
\ No newline at end of file
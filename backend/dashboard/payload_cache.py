@@ -0,0 +1,135 @@
+# dashboard/payload_cache.py
+
+"""
+Per-user cache of the dashboard payload.
+
+The payload only changes when the user logs a weight or a meal, edits their
+profile or gets a symptom check logged, so it is cached under a key that
+carries a per-user version token. Every save or delete of one of those rows
+replaces the token with a new random one (once the transaction commits), which
+makes the old payload unreachable: a request that was still rendering from
+pre-change data writes its result under the old token and it is never read.
+Tokens are never reused, so a version key the file cache culled gets a fresh
+token too and cannot match a payload written before. The key also carries
+today's date, since the diet tracker and the 30-day weight window roll over
+at midnight.
+"""
+
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from users.models import CustomUser, UserProfile
+from .models import DailyMealLog, SymptomLog, WeightLog
+
+# Bump when the payload format changes so old payloads are not served
+PAYLOAD_VERSION = 1
+
+
+class CacheMetrics:
+    """Thread-safe hit/miss counters for this process; snapshot() is what the metrics endpoint shows."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def invalidated(self):
+        with self._lock:
+            self.invalidations += 1
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+metrics = CacheMetrics()
+
+
+def _cache():
+    return caches['dashboard']
+
+
+def _version_key(user_id):
+    return f'dashboard-version:{user_id}'
+
+
+def _new_version():
+    return uuid.uuid4().hex
+
+
+def _current_version(cache, user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:  # First load, or the key was culled; add() keeps a token another request just set
+        version = _new_version()
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+def _payload_key(user_id, version):
+    return f'dashboard:v{PAYLOAD_VERSION}:{user_id}:{version}:{timezone.now().date()}'
+
+
+def get_payload(user_id, build):
+    """The cached dashboard payload for this user, calling build(user_id) to fill it on a miss."""
+    cache = _cache()
+    key = _payload_key(user_id, _current_version(cache, user_id))
+    payload = cache.get(key)
+    if payload is not None:
+        metrics.hit()
+        return payload
+
+    metrics.miss()
+    payload = build(user_id)
+    cache.set(key, payload, settings.DASHBOARD_CACHE_TTL_SECONDS)
+    return payload
+
+
+def bump_version(user_id):
+    """Make every cached payload of this user stale."""
+    # A plain set: whichever of two concurrent bumps wins, the token is new
+    _cache().set(_version_key(user_id), _new_version(), None)
+    metrics.invalidated()
+
+
+def invalidate(user_id):
+    """Bump the user's version once the current transaction commits (immediately outside one)."""
+    transaction.on_commit(lambda: bump_version(user_id))
+
+
+@receiver([post_save, post_delete], sender=WeightLog)
+@receiver([post_save, post_delete], sender=DailyMealLog)
+@receiver([post_save, post_delete], sender=SymptomLog)
+@receiver([post_save, post_delete], sender=UserProfile)
+def _invalidate_on_change(sender, instance, **kwargs):
+    invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=CustomUser)
+def _invalidate_on_user_change(sender, instance, created, **kwargs):
+    # The payload shows the username
+    if not created:
+        invalidate(instance.pk)
@@ -1,3 +1,146 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from users.models import UserProfile
+from .models import SymptomLog, WeightLog, DailyMealLog
+from . import payload_cache
+
+User = get_user_model()
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default-tests'},
+    'dashboard': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'dashboard-tests'},
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DashboardDataTest(TestCase):
+    # The user with their profile, symptom checks, weights and today's meal log
+    DASHBOARD_QUERIES = 4
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='dash', email='dash@example.com', password='pw-12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        caches['dashboard'].clear()
+        self.addCleanup(caches['dashboard'].clear)
+
+    def get_dashboard(self):
+        response = self.client.get(reverse('dashboard-data'))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_get_without_meal_log_does_not_write(self):
+        with self.assertNumQueries(self.DASHBOARD_QUERIES):
+            data = self.get_dashboard()
+
+        self.assertFalse(DailyMealLog.objects.exists())
+        self.assertEqual(data['diet_tracker'], {
+            'date': str(timezone.now().date()),
+            'breakfast_completed': False,
+            'lunch_completed': False,
+            'dinner_completed': False,
+        })
+        self.assertEqual(data['health_snapshot']['bmi']['value'], 'N/A')
+        self.assertEqual(data['user'], {'username': 'dash'})
+
+    def test_query_count_does_not_grow_with_data(self):
+        UserProfile.objects.create(user=self.user, age=30, gender='Male', weight_kg=70, height_cm=175)
+        today = timezone.now().date()
+        for days in range(10):
+            WeightLog.objects.create(user=self.user, timestamp=today - timedelta(days=days), weight_kg=70 + days)
+            SymptomLog.objects.create(user=self.user, predicted_disease=f'Disease {days}')
+        DailyMealLog.objects.create(user=self.user, date=today, lunch_completed=True)
+
+        with self.assertNumQueries(self.DASHBOARD_QUERIES):
+            data = self.get_dashboard()
+
+        self.assertEqual(data['health_snapshot']['bmi'], {'value': 22.86, 'category': 'Normal weight'})
+        self.assertEqual(data['health_snapshot']['bmr'], {'value': 1649})
+        self.assertEqual(len(data['symptom_history']), 3)
+        self.assertEqual(len(data['weight_progress']), 10)
+        self.assertTrue(data['diet_tracker']['lunch_completed'])
+        self.assertEqual(DailyMealLog.objects.count(), 1)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DashboardCacheTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cached', email='cached@example.com', password='pw-12345')
+        self.profile = UserProfile.objects.create(user=self.user, age=30, gender='Female', weight_kg=60, height_cm=165)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        caches['dashboard'].clear()
+        self.addCleanup(caches['dashboard'].clear)
+
+    def get_dashboard(self):
+        response = self.client.get(reverse('dashboard-data'))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_repeat_load_is_served_from_cache(self):
+        before = payload_cache.metrics.snapshot()
+        first = self.get_dashboard()
+        with self.assertNumQueries(0):
+            second = self.get_dashboard()
+
+        self.assertEqual(first, second)
+        after = payload_cache.metrics.snapshot()
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+
+    def test_logging_weight_and_meals_invalidates(self):
+        self.get_dashboard()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('log-weight'), {'weight': 58.5}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_dashboard()['weight_progress'][-1]['weight_kg'], 58.5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('log-meal'), {'meal': 'breakfast_completed', 'status': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(self.get_dashboard()['diet_tracker']['breakfast_completed'])
+
+    def test_profile_and_symptom_changes_invalidate(self):
+        self.assertEqual(self.get_dashboard()['symptom_history'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SymptomLog.objects.create(user=self.user, predicted_disease='Migraine')
+            self.profile.weight_kg = 70
+            self.profile.save()
+        data = self.get_dashboard()
+        self.assertEqual(data['symptom_history'][0]['predicted_disease'], 'Migraine')
+        self.assertEqual(data['health_snapshot']['bmi']['value'], 25.71)
+
+    def test_lost_version_does_not_serve_an_old_payload(self):
+        self.get_dashboard()
+        WeightLog.objects.create(user=self.user, timestamp=timezone.now().date(), weight_kg=61)
+        # As if the file cache culled the version key (and no invalidation ran)
+        caches['dashboard'].delete(payload_cache._version_key(self.user.pk))
+
+        self.assertEqual(self.get_dashboard()['weight_progress'][-1]['weight_kg'], 61)
+        with self.assertNumQueries(0):
+            self.get_dashboard()
+
+    def test_other_users_are_not_invalidated(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='pw-12345')
+        self.get_dashboard()
+        with self.captureOnCommitCallbacks(execute=True):
+            WeightLog.objects.create(user=other, timestamp=timezone.now().date(), weight_kg=80)
+        with self.assertNumQueries(0):
+            self.get_dashboard()
+
+    def test_metrics_are_admin_only(self):
+        self.assertEqual(self.client.get(reverse('dashboard-cache-metrics')).status_code, 403)
+
+        admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pw-12345')
+        self.client.force_authenticate(admin)
+        self.get_dashboard()
+        response = self.client.get(reverse('dashboard-cache-metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {'hits', 'misses', 'invalidations', 'hit_rate'})
@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import DashboardDataView, UpdateMealLogView, LogWeightView
+from .views import DashboardDataView, UpdateMealLogView, LogWeightView, DashboardCacheMetricsView
 
 urlpatterns = [
     path('data/', DashboardDataView.as_view(), name='dashboard-data'),
     path('log-meal/', UpdateMealLogView.as_view(), name='log-meal'),
     path('log-weight/', LogWeightView.as_view(), name='log-weight'),
+    path('cache/metrics/', DashboardCacheMetricsView.as_view(), name='dashboard-cache-metrics'),
 ]
\ No newline at end of file
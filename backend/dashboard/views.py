@@ -1,105 +1,113 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework import status
 from .models import SymptomLog, WeightLog, DailyMealLog
 from .serializers import SymptomLogSerializer, WeightLogSerializer, DailyMealLogSerializer
+from . import payload_cache
+from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import timedelta
 from django.db import transaction, IntegrityError
+import logging
 import time
 
+logger = logging.getLogger(__name__)
+
+
+def health_snapshot(profile):
+    """BMI and BMR from the user's profile (None if there is no profile yet)."""
+    bmi_data = {"value": "N/A", "category": "Please complete your profile"}
+    bmr_data = {"value": "N/A"}
+    if profile is None:
+        return {'bmi': bmi_data, 'bmr': bmr_data}
+    try:
+        # Cast to ensure types are correct
+        weight = float(profile.weight_kg or 0)
+        height = float(profile.height_cm or 0)
+        age = int(profile.age or 0)
+        gender = profile.gender
+
+        if weight > 0 and height > 0 and age > 0 and gender:
+            height_m = height / 100
+            bmi = weight / (height_m ** 2)
+            bmi = round(bmi, 2)
+            if bmi < 18.5:
+                category = "Underweight"
+            elif bmi < 25:
+                category = "Normal weight"
+            elif bmi < 30:
+                category = "Overweight"
+            else:
+                category = "Obesity"
+            bmi_data = {"value": bmi, "category": category}
+
+            # BMR calculation
+            if gender == 'Male':
+                bmr = (10 * weight) + (6.25 * height) - (5 * age) + 5
+            elif gender == 'Female':
+                bmr = (10 * weight) + (6.25 * height) - (5 * age) - 161
+            else:  # 'Other' - Average
+                bmr_male = (10 * weight) + (6.25 * height) - (5 * age) + 5
+                bmr_female = (10 * weight) + (6.25 * height) - (5 * age) - 161
+                bmr = (bmr_male + bmr_female) / 2
+            bmr = round(bmr)
+            bmr_data = {"value": bmr}
+    except (TypeError, ValueError) as e:
+        logger.warning("Could not compute health snapshot for profile %s: %s", profile.pk, e)
+    return {'bmi': bmi_data, 'bmr': bmr_data}
+
+
+def build_dashboard(user_id):
+    """
+    The dashboard payload for one user, in exactly four read-only queries: the
+    user with their profile, the last symptom checks, 30 days of weights and
+    today's meal log. A missing meal log is shown as an unsaved default; it is
+    only created when a meal is logged (UpdateMealLogView).
+    """
+    user = get_user_model().objects.select_related('profile').get(pk=user_id)
+    profile = getattr(user, 'profile', None)  # None (without a query) when the user has no profile
+
+    # Symptom History
+    symptom_logs = SymptomLog.objects.filter(user=user)[:3]
+    symptom_history = SymptomLogSerializer(symptom_logs, many=True).data
+
+    # Weight Progress
+    thirty_days_ago = timezone.now().date() - timedelta(days=30)
+    weight_logs = WeightLog.objects.filter(user=user, timestamp__gte=thirty_days_ago)
+    weight_progress = WeightLogSerializer(weight_logs, many=True).data
+
+    # Daily Diet Tracker
+    date_today = timezone.now().date()
+    meal_log = DailyMealLog.objects.filter(user=user, date=date_today).first() or DailyMealLog(user=user, date=date_today)
+    diet_tracker = DailyMealLogSerializer(meal_log).data
+
+    return {
+        'user': {'username': user.username},
+        'health_snapshot': health_snapshot(profile),
+        'symptom_history': symptom_history,
+        'weight_progress': weight_progress,
+        'diet_tracker': diet_tracker,
+    }
+
 
 class DashboardDataView(APIView):
-    """Aggregates all necessary data for the user's dashboard."""
+    """
+    Aggregates all necessary data for the user's dashboard. Served from the
+    per-user payload cache; a miss costs a fixed number of read-only queries.
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request, *args, **kwargs):
-        user = request.user
-        
-        # Health Snapshot: Calculate BMI/BMR from profile data
-        bmi_data = {"value": "N/A", "category": "Please complete your profile"}
-        bmr_data = {"value": "N/A"}
-        try:
-            profile = user.profile
-            # Debug log to confirm fetched values
-            print(f"[Debug] Profile values: age={profile.age}, gender={profile.gender}, weight_kg={profile.weight_kg}, height_cm={profile.height_cm}")
-
-            # Cast to ensure types are correct
-            weight = float(profile.weight_kg or 0)
-            height = float(profile.height_cm or 0)
-            age = int(profile.age or 0)
-            gender = profile.gender
-
-            if weight > 0 and height > 0 and age > 0 and gender:
-                height_m = height / 100
-                bmi = weight / (height_m ** 2)
-                bmi = round(bmi, 2)
-                if bmi < 18.5:
-                    category = "Underweight"
-                elif bmi < 25:
-                    category = "Normal weight"
-                elif bmi < 30:
-                    category = "Overweight"
-                else:
-                    category = "Obesity"
-                bmi_data = {"value": bmi, "category": category}
-
-                # BMR calculation
-                if gender == 'Male':
-                    bmr = (10 * weight) + (6.25 * height) - (5 * age) + 5
-                elif gender == 'Female':
-                    bmr = (10 * weight) + (6.25 * height) - (5 * age) - 161
-                else:  # 'Other' - Average
-                    bmr_male = (10 * weight) + (6.25 * height) - (5 * age) + 5
-                    bmr_female = (10 * weight) + (6.25 * height) - (5 * age) - 161
-                    bmr = (bmr_male + bmr_female) / 2
-                bmr = round(bmr)
-                bmr_data = {"value": bmr}
-                print(f"[Debug] Calculated BMI={bmi} ({category}), BMR={bmr}")
-            else:
-                print("[Debug] Profile incomplete or invalid - skipping calculation")
-        except Exception as e:
-                   print(f"[Debug] Error in health snapshot: {e}")
-
-        # Symptom History
-        symptom_logs = SymptomLog.objects.filter(user=user)[:3]
-        symptom_history = SymptomLogSerializer(symptom_logs, many=True).data
-
-        # Weight Progress
-        thirty_days_ago = timezone.now().date() - timedelta(days=30)
-        weight_logs = WeightLog.objects.filter(user=user, timestamp__gte=thirty_days_ago)
-        weight_progress = WeightLogSerializer(weight_logs, many=True).data
-        
-        # Daily Diet Tracker (Robust retry with sleep and filter fallback)
-        date_today = timezone.now().date()
-        tries = 3
-        meal_log = None
-        while tries > 0:
-            try:
-                with transaction.atomic():
-                    meal_log, _ = DailyMealLog.objects.get_or_create(user=user, date=date_today)
-                    break
-            except IntegrityError:
-                tries -= 1
-                time.sleep(0.2)
-                meal_log = DailyMealLog.objects.filter(user=user, date=date_today).first()
-                if meal_log:
-                    break
-                if tries == 0:
-                    print(f"Failed to get/create DailyMealLog for user {user.id} on {date_today}")
-                    meal_log = None
-
-        diet_tracker = DailyMealLogSerializer(meal_log).data if meal_log else {}
-
-        dashboard_data = {
-            'user': {'username': user.username},
-            'health_snapshot': {'bmi': bmi_data, 'bmr': bmr_data},
-            'symptom_history': symptom_history,
-            'weight_progress': weight_progress,
-            'diet_tracker': diet_tracker,
-        }
-        return Response(dashboard_data, status=status.HTTP_200_OK)
+        return Response(payload_cache.get_payload(request.user.pk, build_dashboard), status=status.HTTP_200_OK)
+
+
+class DashboardCacheMetricsView(APIView):
+    """Admin-only view exposing this process's dashboard cache hits, misses and invalidations."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(payload_cache.metrics.snapshot())
 
 
 class UpdateMealLogView(APIView):
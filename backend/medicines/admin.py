@@ -1,4 +1,7 @@
 from django.contrib import admin
-from .models import  Medicine
+from .models import  Medicine, DiseaseMedicine, ExternalLookup, MedicineTerm
 
 admin.site.register(Medicine)
+admin.site.register(DiseaseMedicine)
+admin.site.register(ExternalLookup)
+admin.site.register(MedicineTerm)
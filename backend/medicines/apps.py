@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MedicinesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "medicines"
+
+    def ready(self):
+        # Registers the signal receiver that invalidates the interaction index
+        from . import interactions  # noqa: F401
@@ -0,0 +1,202 @@
+# medicines/interactions.py
+
+"""
+Precomputed contraindication index for multi-drug checks.
+
+At import time every medicine's free-text contraindications, side effects and
+treated disease are split into normalized terms and stored as MedicineTerm
+rows. At request time the whole table is held in memory as frozensets per
+medicine, so checking N drugs against each other or against a patient's
+conditions is a handful of set intersections. Every rebuild stores a new terms
+version in the shared 'medicines' cache; the in-memory copy is reloaded when
+that version changes, so an unchanged table costs one cache read per check.
+"""
+
+import re
+import threading
+import uuid
+from itertools import permutations
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Medicine, MedicineTerm
+
+# Placeholders for an empty cell; phrases of the dataset that name no condition are in MEDICINE_IGNORED_TERMS
+EMPTY_VALUES = {'', 'none', 'nan', 'n/a', 'na'}
+TERMS_VERSION_KEY = 'medicine-terms-version'
+# Advice wrapped around a condition, e.g. "Use with caution in diabetes", "Pregnancy (consult)"
+ADVICE = re.compile(r'\buse with caution in\b|\bcaution in\b|\((?:[^)]*\b(?:consult|caution|monitor|adjust|long-term use)\b[^)]*)\)')
+# Qualifiers dropped so "severe kidney disease" and "kidney disease" match
+QUALIFIERS = re.compile(r'\b(?:severe|mild|active|uncontrolled|known|chronic|underlying|acute|history of|history)\b')
+SYNONYMS = {
+    'high blood pressure': 'hypertension',
+    'high bp': 'hypertension',
+    'low blood pressure': 'hypotension',
+    'low bp': 'hypotension',
+    'kidney impairment': 'kidney disease',
+    'renal disease': 'kidney disease',
+    'renal impairment': 'kidney disease',
+    'liver impairment': 'liver disease',
+    'hepatic impairment': 'liver disease',
+    'heart conditions': 'heart disease',
+    'heart condition': 'heart disease',
+    'pregnant': 'pregnancy',
+    'peptic ulcer': 'stomach ulcer',
+    'peptic ulcers': 'stomach ulcer',
+    'stomach bleeding': 'stomach ulcer',
+    'diabetes type 2': 'diabetes',
+    'type 2 diabetes': 'diabetes',
+}
+# Capturing split so we know which separator joined two parts
+SEPARATORS = re.compile(r'([,;()&]|/|\band\b|\bor\b)')
+DISTRIBUTING_SEPARATORS = {'and', 'or', '/'}
+ORGANS = {'liver', 'hepatic', 'kidney', 'renal', 'heart', 'cardiac', 'lung', 'thyroid'}
+
+
+def normalize_condition(text):
+    text = re.sub(r'[^a-z0-9\s-]', ' ', text.lower())
+    text = ' '.join(QUALIFIERS.sub(' ', text).split())
+    return SYNONYMS.get(text, text)
+
+
+def extract_terms(text):
+    """Split a free-text field into a set of normalized condition terms."""
+    if not text:
+        return set()
+    pieces = SEPARATORS.split(ADVICE.sub(' ', str(text).lower()))
+    parts = [normalize_condition(piece) for piece in pieces[::2]]
+    separators = [piece.strip() for piece in pieces[1::2]]
+
+    ignored = EMPTY_VALUES.union(settings.MEDICINE_IGNORED_TERMS)
+    terms = set()
+    for index, part in enumerate(parts):
+        # "liver or kidney impairment" -> "liver impairment", "kidney impairment"
+        following = parts[index + 1] if index + 1 < len(parts) else ''
+        if (part in ORGANS and len(following.split()) > 1
+                and separators[index] in DISTRIBUTING_SEPARATORS):
+            part = normalize_condition(f'{part} {following.split()[-1]}')
+        if part not in ignored and len(part) > 2:
+            terms.add(part[:100])
+    return terms
+
+
+def rebuild_terms(medicines, batch_size=1000):
+    """Replace the stored terms of the given medicines with freshly extracted ones."""
+    medicines = list(medicines)
+    rows = []
+    for medicine in medicines:
+        for kind, text in (
+            (MedicineTerm.CONTRAINDICATION, medicine.contraindications),
+            (MedicineTerm.SIDE_EFFECT, medicine.side_effects),
+            (MedicineTerm.TREATS, medicine.treats_disease),
+        ):
+            rows.extend(MedicineTerm(medicine_id=medicine.pk, kind=kind, term=term) for term in extract_terms(text))
+    with transaction.atomic():
+        MedicineTerm.objects.filter(medicine_id__in=[m.pk for m in medicines]).delete()
+        MedicineTerm.objects.bulk_create(rows, batch_size=batch_size, ignore_conflicts=True)
+        bump_terms_version()
+    return len(rows)
+
+
+def terms_version():
+    """The current terms version, created if the cache has none (e.g. after it was cleared)."""
+    cache = caches['medicines']
+    version = cache.get(TERMS_VERSION_KEY)
+    if version is None:
+        cache.add(TERMS_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(TERMS_VERSION_KEY)
+    return version
+
+
+def bump_terms_version():
+    # Now for this transaction's own reads, and again once it commits so no process
+    # keeps a copy loaded between the two
+    def bump():
+        caches['medicines'].set(TERMS_VERSION_KEY, uuid.uuid4().hex, None)
+    bump()
+    transaction.on_commit(bump)
+
+
+@receiver(post_delete, sender=Medicine)
+def _bump_on_medicine_delete(sender, **kwargs):
+    # Deleting a medicine cascades to its terms without going through rebuild_terms
+    bump_terms_version()
+
+
+class InteractionIndex:
+    """In-memory copy of MedicineTerm, reloaded only when the table changes."""
+
+    def __init__(self):
+        self._version = None
+        self._medicines = {}  # lower-cased name -> (name, {kind: frozenset(terms)})
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        version = terms_version()
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            grouped = {}
+            for medicine_id, kind, term in MedicineTerm.objects.values_list('medicine_id', 'kind', 'term').iterator():
+                grouped.setdefault(medicine_id, {}).setdefault(kind, set()).add(term)
+            self._medicines = {
+                name.lower(): (name, {kind: frozenset(terms) for kind, terms in kinds.items()})
+                for name, kinds in grouped.items()
+            }
+            self._version = version
+
+    def check(self, medicine_names, conditions=()):
+        """
+        Report conflicts between the given medicines and with the given conditions.
+        A drug conflicts with another when it is contraindicated for a condition the
+        other treats or for one of the other's side effects.
+        """
+        self._refresh()
+        medicines = self._medicines
+        found, unknown = [], []
+        for name in dict.fromkeys(n.strip() for n in medicine_names if n and n.strip()):
+            entry = medicines.get(name.lower())
+            (found if entry else unknown).append(entry or name)
+        if unknown:
+            # Medicines without any extracted terms are still valid catalogue entries (matched like the index, by lower-cased name)
+            known = {name.lower(): name for name in Medicine.objects.annotate(name_key=Lower('medicine_name'))
+                     .filter(name_key__in=[name.lower() for name in unknown]).values_list('medicine_name', flat=True)}
+            found += [(known[name.lower()], {}) for name in unknown if name.lower() in known]
+            unknown = [name for name in unknown if name.lower() not in known]
+
+        empty = frozenset()
+        drug_conflicts = []
+        for (name_a, terms_a), (name_b, terms_b) in permutations(found, 2):
+            contraindications = terms_a.get(MedicineTerm.CONTRAINDICATION, empty)
+            for reason, kind in (('treats', MedicineTerm.TREATS), ('side_effect', MedicineTerm.SIDE_EFFECT)):
+                shared = contraindications & terms_b.get(kind, empty)
+                if shared:
+                    drug_conflicts.append({
+                        'medicine': name_a, 'conflicts_with': name_b, 'reason': reason, 'terms': sorted(shared),
+                    })
+
+        condition_conflicts = []
+        for condition in conditions:
+            condition_terms = frozenset(extract_terms(condition))
+            for name, terms in found:
+                shared = terms.get(MedicineTerm.CONTRAINDICATION, empty) & condition_terms
+                if shared:
+                    condition_conflicts.append({'medicine': name, 'condition': condition, 'terms': sorted(shared)})
+
+        return {
+            'medicines': [name for name, _ in found],
+            'unknown_medicines': unknown,
+            'drug_conflicts': drug_conflicts,
+            'condition_conflicts': condition_conflicts,
+            'has_conflicts': bool(drug_conflicts or condition_conflicts),
+        }
+
+
+interaction_index = InteractionIndex()
@@ -0,0 +1,141 @@
+import contextlib
+import io
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from medicines.replay import RecordingAdapter, ReplayAdapter, mounted
+from medicines.views import (
+    http_session, is_informative_text, query_medlineplus_api,
+    scrape_drugs_com, scrape_rxlist, scrape_webmd, scrape_medscape,
+)
+
+SOURCES = {
+    'medlineplus': lambda name: query_medlineplus_api(name, use_fallback=False),
+    'drugs_com': scrape_drugs_com,
+    'rxlist': scrape_rxlist,
+    'webmd': scrape_webmd,
+    'medscape': scrape_medscape,
+}
+
+
+def extraction_quality(result):
+    """Score a lookup result from 0 (nothing usable) to 1 (uses and side effects both found)."""
+    if not result:
+        return 0.0
+    treats_valid = is_informative_text(result.get('treats_disease', ''), 30)
+    effects_valid = is_informative_text(result.get('side_effects', ''), 20)
+    return (treats_valid + effects_valid) / 2
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks MedlinePlus and the fallback scrapers against recorded HTTP fixtures'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Drug names to look up')
+        parser.add_argument('--corpus', help='File with one drug name per line')
+        parser.add_argument('--fixtures', default=settings.MEDICINE_HTTP_FIXTURES_DIR,
+                            help='Fixture directory to replay from (or record into)')
+        parser.add_argument('--record', action='store_true',
+                            help='Hit the live sites and save every response into --fixtures')
+        parser.add_argument('--simulate-latency', action='store_true',
+                            help='Sleep for the recorded network time when replaying')
+        parser.add_argument('--sources', default=','.join(SOURCES),
+                            help=f"Comma separated subset of: {', '.join(SOURCES)}")
+        parser.add_argument('--repeat', type=int, default=1, help='Runs per name and source')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+        parser.add_argument('--verbose', action='store_true', help='Keep the lookup debug prints')
+
+    def handle(self, *args, **options):
+        names = list(options['names'])
+        if options['corpus']:
+            with open(options['corpus'], encoding='utf-8') as f:
+                names += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        if not names:
+            raise CommandError('Give drug names as arguments or with --corpus.')
+
+        sources = [s.strip() for s in options['sources'].split(',') if s.strip()]
+        unknown = [s for s in sources if s not in SOURCES]
+        if unknown:
+            raise CommandError(f"Unknown sources: {', '.join(unknown)}")
+
+        if options['record']:
+            adapter = RecordingAdapter(options['fixtures'])
+        else:
+            adapter = ReplayAdapter(options['fixtures'], simulate_latency=options['simulate_latency'])
+
+        report = {}
+        with mounted(http_session, adapter):
+            for source in sources:
+                report[source] = self.run_source(source, names, adapter, options)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_table(report, adapter)
+
+    def run_source(self, source, names, adapter, options):
+        lookup = SOURCES[source]
+        totals, parse_times, network_times, qualities = [], [], [], []
+        hits = 0
+
+        for name in names:
+            for _ in range(options['repeat']):
+                network_before = adapter.network_seconds
+                started = time.perf_counter()
+                if options['verbose']:
+                    result = self.safe_lookup(lookup, name)
+                else:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        result = self.safe_lookup(lookup, name)
+                total = time.perf_counter() - started
+                network = adapter.network_seconds - network_before
+
+                quality = extraction_quality(result)
+                hits += quality > 0
+                totals.append(total)
+                network_times.append(network)
+                parse_times.append(max(total - network, 0.0))
+                qualities.append(quality)
+
+        calls = len(totals)
+        return {
+            'calls': calls,
+            'hit_rate': round(hits / calls, 3),
+            'quality': round(statistics.mean(qualities), 3),
+            'latency_ms_mean': round(statistics.mean(totals) * 1000, 2),
+            'latency_ms_p50': round(percentile(totals, 50) * 1000, 2),
+            'latency_ms_p95': round(percentile(totals, 95) * 1000, 2),
+            'network_ms_mean': round(statistics.mean(network_times) * 1000, 2),
+            'parse_ms_mean': round(statistics.mean(parse_times) * 1000, 2),
+        }
+
+    @staticmethod
+    def safe_lookup(lookup, name):
+        try:
+            return lookup(name)
+        except Exception:
+            return None
+
+    def print_table(self, report, adapter):
+        header = f"{'source':<12} {'calls':>5} {'hit%':>6} {'quality':>7} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'net ms':>9} {'parse ms':>9}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for source, row in report.items():
+            self.stdout.write(
+                f"{source:<12} {row['calls']:>5} {row['hit_rate'] * 100:>6.1f} {row['quality']:>7.2f} "
+                f"{row['latency_ms_mean']:>9.2f} {row['latency_ms_p50']:>9.2f} {row['latency_ms_p95']:>9.2f} "
+                f"{row['network_ms_mean']:>9.2f} {row['parse_ms_mean']:>9.2f}"
+            )
+        if adapter.misses:
+            self.stdout.write(self.style.WARNING(
+                f'{adapter.misses} requests had no recorded fixture. Run once with --record to capture them.'
+            ))
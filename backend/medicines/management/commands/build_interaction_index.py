@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from medicines.interactions import rebuild_terms
+from medicines.models import Medicine
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the contraindication/interaction terms for every medicine already in the catalogue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Medicines processed per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        batch, medicines, terms = [], 0, 0
+        for medicine in Medicine.objects.order_by('pk').iterator(chunk_size=batch_size):
+            batch.append(medicine)
+            if len(batch) >= batch_size:
+                terms += rebuild_terms(batch, batch_size=batch_size)
+                medicines += len(batch)
+                batch = []
+        if batch:
+            terms += rebuild_terms(batch, batch_size=batch_size)
+            medicines += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {terms} terms for {medicines} medicines.'))
@@ -0,0 +1,98 @@
+import os
+import time
+import xml.etree.ElementTree as ET
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from medicines.interactions import rebuild_terms
+from medicines.models import Medicine
+from medicines.views import clean_extracted_text, extract_detailed_info, is_valid_result
+
+SOURCE = 'MedlinePlus Health Topics (XML)'
+
+
+def iter_health_topics(path):
+    """
+    Yield (title, full_summary, language) for every <health-topic> in a MedlinePlus
+    health-topics XML file. Elements are cleared as soon as they are read, so memory
+    stays flat no matter how large the file is.
+    """
+    root = None
+    for event, elem in ET.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            continue
+        if elem.tag != 'health-topic':
+            continue
+        yield elem.get('title'), elem.findtext('full-summary'), elem.get('language')
+        elem.clear()
+        root.clear()  # Drop the finished topic from the root as well
+
+
+class Command(BaseCommand):
+    help = 'Loads medicine information from the downloadable MedlinePlus health-topics XML file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('xml_path', help='Path to an mplus_topics_*.xml file')
+        parser.add_argument('--language', default='English', help='Only import topics in this language')
+        parser.add_argument('--batch-size', type=int, default=500, help='Topics upserted per transaction')
+
+    def handle(self, *args, **options):
+        path = options['xml_path']
+        if not os.path.exists(path):
+            raise CommandError(f'File not found at {path}.')
+
+        started = time.perf_counter()
+        counts = {'topics': 0, 'imported': 0, 'skipped': 0}
+        batch = []
+
+        try:
+            for title, summary, language in iter_health_topics(path):
+                counts['topics'] += 1
+                if not title or language != options['language']:
+                    counts['skipped'] += 1
+                    continue
+
+                # Same cleaning and extraction as the live query_medlineplus_api path
+                uses, side_effects = extract_detailed_info(clean_extracted_text(summary))
+                result = {'treats_disease': uses, 'side_effects': side_effects}
+                if not is_valid_result(result, title):
+                    counts['skipped'] += 1
+                    continue
+
+                batch.append(Medicine(
+                    medicine_name=title.strip()[:255],
+                    medicine_type='Allopathic',
+                    treats_disease=uses[:255],
+                    side_effects=side_effects,
+                    frequency='Consult your doctor or pharmacist',
+                    meal_relation='Consult your doctor or pharmacist',
+                    source=SOURCE,
+                ))
+                if len(batch) >= options['batch_size']:
+                    counts['imported'] += self.flush(batch)
+                    batch = []
+        except ET.ParseError as e:
+            raise CommandError(f'Could not parse {path}: {e}')
+
+        counts['imported'] += self.flush(batch)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {counts['topics']} topics in {elapsed:.2f}s: {counts['imported']} upserted, "
+            f"{counts['skipped']} skipped."
+        ))
+
+    @staticmethod
+    def flush(batch):
+        """Upsert a batch, leaving curated catalogue rows (empty source) untouched."""
+        if not batch:
+            return 0
+        curated = set(Medicine.objects.filter(
+            medicine_name__in=[m.medicine_name for m in batch], source=''
+        ).values_list('medicine_name', flat=True))
+        unique = {m.medicine_name: m for m in batch if m.medicine_name not in curated}
+        with transaction.atomic():
+            Medicine.objects.upsert(list(unique.values()))
+            rebuild_terms(unique.values())
+        return len(unique)
@@ -1,58 +1,122 @@
 import pandas as pd
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from medicines.models import Medicine
+from django.db import transaction
+from medicines.interactions import rebuild_terms
+from medicines.models import DiseaseMedicine, Medicine
 import os
+import time
+
+# Column prefix in the CSV for each medicine type
+MEDICINE_TYPES = {'Allopathic': 'allopathic', 'Ayurvedic': 'ayurvedic'}
+DETAIL_FIELDS = ['frequency', 'meal_relation', 'routine', 'side_effects', 'contraindications']
+
+
+def build_medicine_records(chunk):
+    """
+    Turn one CSV chunk into a frame with one row per medicine, using column
+    operations only. Allopathic and Ayurvedic entries of a CSV row keep their
+    original relative order.
+    """
+    frames = []
+    for medicine_type, prefix in MEDICINE_TYPES.items():
+        frame = pd.DataFrame({
+            'medicine_name': chunk[f'{prefix}_medicine'].str.strip(),
+            'medicine_type': medicine_type,
+            'treats_disease': chunk['prognosis'].fillna(''),
+        })
+        for field in DETAIL_FIELDS:
+            frame[field] = chunk[f'{prefix}_{field}']
+        frames.append(frame)
+
+    records = pd.concat(frames).sort_index(kind='stable')
+    names = records['medicine_name']
+    records = records[names.notna() & (names != '') & (names.str.lower() != 'nan')]
+    # Missing values become None so they are stored as NULL
+    return records.astype(object).where(records.notna(), None)
+
+
+def build_disease_links(records):
+    """
+    Every distinct (disease, medicine) pair in the records, for the disease -> medicine
+    index, with the details of the first row for that pair.
+    """
+    links = records.loc[records['treats_disease'] != '', ['treats_disease', 'medicine_name'] + DETAIL_FIELDS]
+    links = links.assign(disease_key=links['treats_disease'].str.lower().str.split().str.join(' '))
+    links = links.drop_duplicates(['disease_key', 'medicine_name'])
+    return [
+        DiseaseMedicine(disease_key=link['disease_key'], disease=link['treats_disease'], medicine_id=link['medicine_name'],
+                        **{field: link[field] for field in DETAIL_FIELDS})
+        for link in links.to_dict('records')
+    ]
+
 
 class Command(BaseCommand):
-    help = 'Loads medicine data from the professional_synthetic_dataset.csv file'
+    help = 'Loads (or refreshes) medicine data from a symptom/treatment CSV such as dataset.csv'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', nargs='?', default=os.path.join(settings.BASE_DIR, 'dataset.csv'),
+                            help='CSV file to import (defaults to dataset.csv in the backend folder)')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='CSV rows read per chunk')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per INSERT statement')
+
+    def handle(self, *args, **options):
+        file_path = options['csv_path']
 
-    def handle(self, *args, **kwargs):
-        # Path to the CSV file (assuming it's in the root of your backend project)
-        file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), '..', 'professional_synthetic_dataset.csv')
-        
         if not os.path.exists(file_path):
-            self.stdout.write(self.style.ERROR(f'File not found at {file_path}. Please place the CSV in the root of the backend project.'))
+            self.stdout.write(self.style.ERROR(f'File not found at {file_path}. Pass the CSV path as an argument.'))
             return
 
         self.stdout.write(self.style.SUCCESS(f'Found CSV file at: {file_path}'))
-        df = pd.read_csv(file_path)
-        
-        medicines_to_create = []
-
-        for _, row in df.iterrows():
-            # Process Allopathic medicine
-            allo_name = str(row['allopathic_medicine']).strip()
-            if allo_name and allo_name.lower() != 'nan':
-                medicines_to_create.append(
-                    Medicine(
-                        medicine_name=allo_name,
-                        medicine_type='Allopathic',
-                        treats_disease=row['prognosis'],
-                        frequency=row['allopathic_frequency'],
-                        meal_relation=row['allopathic_meal_relation'],
-                        routine=row['allopathic_routine'],
-                        side_effects=row['allopathic_side_effects'],
-                        contraindications=row['allopathic_contraindications']
-                    )
-                )
 
-            # Process Ayurvedic medicine
-            ayur_name = str(row['ayurvedic_medicine']).strip()
-            if ayur_name and ayur_name.lower() != 'nan':
-                 medicines_to_create.append(
-                    Medicine(
-                        medicine_name=ayur_name,
-                        medicine_type='Ayurvedic',
-                        treats_disease=row['prognosis'],
-                        frequency=row['ayurvedic_frequency'],
-                        meal_relation=row['ayurvedic_meal_relation'],
-                        routine=row['ayurvedic_routine'],
-                        side_effects=row['ayurvedic_side_effects'],
-                        contraindications=row['ayurvedic_contraindications']
-                    )
+        usecols = ['prognosis'] + [
+            f'{prefix}_{field}' for prefix in MEDICINE_TYPES.values() for field in ['medicine'] + DETAIL_FIELDS
+        ]
+        reader = pd.read_csv(file_path, usecols=usecols, dtype=str, chunksize=options['chunk_size'])
+
+        started = time.perf_counter()
+        rows_read = 0
+        medicines_written = 0
+        links_written = 0
+        # The first row for a medicine name wins, as in the original importer
+        seen_names = set()
+        # Medicines whose links from an earlier import were replaced in this run
+        relinked_names = set()
+
+        for chunk_number, chunk in enumerate(reader, start=1):
+            rows_read += len(chunk)
+            all_records = build_medicine_records(chunk)
+            records = all_records.drop_duplicates('medicine_name', keep='first')
+            records = records[~records['medicine_name'].isin(seen_names)]
+            seen_names.update(records['medicine_name'])
+
+            medicines = [Medicine(**record) for record in records.to_dict('records')]
+            disease_links = build_disease_links(all_records)
+            # A medicine's links are rebuilt from this file, so a disease it no longer treats drops out
+            stale_names = sorted(set(all_records['medicine_name']) - relinked_names)
+            relinked_names.update(stale_names)
+            with transaction.atomic():
+                # In batches: one IN list per chunk would pass SQLite's bound-variable limit
+                for start in range(0, len(stale_names), options['batch_size']):
+                    batch = stale_names[start:start + options['batch_size']]
+                    DiseaseMedicine.objects.filter(medicine_id__in=batch).delete()
+                Medicine.objects.upsert(medicines, batch_size=options['batch_size'])
+                DiseaseMedicine.objects.bulk_create(
+                    disease_links, batch_size=options['batch_size'], ignore_conflicts=True
                 )
+                rebuild_terms(medicines, batch_size=options['batch_size'])
+            medicines_written += len(medicines)
+            links_written += len(disease_links)
 
-        # Use bulk_create for efficiency, ignoring conflicts for duplicate medicine names
-        Medicine.objects.bulk_create(medicines_to_create, ignore_conflicts=True)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'Chunk {chunk_number}: {rows_read} rows read, {medicines_written} medicines upserted '
+                f'({rows_read / elapsed:,.0f} rows/s)'
+            )
 
-        self.stdout.write(self.style.SUCCESS(f'Successfully loaded or updated {len(medicines_to_create)} medicine records.'))
\ No newline at end of file
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully loaded or updated {medicines_written} medicine records and indexed '
+            f'{links_written} disease links from {rows_read} rows '
+            f'in {elapsed:.2f}s ({rows_read / max(elapsed, 1e-9):,.0f} rows/s).'
+        ))
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+from requests.adapters import BaseAdapter
+from medicines.models import ExternalLookup
+from medicines.replay import mounted
+from medicines.single_flight import normalize_term
+from medicines.views import http_session, query_medlineplus_api, store_external_result
+
+
+class PoliteAdapter(BaseAdapter):
+    """
+    Wraps the currently mounted adapter and spaces out requests to the same host
+    by at least `min_interval` seconds, however many worker threads are running.
+    """
+
+    def __init__(self, inner, min_interval):
+        super().__init__()
+        self.inner = inner
+        self.min_interval = min_interval
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        host = urlsplit(request.url).hostname
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+        return self.inner.send(request, **kwargs)
+
+    def close(self):
+        self.inner.close()
+
+
+class Command(BaseCommand):
+    help = 'Resolves a list of drug names through MedlinePlus and the fallback sources and stores them in the catalogue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names_file', help='Text file with one drug name per line')
+        parser.add_argument('--workers', type=int, default=4, help='Lookups running at the same time')
+        parser.add_argument('--min-interval', type=float, default=1.0,
+                            help='Minimum seconds between two requests to the same host')
+        parser.add_argument('--checkpoint',
+                            help='Progress file of an interrupted run (defaults to <names_file>.checkpoint); '
+                                 'removed once a run completes')
+        parser.add_argument('--refresh', action='store_true',
+                            help='Look every name up again, ignoring the checkpoint and fresh cached results')
+        parser.add_argument('--limit', type=int, help='Stop after this many lookups')
+
+    def handle(self, *args, **options):
+        names_file = options['names_file']
+        if not os.path.exists(names_file):
+            raise CommandError(f'File not found at {names_file}.')
+        checkpoint_path = options['checkpoint'] or f'{names_file}.checkpoint'
+
+        names = self.read_names(names_file)
+        # An interrupted run is resumed from its checkpoint; --refresh starts over
+        done = set() if options['refresh'] else self.read_checkpoint(checkpoint_path)
+        pending = {term: name for term, name in names.items() if term not in done}
+        if not options['refresh']:
+            now = timezone.now()
+            fresh_after = now - timedelta(seconds=settings.MEDICINE_EXTERNAL_SOFT_TTL_SECONDS)
+            negative_after = now - timedelta(seconds=settings.MEDICINE_NEGATIVE_TTL_SECONDS)
+            fresh = set(ExternalLookup.objects.filter(term__in=list(pending)).filter(
+                Q(result__isnull=False, fetched_at__gte=fresh_after) | Q(result__isnull=True, fetched_at__gte=negative_after)
+            ).values_list('term', flat=True))
+            pending = {term: name for term, name in pending.items() if term not in fresh}
+        limited = bool(options['limit']) and len(pending) > options['limit']
+        if limited:
+            pending = dict(list(pending.items())[:options['limit']])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(names)} names in file, {len(names) - len(pending)} already done, {len(pending)} to look up.'
+        ))
+        if not pending:
+            self.remove_checkpoint(checkpoint_path)
+            return
+
+        counts = {'found': 0, 'promoted': 0, 'not_found': 0, 'errors': 0}
+        started = time.perf_counter()
+        adapter = PoliteAdapter(http_session.get_adapter('https://'), options['min_interval'])
+
+        # Lookups run in worker threads; all DB writes stay on this thread so SQLite never sees concurrent writers
+        with mounted(http_session, adapter), \
+                ThreadPoolExecutor(max_workers=options['workers']) as executor, \
+                open(checkpoint_path, 'w' if options['refresh'] else 'a', encoding='utf-8') as checkpoint:
+            futures = {executor.submit(query_medlineplus_api, name): term for term, name in pending.items()}
+            for index, future in enumerate(as_completed(futures), start=1):
+                term = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:  # SourceUnavailable included: not cached, not checkpointed, retried next run
+                    counts['errors'] += 1
+                    self.stdout.write(self.style.ERROR(f'[{index}/{len(futures)}] {term}: {e}'))
+                    continue
+
+                promoted = store_external_result(term, result)
+                counts['found' if result else 'not_found'] += 1
+                counts['promoted'] += promoted is not None
+                checkpoint.write(term + '\n')
+                checkpoint.flush()
+                self.stdout.write(f"[{index}/{len(futures)}] {term}: {'promoted' if promoted else 'found' if result else 'not found'}")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {elapsed:.1f}s ({len(pending) / elapsed:.2f} names/s): {counts['found']} found, "
+            f"{counts['promoted']} promoted, {counts['not_found']} not found, {counts['errors']} errors."
+        ))
+        # Keep the checkpoint only while names are left over, so the next run retries just those
+        if not counts['errors'] and not limited:
+            self.remove_checkpoint(checkpoint_path)
+
+    @staticmethod
+    def read_names(path):
+        """Return {normalized term: original name}, skipping blanks, comments and duplicates."""
+        names = {}
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                name = line.strip()
+                if name and not name.startswith('#'):
+                    names.setdefault(normalize_term(name), name)
+        return names
+
+    @staticmethod
+    def remove_checkpoint(path):
+        if os.path.exists(path):
+            os.remove(path)
+
+    @staticmethod
+    def read_checkpoint(path):
+        if not os.path.exists(path):
+            return set()
+        with open(path, encoding='utf-8') as f:
+            return {line.strip() for line in f if line.strip()}
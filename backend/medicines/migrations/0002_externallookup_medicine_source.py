@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-19 00:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("medicines", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExternalLookup",
+            fields=[
+                (
+                    "term",
+                    models.CharField(max_length=255, primary_key=True, serialize=False),
+                ),
+                ("result", models.JSONField(blank=True, null=True)),
+                ("fetched_at", models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="medicine",
+            name="source",
+            field=models.CharField(blank=True, default="", max_length=100),
+        ),
+    ]
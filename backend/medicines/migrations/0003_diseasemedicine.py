@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-19 00:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("medicines", "0002_externallookup_medicine_source"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DiseaseMedicine",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("disease_key", models.CharField(max_length=255)),
+                ("disease", models.CharField(max_length=255)),
+                (
+                    "medicine",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="disease_links",
+                        to="medicines.medicine",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["id"],
+                "unique_together": {("disease_key", "medicine")},
+            },
+        ),
+    ]
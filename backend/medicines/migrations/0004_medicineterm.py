@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-19 00:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("medicines", "0003_diseasemedicine"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MedicineTerm",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("contraindication", "Contraindication"),
+                            ("side_effect", "Side effect"),
+                            ("treats", "Treats"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("term", models.CharField(max_length=100)),
+                (
+                    "medicine",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="terms",
+                        to="medicines.medicine",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("medicine", "kind", "term")},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-19 01:12
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("medicines", "0004_medicineterm"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="medicine",
+            index=models.Index(
+                django.db.models.functions.text.Lower("medicine_name"),
+                name="medicine_name_lower_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-19 01:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("medicines", "0005_medicine_name_lower_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="diseasemedicine",
+            name="contraindications",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="diseasemedicine",
+            name="frequency",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name="diseasemedicine",
+            name="meal_relation",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name="diseasemedicine",
+            name="routine",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="diseasemedicine",
+            name="side_effects",
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
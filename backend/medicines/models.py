@@ -1,4 +1,34 @@
 from django.db import models
+from django.db.models.functions import Lower
+
+
+def normalize_disease(name):
+    """Lower-case, whitespace-collapsed key used to match disease names."""
+    return ' '.join(str(name).lower().split())
+
+
+class MedicineManager(models.Manager):
+    # Columns refreshed when an imported row already exists; `source` resets to
+    # '' (curated), since the row now holds the CSV's data
+    UPSERT_FIELDS = [
+        'medicine_type', 'treats_disease', 'frequency', 'meal_relation',
+        'routine', 'side_effects', 'contraindications', 'source',
+    ]
+
+    def upsert(self, medicines, batch_size=1000):
+        """Insert new medicines and update existing ones (matched by name) in batches."""
+        return self.bulk_create(
+            medicines,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['medicine_name'],
+            update_fields=self.UPSERT_FIELDS,
+        )
+
+    def treating(self, disease):
+        """Medicines linked to a disease in the reverse index, in import order (one indexed query)."""
+        return self.filter(disease_links__disease_key=normalize_disease(disease)).order_by('disease_links__id')
+
 
 class Medicine(models.Model):
     """
@@ -12,6 +42,78 @@ class Medicine(models.Model):
     routine = models.TextField(blank=True, null=True)
     side_effects = models.TextField(blank=True, null=True)
     contraindications = models.TextField(blank=True, null=True)
+    source = models.CharField(max_length=100, blank=True, default='') # Empty for curated rows, site name for promoted lookups
+
+    objects = MedicineManager()
+
+    class Meta:
+        # Case-insensitive exact lookups (bulk lookup) filter on LOWER(medicine_name)
+        indexes = [models.Index(Lower('medicine_name'), name='medicine_name_lower_idx')]
 
     def __str__(self):
         return f"{self.medicine_name} ({self.medicine_type})"
+
+
+class DiseaseMedicineManager(models.Manager):
+    def for_disease(self, disease):
+        """Links of a disease with their medicines, in import order (one indexed query)."""
+        return self.filter(disease_key=normalize_disease(disease)).select_related('medicine').order_by('id')
+
+
+class DiseaseMedicine(models.Model):
+    """
+    Reverse index from a disease to the medicines that treat it, one row per pair.
+    Filled by the load_medicines command, with the dosage details of the CSV row
+    for this disease (a Medicine holds those of the first row that names it).
+    """
+    disease_key = models.CharField(max_length=255) # normalize_disease(disease)
+    disease = models.CharField(max_length=255)
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='disease_links')
+    frequency = models.CharField(max_length=100, blank=True, null=True)
+    meal_relation = models.CharField(max_length=100, blank=True, null=True)
+    routine = models.TextField(blank=True, null=True)
+    side_effects = models.TextField(blank=True, null=True)
+    contraindications = models.TextField(blank=True, null=True)
+
+    objects = DiseaseMedicineManager()
+
+    class Meta:
+        unique_together = [('disease_key', 'medicine')] # Also serves as the lookup index on disease_key
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.disease} -> {self.medicine_id}"
+
+
+class MedicineTerm(models.Model):
+    """
+    One normalized term extracted from a medicine's free-text fields, used by the
+    contraindication / interaction check. Rebuilt whenever a medicine is imported.
+    """
+    CONTRAINDICATION = 'contraindication'
+    SIDE_EFFECT = 'side_effect'
+    TREATS = 'treats'
+    KIND_CHOICES = [(CONTRAINDICATION, 'Contraindication'), (SIDE_EFFECT, 'Side effect'), (TREATS, 'Treats')]
+
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='terms')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    term = models.CharField(max_length=100)
+
+    class Meta:
+        unique_together = [('medicine', 'kind', 'term')]
+
+    def __str__(self):
+        return f"{self.medicine_id}: {self.kind} {self.term}"
+
+
+class ExternalLookup(models.Model):
+    """
+    Cached result of an external (MedlinePlus / fallback scraper) lookup, keyed
+    by the normalized search term. A null result records that nothing was found.
+    """
+    term = models.CharField(max_length=255, primary_key=True)
+    result = models.JSONField(blank=True, null=True)
+    fetched_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.term} (fetched {self.fetched_at:%Y-%m-%d %H:%M})"
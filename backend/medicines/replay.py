@@ -0,0 +1,180 @@
+# medicines/replay.py
+
+"""
+Record/replay transport adapters for the external medicine lookup chain.
+
+The lookup functions in views.py send every request through `http_session`.
+Mounting a RecordingAdapter on that session captures each response as a JSON
+fixture on disk; mounting a ReplayAdapter serves those fixtures back without
+touching the network, so the MedlinePlus and scraper code can be tested and
+benchmarked in CI or on air-gapped machines.
+"""
+
+import base64
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+# Headers describing the wire encoding of the original body. The fixture stores
+# the decoded body, so replaying these would confuse the client.
+SKIPPED_HEADERS = {'content-encoding', 'transfer-encoding', 'content-length', 'connection'}
+
+
+def fixture_path(directory, method, url):
+    """Return the fixture file used for a given request."""
+    digest = hashlib.sha1(f"{method.upper()} {url}".encode('utf-8')).hexdigest()
+    host = urlsplit(url).hostname or 'local'
+    return os.path.join(directory, f"{host}-{digest[:20]}.json")
+
+
+def save_fixture(directory, method, url, status_code=200, content=b'', headers=None, elapsed=0.0):
+    """Write one recorded response to the fixture directory."""
+    os.makedirs(directory, exist_ok=True)
+    fixture = {
+        'method': method.upper(),
+        'url': url,
+        'status_code': status_code,
+        'headers': {k: v for k, v in (headers or {}).items() if k.lower() not in SKIPPED_HEADERS},
+        'body': base64.b64encode(content).decode('ascii'),
+        'elapsed': elapsed,
+    }
+    path = fixture_path(directory, method, url)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(fixture, f, indent=2)
+    return path
+
+
+def load_fixture(directory, method, url):
+    """Return the recorded fixture for a request, or None if it was never captured."""
+    path = fixture_path(directory, method, url)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class _TimedAdapterMixin:
+    """Thread-safe counters shared by both adapters (used by the benchmark)."""
+
+    def _init_counters(self):
+        self._lock = threading.Lock()
+        self.network_seconds = 0.0
+        self.requests_sent = 0
+        self.misses = 0
+
+    def _count(self, elapsed, miss=False):
+        with self._lock:
+            self.network_seconds += elapsed
+            self.requests_sent += 1
+            if miss:
+                self.misses += 1
+
+
+class RecordingAdapter(_TimedAdapterMixin, HTTPAdapter):
+    """Sends requests to the live site and stores every response as a fixture."""
+
+    def __init__(self, directory, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        self._init_counters()
+
+    def send(self, request, **kwargs):
+        started = time.perf_counter()
+        response = super().send(request, **kwargs)
+        content = response.content  # Read the body so the timing includes the transfer
+        elapsed = time.perf_counter() - started
+        self._count(elapsed)
+        save_fixture(self.directory, request.method, request.url, response.status_code,
+                     content, dict(response.headers), elapsed)
+        return response
+
+
+class ReplayAdapter(_TimedAdapterMixin, BaseAdapter):
+    """
+    Serves recorded fixtures instead of opening connections.
+    A request with no fixture raises ConnectionError, exactly like an offline host,
+    so the lookup chain follows its normal error paths.
+    """
+
+    def __init__(self, directory, simulate_latency=False):
+        super().__init__()
+        self.directory = directory
+        self.simulate_latency = simulate_latency
+        self._init_counters()
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        started = time.perf_counter()
+        fixture = load_fixture(self.directory, request.method, request.url)
+        if fixture is None:
+            self._count(time.perf_counter() - started, miss=True)
+            raise requests.exceptions.ConnectionError(
+                f"No recorded fixture for {request.method} {request.url}", request=request
+            )
+
+        if self.simulate_latency:
+            time.sleep(fixture.get('elapsed', 0.0))
+
+        content = base64.b64decode(fixture['body'])
+        response = Response()
+        response.status_code = fixture['status_code']
+        response.headers = CaseInsensitiveDict(fixture.get('headers', {}))
+        response.url = request.url
+        response.request = request
+        response.reason = 'Replayed'
+        response.raw = io.BytesIO(content)
+        response._content = content
+        response._content_consumed = True
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.connection = self
+        self._count(time.perf_counter() - started)
+        return response
+
+    def close(self):
+        pass
+
+
+@contextmanager
+def mounted(session, adapter):
+    """Temporarily route all http(s) traffic of `session` through `adapter`."""
+    previous = {prefix: session.adapters.get(prefix) for prefix in ('http://', 'https://')}
+    for prefix in previous:
+        session.mount(prefix, adapter)
+    try:
+        yield adapter
+    finally:
+        for prefix, original in previous.items():
+            if original is not None:
+                session.mount(prefix, original)
+            else:
+                session.adapters.pop(prefix, None)
+
+
+def configure_session(session):
+    """
+    Mount the adapter selected by MEDICINE_HTTP_MODE ('live', 'record' or 'replay')
+    so a whole server or test run can be pointed at a fixture directory.
+    """
+    mode = settings.MEDICINE_HTTP_MODE
+    directory = settings.MEDICINE_HTTP_FIXTURES_DIR
+    if mode == 'record':
+        adapter = RecordingAdapter(directory)
+    elif mode == 'replay':
+        adapter = ReplayAdapter(directory)
+    else:
+        return None
+
+    print(f"[INFO] Medicine lookups running in '{mode}' mode with fixtures at {directory}")
+    for prefix in ('http://', 'https://'):
+        session.mount(prefix, adapter)
+    return adapter
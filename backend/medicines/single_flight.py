@@ -0,0 +1,131 @@
+# medicines/single_flight.py
+
+"""
+Single-flight coalescing for slow external medicine lookups.
+
+When many requests ask for the same unknown drug at once, only the first one
+(the "leader") runs the lookup; the others wait and reuse its result.
+Inside one process this is done with a threading.Event per key. Across
+gunicorn/uwsgi workers on the same host a file lock per key serialises the
+leaders, and the winner leaves its result in a small JSON file that the other
+workers read once they get the lock.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+from filelock import FileLock, Timeout
+
+_MISSING = object()
+
+
+def normalize_term(term):
+    """Case- and whitespace-insensitive key for a search term."""
+    return ' '.join(term.lower().split())
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, lock_dir=None, wait_seconds=None, result_ttl=None):
+        self.lock_dir = lock_dir or settings.MEDICINE_SINGLE_FLIGHT_DIR
+        self.wait_seconds = wait_seconds if wait_seconds is not None else settings.MEDICINE_SINGLE_FLIGHT_WAIT_SECONDS
+        self.result_ttl = result_ttl if result_ttl is not None else settings.MEDICINE_SINGLE_FLIGHT_RESULT_TTL
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def do(self, key, fn):
+        """Run fn() once for all concurrent callers using the same key and share its result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            if not call.event.wait(self.wait_seconds):
+                print(f"[WARNING] Gave up waiting for in-flight lookup of '{key}', fetching directly")
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._do_across_workers(key, fn)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            call.event.set()
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def _paths(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        base = os.path.join(self.lock_dir, digest)
+        return base + '.lock', base + '.json'
+
+    def _do_across_workers(self, key, fn):
+        os.makedirs(self.lock_dir, exist_ok=True)
+        lock_path, result_path = self._paths(key)
+        try:
+            with FileLock(lock_path, timeout=self.wait_seconds):
+                shared = self._read_result(result_path)
+                if shared is not _MISSING:
+                    print(f"[INFO] Reusing result of another worker's lookup for '{key}'")
+                    return shared
+                result = fn()
+                self._write_result(result_path, result)
+                return result
+        except Timeout:
+            print(f"[WARNING] Lookup lock for '{key}' is still held, fetching directly")
+            return fn()
+
+    def _read_result(self, path):
+        try:
+            if time.time() - os.path.getmtime(path) > self.result_ttl:
+                return _MISSING
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)['result']
+        except (OSError, ValueError, KeyError):
+            return _MISSING
+
+    def _write_result(self, path, result):
+        try:
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'result': result}, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"[WARNING] Could not share lookup result: {e}")
+            return
+
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._prune()
+
+    def _prune(self):
+        """Delete result files that are long past their TTL. Lock files are left alone."""
+        cutoff = time.time() - self.result_ttl * 10
+        try:
+            with os.scandir(self.lock_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.json') and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+        except OSError:
+            pass
+
+
+lookup_flight = SingleFlight()
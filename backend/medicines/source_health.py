@@ -0,0 +1,155 @@
+# medicines/source_health.py
+
+"""
+Per-source circuit breakers and health scores for the external drug sites.
+
+Every fallback scraper call is recorded here. A source whose recent calls
+mostly fail (network and HTTP errors, bot-check pages) or run slower than
+MEDICINE_SOURCE_SLOW_CALL_SECONDS is "opened" and skipped until its cool-down
+expires, after which a single probe call decides whether it closes again.
+A site that answers but does not list the drug counts as a success.
+The same statistics rank the sources so the fastest healthy one is tried first.
+"""
+
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class SourceHealth:
+    """Rolling call window and circuit breaker state for one source."""
+
+    def __init__(self, name):
+        self.name = name
+        self.window_size = settings.MEDICINE_SOURCE_WINDOW_SIZE
+        self.window_seconds = settings.MEDICINE_SOURCE_WINDOW_SECONDS
+        self.min_calls = settings.MEDICINE_SOURCE_MIN_CALLS
+        self.failure_rate_threshold = settings.MEDICINE_SOURCE_FAILURE_RATE
+        self.slow_call_seconds = settings.MEDICINE_SOURCE_SLOW_CALL_SECONDS
+        self.open_seconds = settings.MEDICINE_SOURCE_OPEN_SECONDS
+
+        self.state = CLOSED
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.calls = deque()  # (timestamp, success, latency)
+        self.total_calls = 0
+        self.total_failures = 0
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        while self.calls and (len(self.calls) > self.window_size or now - self.calls[0][0] > self.window_seconds):
+            self.calls.popleft()
+
+    def _rates(self):
+        """Return (failure rate, slow-call rate, mean latency) over the current window."""
+        if not self.calls:
+            return 0.0, 0.0, 0.0
+        failures = sum(1 for _, success, _ in self.calls if not success)
+        slow = sum(1 for _, _, latency in self.calls if latency > self.slow_call_seconds)
+        mean_latency = sum(latency for _, _, latency in self.calls) / len(self.calls)
+        return failures / len(self.calls), slow / len(self.calls), mean_latency
+
+    def allow_request(self, now=None):
+        """Decide whether the caller may try this source right now."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.state == OPEN and now - self.opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                # Let exactly one request through to test the water
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def record(self, success, latency, now=None):
+        """Record the outcome of one call and update the breaker state."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.total_calls += 1
+            self.total_failures += not success
+            self.calls.append((now, success, latency))
+            self._trim(now)
+
+            if self.state == HALF_OPEN:
+                self.probe_in_flight = False
+                if success and latency <= self.slow_call_seconds:
+                    self.state = CLOSED
+                    self.calls.clear()
+                else:
+                    self._open(now)
+                return
+
+            failure_rate, slow_rate, _ = self._rates()
+            if len(self.calls) >= self.min_calls and max(failure_rate, slow_rate) >= self.failure_rate_threshold:
+                self._open(now)
+
+    def _open(self, now):
+        self.state = OPEN
+        self.opened_at = now
+        self.times_opened += 1
+
+    def score(self):
+        """Higher is better: smoothed success rate divided by (1 + mean latency in seconds)."""
+        with self._lock:
+            successes = sum(1 for _, success, _ in self.calls if success)
+            success_rate = (successes + 1) / (len(self.calls) + 2)
+            _, _, mean_latency = self._rates()
+        return success_rate / (1 + mean_latency)
+
+    def snapshot(self):
+        score = self.score()
+        with self._lock:
+            failure_rate, slow_rate, mean_latency = self._rates()
+            return {
+                'source': self.name,
+                'state': self.state,
+                'score': round(score, 4),
+                'window_calls': len(self.calls),
+                'failure_rate': round(failure_rate, 3),
+                'slow_call_rate': round(slow_rate, 3),
+                'mean_latency_ms': round(mean_latency * 1000, 1),
+                'total_calls': self.total_calls,
+                'total_failures': self.total_failures,
+                'times_opened': self.times_opened,
+            }
+
+
+class SourceHealthRegistry:
+    """Process-wide collection of SourceHealth objects, keyed by source name."""
+
+    def __init__(self):
+        self._sources = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            if name not in self._sources:
+                self._sources[name] = SourceHealth(name)
+            return self._sources[name]
+
+    def order(self, scrapers):
+        """Sort scraper functions by health score, keeping the original order for ties."""
+        ranked = sorted(enumerate(scrapers), key=lambda item: (-self.get(item[1].__name__).score(), item[0]))
+        return [scraper for _, scraper in ranked]
+
+    def snapshot(self):
+        with self._lock:
+            sources = list(self._sources.values())
+        return [source.snapshot() for source in sources]
+
+    def reset(self):
+        with self._lock:
+            self._sources.clear()
+
+
+source_health = SourceHealthRegistry()
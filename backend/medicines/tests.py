@@ -1,3 +1,580 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+from django.utils import timezone
+
+from .interactions import InteractionIndex, extract_terms, rebuild_terms
+from .models import DiseaseMedicine, ExternalLookup, Medicine
+from .replay import ReplayAdapter, mounted, save_fixture
+from .single_flight import SingleFlight, normalize_term
+from .source_health import CLOSED, HALF_OPEN, OPEN, SourceHealth, SourceHealthRegistry
+from . import views
+from .views import SourceUnavailable, http_session, scrape_drugs_com, search_source
+
+DRUGS_COM_PAGE = b"""
+<html><body>
+<h1>Ibuprofen</h1>
+<h2>What is ibuprofen used for?</h2>
+<p>Ibuprofen is used to treat pain, fever and inflammation caused by many conditions such as headache and arthritis.</p>
+<h2>Side effects</h2>
+<p>Common side effects include upset stomach, mild heartburn, nausea and dizziness.</p>
+</body></html>
+"""
+
+
+class ReplayAdapterTest(TestCase):
+    def setUp(self):
+        self.fixtures = tempfile.mkdtemp()
+        save_fixture(self.fixtures, 'GET', 'https://www.drugs.com/ibuprofen.html', content=DRUGS_COM_PAGE,
+                     headers={'Content-Type': 'text/html; charset=utf-8'})
+
+    def test_scraper_runs_against_recorded_fixture(self):
+        """The scraper parses a replayed page without touching the network."""
+        with mounted(http_session, ReplayAdapter(self.fixtures)) as adapter:
+            result = scrape_drugs_com('Ibuprofen')
+        self.assertEqual(result['medicine_name'], 'Ibuprofen')
+        self.assertIn('used to treat pain', result['treats_disease'])
+        self.assertIn('upset stomach', result['side_effects'])
+        self.assertEqual(adapter.misses, 0)
+
+    def test_missing_fixture_behaves_like_offline_host(self):
+        """Requests without a fixture fail, so the scraper reports the source as unavailable."""
+        with mounted(http_session, ReplayAdapter(self.fixtures)) as adapter:
+            with self.assertRaises(SourceUnavailable):
+                scrape_drugs_com('Paracetamol')
+        self.assertGreater(adapter.misses, 0)
+
+    def test_only_errors_count_against_the_circuit_breaker(self):
+        save_fixture(self.fixtures, 'GET', 'https://www.drugs.com/unknownium.html', status_code=404)
+        save_fixture(self.fixtures, 'GET', 'https://www.drugs.com/search.php?searchterm=unknownium',
+                     content=b'<html><body><p>No results found.</p></body></html>')
+        save_fixture(self.fixtures, 'GET', 'https://www.drugs.com/blocked.html', status_code=403)
+        health = SourceHealth('scrape_drugs_com')
+        with mounted(http_session, ReplayAdapter(self.fixtures)):
+            self.assertIsNone(search_source(scrape_drugs_com, 'unknownium', health))
+            self.assertEqual((health.total_calls, health.total_failures), (1, 0))  # Not listed: healthy
+            self.assertIsNone(search_source(scrape_drugs_com, 'blocked', health))
+            self.assertIsNone(search_source(scrape_drugs_com, 'Paracetamol', health))  # Offline
+        self.assertEqual((health.total_calls, health.total_failures), (3, 2))
+
+    def test_lookup_replays_committed_fixture(self):
+        """The MedlinePlus query for Ibuprofen is replayed from medicines/http_fixtures."""
+        with mounted(http_session, ReplayAdapter(settings.MEDICINE_HTTP_FIXTURES_DIR)) as adapter:
+            result = views.query_medlineplus_api('Ibuprofen', use_fallback=False)
+        self.assertEqual((adapter.requests_sent, adapter.misses), (1, 0))
+        self.assertEqual(result['medicine_name'], 'Ibuprofen')
+        self.assertIn('pain, fever and inflammation', result['treats_disease'])
+        self.assertIn('upset stomach', result['side_effects'])
+
+    def test_benchmark_runs_against_committed_fixtures(self):
+        out = io.StringIO()
+        call_command('benchmark_medicine_lookup', 'Ibuprofen', sources='medlineplus', json=True, stdout=out)
+        report = json.loads(out.getvalue())['medlineplus']
+        self.assertEqual((report['calls'], report['hit_rate'], report['quality']), (1, 1.0, 1.0))
+
+    def test_session_adapters_restored(self):
+        original = http_session.get_adapter('https://www.drugs.com/')
+        with mounted(http_session, ReplayAdapter(self.fixtures)):
+            pass
+        self.assertIs(http_session.get_adapter('https://www.drugs.com/'), original)
+
+    def test_benchmark_command_reports_per_source_stats(self):
+        out = io.StringIO()
+        call_command('benchmark_medicine_lookup', 'Ibuprofen', fixtures=self.fixtures,
+                     sources='drugs_com', json=True, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['drugs_com']['calls'], 1)
+        self.assertEqual(report['drugs_com']['quality'], 1.0)
+
+
+@override_settings(MEDICINE_SOURCE_MIN_CALLS=3, MEDICINE_SOURCE_FAILURE_RATE=0.5,
+                   MEDICINE_SOURCE_SLOW_CALL_SECONDS=5.0, MEDICINE_SOURCE_OPEN_SECONDS=60)
+class SourceHealthTest(TestCase):
+    def test_breaker_opens_after_failures(self):
+        health = SourceHealth('scrape_webmd')
+        for t in range(3):
+            health.record(False, 0.5, now=t)
+        self.assertEqual(health.state, OPEN)
+        self.assertFalse(health.allow_request(now=10))
+
+    def test_slow_calls_open_the_breaker(self):
+        health = SourceHealth('scrape_rxlist')
+        for t in range(3):
+            health.record(True, 12.0, now=t)
+        self.assertEqual(health.state, OPEN)
+
+    def test_half_open_allows_single_probe(self):
+        health = SourceHealth('scrape_medscape')
+        for t in range(3):
+            health.record(False, 0.5, now=t)
+        self.assertTrue(health.allow_request(now=100))
+        self.assertEqual(health.state, HALF_OPEN)
+        self.assertFalse(health.allow_request(now=100))
+
+        health.record(True, 0.5, now=101)
+        self.assertEqual(health.state, CLOSED)
+        self.assertTrue(health.allow_request(now=102))
+
+    def test_failed_probe_reopens(self):
+        health = SourceHealth('scrape_medscape')
+        for t in range(3):
+            health.record(False, 0.5, now=t)
+        health.allow_request(now=100)
+        health.record(False, 0.5, now=101)
+        self.assertEqual(health.state, OPEN)
+        self.assertFalse(health.allow_request(now=120))
+
+    def test_registry_orders_fastest_healthy_source_first(self):
+        def scrape_a(name): pass
+        def scrape_b(name): pass
+
+        registry = SourceHealthRegistry()
+        registry.get('scrape_a').record(False, 4.0, now=0)
+        registry.get('scrape_b').record(True, 0.2, now=0)
+        self.assertEqual(registry.order([scrape_a, scrape_b]), [scrape_b, scrape_a])
+
+
+class SingleFlightTest(TestCase):
+    def setUp(self):
+        self.flight = SingleFlight(lock_dir=tempfile.mkdtemp(), wait_seconds=5, result_ttl=30)
+
+    def test_concurrent_callers_share_one_lookup(self):
+        calls = []
+
+        def slow_lookup():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'medicine_name': 'Ibuprofen'}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.flight.do('ibuprofen', slow_lookup)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'medicine_name': 'Ibuprofen'}] * 8)
+
+    def test_other_workers_reuse_shared_result(self):
+        """A second SingleFlight on the same lock directory stands in for another worker."""
+        self.flight.do('ibuprofen', lambda: {'medicine_name': 'Ibuprofen'})
+        other_worker = SingleFlight(lock_dir=self.flight.lock_dir, wait_seconds=5, result_ttl=30)
+        result = other_worker.do('ibuprofen', lambda: self.fail('lookup should not run again'))
+        self.assertEqual(result, {'medicine_name': 'Ibuprofen'})
+
+    def test_normalize_term(self):
+        self.assertEqual(normalize_term('  Vitamin   D3 '), 'vitamin d3')
+
+
+IBUPROFEN_RESULT = {
+    'source': 'Drugs.com',
+    'medicine_name': 'Ibuprofen',
+    'treats_disease': 'Ibuprofen is used to treat pain, fever and inflammation from many conditions.',
+    'side_effects': 'Upset stomach, mild heartburn, nausea and dizziness.',
+    'frequency': 'Follow prescription instructions',
+    'meal_relation': 'Check with pharmacist',
+}
+
+
+@override_settings(MEDICINE_EXTERNAL_SOFT_TTL_SECONDS=3600, MEDICINE_EXTERNAL_HARD_TTL_SECONDS=86400,
+                   MEDICINE_NEGATIVE_TTL_SECONDS=600)
+class StaleWhileRevalidateTest(TestCase):
+    def setUp(self):
+        flight = SingleFlight(lock_dir=tempfile.mkdtemp(), wait_seconds=5, result_ttl=30)
+        patcher = mock.patch.object(views, 'lookup_flight', flight)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def cache_entry(self, age_seconds, result=IBUPROFEN_RESULT):
+        ExternalLookup.objects.create(
+            term='ibuprofen', result=result,
+            fetched_at=timezone.now() - timedelta(seconds=age_seconds),
+        )
+
+    @mock.patch.object(views, 'schedule_refresh')
+    @mock.patch.object(views, 'query_medlineplus_api')
+    def test_fresh_entry_served_without_lookup(self, query, schedule):
+        self.cache_entry(age_seconds=60)
+        self.assertEqual(views.lookup_external_medicine('Ibuprofen'), IBUPROFEN_RESULT)
+        query.assert_not_called()
+        schedule.assert_not_called()
+
+    @mock.patch.object(views, 'schedule_refresh')
+    @mock.patch.object(views, 'query_medlineplus_api')
+    def test_stale_entry_served_while_refresh_is_scheduled(self, query, schedule):
+        self.cache_entry(age_seconds=7200)
+        self.assertEqual(views.lookup_external_medicine('Ibuprofen'), IBUPROFEN_RESULT)
+        query.assert_not_called()
+        schedule.assert_called_once_with('ibuprofen')
+
+    @mock.patch.object(views, 'query_medlineplus_api', return_value=IBUPROFEN_RESULT)
+    def test_expired_entry_fetched_synchronously_and_promoted(self, query):
+        self.cache_entry(age_seconds=200000, result=None)
+        self.assertEqual(views.lookup_external_medicine('Ibuprofen'), IBUPROFEN_RESULT)
+        query.assert_called_once()
+        self.assertEqual(ExternalLookup.objects.get(term='ibuprofen').result, IBUPROFEN_RESULT)
+        self.assertEqual(Medicine.objects.get(medicine_name='Ibuprofen').source, 'Drugs.com')
+
+    @mock.patch.object(views, 'schedule_refresh')
+    @mock.patch.object(views, 'query_medlineplus_api', return_value=IBUPROFEN_RESULT)
+    def test_not_found_entries_expire_after_the_negative_ttl(self, query, schedule):
+        self.cache_entry(age_seconds=300, result=None)
+        self.assertIsNone(views.lookup_external_medicine('Ibuprofen'))
+        query.assert_not_called()
+
+        ExternalLookup.objects.filter(term='ibuprofen').update(fetched_at=timezone.now() - timedelta(seconds=900))
+        self.assertEqual(views.lookup_external_medicine('Ibuprofen'), IBUPROFEN_RESULT)
+        query.assert_called_once()
+        schedule.assert_not_called()  # Not served stale
+
+    @mock.patch.object(views, 'query_medlineplus_api', side_effect=views.SourceUnavailable('All sources down'))
+    def test_source_failures_are_not_cached(self, query):
+        self.assertIsNone(views.lookup_external_medicine('Ibuprofen'))
+        self.assertFalse(ExternalLookup.objects.exists())
+
+        self.cache_entry(age_seconds=200000)
+        self.assertEqual(views.lookup_external_medicine('Ibuprofen'), IBUPROFEN_RESULT)  # Expired, but better than nothing
+        self.assertEqual(query.call_count, 2)
+
+    def test_open_circuits_are_not_a_negative_answer(self):
+        with mock.patch.object(views.time, 'sleep'), \
+                mock.patch.object(SourceHealth, 'allow_request', return_value=False):
+            with self.assertRaises(views.SourceUnavailable):
+                views.fallback_drug_search('Ibuprofen')
+
+    def test_promotion_keeps_curated_rows(self):
+        Medicine.objects.create(medicine_name='Ibuprofen', medicine_type='Allopathic', treats_disease='Fever')
+        views.promote_to_catalogue(IBUPROFEN_RESULT)
+        self.assertEqual(Medicine.objects.get(medicine_name='Ibuprofen').treats_disease, 'Fever')
+
+
+@override_settings(MEDICINE_NEGATIVE_TTL_SECONDS=3600)
+class PrefetchMedicinesCommandTest(TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.names_file = f'{self.workdir}/names.txt'
+        with open(self.names_file, 'w') as f:
+            f.write('# formulary\nIbuprofen\nibuprofen \nUnknownium\n')
+
+    def lookup(self, name):
+        return IBUPROFEN_RESULT if name.lower() == 'ibuprofen' else None
+
+    def test_prefetch_stores_results_and_removes_checkpoint_when_done(self):
+        with mock.patch('medicines.management.commands.prefetch_medicines.query_medlineplus_api',
+                        side_effect=self.lookup) as query:
+            call_command('prefetch_medicines', self.names_file, min_interval=0, stdout=io.StringIO())
+            self.assertEqual(query.call_count, 2)
+            self.assertTrue(Medicine.objects.filter(medicine_name='Ibuprofen').exists())
+            self.assertIsNone(ExternalLookup.objects.get(term='unknownium').result)
+            self.assertFalse(os.path.exists(f'{self.names_file}.checkpoint'))
+
+            call_command('prefetch_medicines', self.names_file, min_interval=0, stdout=io.StringIO())
+            self.assertEqual(query.call_count, 2)  # Both cached results are still fresh
+
+            call_command('prefetch_medicines', self.names_file, min_interval=0, refresh=True, stdout=io.StringIO())
+            self.assertEqual(query.call_count, 4)
+
+    def test_source_outage_is_an_error_and_retried(self):
+        def outage(name):
+            if name == 'Unknownium':
+                raise views.SourceUnavailable('No answer from scrape_drugs_com')
+            return self.lookup(name)
+
+        with mock.patch('medicines.management.commands.prefetch_medicines.query_medlineplus_api',
+                        side_effect=outage):
+            out = io.StringIO()
+            call_command('prefetch_medicines', self.names_file, min_interval=0, stdout=out)
+        self.assertIn('1 errors', out.getvalue())
+        self.assertFalse(ExternalLookup.objects.filter(term='unknownium').exists())
+        with open(f'{self.names_file}.checkpoint') as f:
+            self.assertEqual(f.read(), 'ibuprofen\n')
+
+        with mock.patch('medicines.management.commands.prefetch_medicines.query_medlineplus_api',
+                        side_effect=self.lookup) as query:
+            call_command('prefetch_medicines', self.names_file, min_interval=0, stdout=io.StringIO())
+        query.assert_called_once_with('Unknownium')
+        self.assertFalse(os.path.exists(f'{self.names_file}.checkpoint'))
+
+    def test_expired_not_found_results_are_looked_up_again(self):
+        ExternalLookup.objects.create(term='unknownium', result=None, fetched_at=timezone.now() - timedelta(hours=2))
+        ExternalLookup.objects.create(term='ibuprofen', result=IBUPROFEN_RESULT,
+                                      fetched_at=timezone.now() - timedelta(hours=2))
+        with mock.patch('medicines.management.commands.prefetch_medicines.query_medlineplus_api',
+                        side_effect=self.lookup) as query:
+            call_command('prefetch_medicines', self.names_file, min_interval=0, stdout=io.StringIO())
+        query.assert_called_once_with('Unknownium')
+
+    def test_prefetch_resumes_an_interrupted_run(self):
+        with open(f'{self.names_file}.checkpoint', 'w') as f:
+            f.write('ibuprofen\n')
+        with mock.patch('medicines.management.commands.prefetch_medicines.query_medlineplus_api',
+                        side_effect=self.lookup) as query:
+            call_command('prefetch_medicines', self.names_file, min_interval=0, stdout=io.StringIO())
+        query.assert_called_once_with('Unknownium')
+        self.assertFalse(os.path.exists(f'{self.names_file}.checkpoint'))
+
+
+CSV_HEADER = (
+    'prognosis,allopathic_medicine,allopathic_frequency,allopathic_meal_relation,allopathic_routine,'
+    'allopathic_side_effects,allopathic_contraindications,ayurvedic_medicine,ayurvedic_frequency,'
+    'ayurvedic_meal_relation,ayurvedic_routine,ayurvedic_side_effects,ayurvedic_contraindications\n'
+)
+
+
+class LoadMedicinesCommandTest(TestCase):
+    def write_csv(self, rows):
+        path = f'{tempfile.mkdtemp()}/medicines.csv'
+        with open(path, 'w') as f:
+            f.write(CSV_HEADER + ''.join(row + '\n' for row in rows))
+        return path
+
+    def test_loads_both_medicine_types_and_updates_on_reload(self):
+        path = self.write_csv([
+            'Migraine,Sumatriptan,1-0-0,After Meal,Rest,"Dizziness, nausea",Heart disease,Pathyadi Kadha,1-0-1,Before Meal,Sleep,Generally safe,',
+            'Migraine,Sumatriptan,0-0-1,After Meal,Rest,Other,Other,,,,,,',
+        ])
+        call_command('load_medicines', path, chunk_size=1, stdout=io.StringIO())
+
+        sumatriptan = Medicine.objects.get(medicine_name='Sumatriptan')
+        self.assertEqual(sumatriptan.frequency, '1-0-0')  # First row for a name wins
+        self.assertEqual(sumatriptan.side_effects, 'Dizziness, nausea')
+        self.assertIsNone(Medicine.objects.get(medicine_name='Pathyadi Kadha').contraindications)
+        self.assertEqual(Medicine.objects.count(), 2)
+
+        changed = self.write_csv([
+            'Migraine,Sumatriptan,1-1-1,After Meal,Rest,Drowsiness,Heart disease,,,,,,',
+        ])
+        Medicine.objects.filter(medicine_name='Sumatriptan').update(source='1mg')
+        call_command('load_medicines', changed, stdout=io.StringIO())
+        sumatriptan = Medicine.objects.get(medicine_name='Sumatriptan')
+        self.assertEqual(sumatriptan.frequency, '1-1-1')
+        self.assertEqual(sumatriptan.source, '')  # Curated again, so lookups no longer overwrite it
+
+    def test_builds_disease_index(self):
+        path = self.write_csv([
+            'Migraine,Sumatriptan,1-0-0,After Meal,Rest,Nausea,Heart disease,Pathyadi Kadha,1-0-1,Before Meal,Sleep,Generally safe,',
+            'Common  Cold,Paracetamol,1-1-1,After Meal,Rest,Rare,Liver disease,,,,,,',
+            'Migraine,Paracetamol,1-1-1,After Meal,Rest,Rare,Liver disease,,,,,,',
+        ])
+        call_command('load_medicines', path, stdout=io.StringIO())
+
+        self.assertEqual(DiseaseMedicine.objects.count(), 4)
+        migraine = Medicine.objects.treating(' MIGRAINE ')
+        self.assertEqual([m.medicine_name for m in migraine], ['Sumatriptan', 'Pathyadi Kadha', 'Paracetamol'])
+        self.assertEqual([m.medicine_name for m in Medicine.objects.treating('common cold')], ['Paracetamol'])
+
+        user = get_user_model().objects.create_user(username='u', email='u@example.com', password='pass12345')
+        client = APIClient()
+        client.force_authenticate(user)
+        with self.assertNumQueries(1):
+            response = client.get('/api/v1/medicines/by-disease/', {'disease': 'migraine'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+
+    def test_disease_links_keep_their_own_details(self):
+        path = self.write_csv([
+            'Common Cold,Paracetamol,1-1-1,After Meal,Rest,Rare,Liver disease,,,,,,',
+            'Migraine,Paracetamol,0-0-1,Before Meal,Dark room,Drowsiness,Alcohol use,,,,,,',
+        ])
+        call_command('load_medicines', path, chunk_size=1, stdout=io.StringIO())
+
+        link = DiseaseMedicine.objects.for_disease('migraine').get()
+        self.assertEqual(link.medicine.frequency, '1-1-1')
+        self.assertEqual((link.frequency, link.meal_relation, link.contraindications),
+                         ('0-0-1', 'Before Meal', 'Alcohol use'))
+
+    def test_reload_replaces_disease_links(self):
+        path = self.write_csv([
+            'Migraine,Sumatriptan,1-0-0,After Meal,Rest,Nausea,Heart disease,,,,,,',
+            'Common Cold,Paracetamol,1-1-1,After Meal,Rest,Rare,Liver disease,,,,,,',
+        ])
+        call_command('load_medicines', path, stdout=io.StringIO())
+
+        changed = self.write_csv([
+            'Cluster Headache,Sumatriptan,1-0-0,After Meal,Rest,Nausea,Heart disease,,,,,,',
+            'Cluster Headache,Sumatriptan,0-1-0,After Meal,Rest,Nausea,Heart disease,,,,,,',
+            'Migraine,Naproxen,1-0-1,After Meal,Rest,Heartburn,Ulcers,,,,,,',
+        ])
+        call_command('load_medicines', changed, chunk_size=3, batch_size=1, stdout=io.StringIO())
+
+        self.assertEqual([link.medicine_id for link in DiseaseMedicine.objects.for_disease('migraine')], ['Naproxen'])
+        self.assertEqual([link.medicine_id for link in DiseaseMedicine.objects.for_disease('cluster headache')],
+                         ['Sumatriptan'])
+        # Medicines not in the new file keep their links
+        self.assertEqual(DiseaseMedicine.objects.for_disease('common cold').count(), 1)
+
+
+MEDLINEPLUS_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<health-topics total="3" date-generated="10/01/2026 02:30:00">
+<health-topic title="Antibiotics" url="https://medlineplus.gov/antibiotics.html" language="English" id="1">
+<also-called>Antibacterials</also-called>
+<full-summary>&lt;p&gt;Antibiotics are medicines used to treat infections caused by bacteria, such as strep throat and urinary tract infections.&lt;/p&gt;&lt;p&gt;Side effects include upset stomach, diarrhea and allergic reactions in some people.&lt;/p&gt;</full-summary>
+<site title="Antibiotics" url="https://example.org"><organization>NIH</organization></site>
+</health-topic>
+<health-topic title="Antibioticos" url="https://medlineplus.gov/spanish/antibiotics.html" language="Spanish" id="2">
+<full-summary>&lt;p&gt;Los antibioticos se usan para tratar infecciones.&lt;/p&gt;</full-summary>
+</health-topic>
+<health-topic title="Empty Topic" url="https://medlineplus.gov/empty.html" language="English" id="3">
+<full-summary>&lt;p&gt;Short.&lt;/p&gt;</full-summary>
+</health-topic>
+</health-topics>
+"""
+
+
+class IngestMedlinePlusXmlCommandTest(TestCase):
+    def test_ingests_english_topics_with_usable_content(self):
+        path = f'{tempfile.mkdtemp()}/mplus_topics.xml'
+        with open(path, 'w') as f:
+            f.write(MEDLINEPLUS_XML)
+
+        call_command('ingest_medlineplus_xml', path, stdout=io.StringIO())
+
+        self.assertEqual(list(Medicine.objects.values_list('medicine_name', flat=True)), ['Antibiotics'])
+        antibiotics = Medicine.objects.get(medicine_name='Antibiotics')
+        self.assertIn('infections caused by bacteria', antibiotics.treats_disease)
+        self.assertIn('upset stomach', antibiotics.side_effects)
+
+
+@override_settings(MEDICINE_BULK_LOOKUP_DEADLINE_SECONDS=1)
+class BulkMedicineLookupTest(TransactionTestCase):
+    """Late lookups are cached from the worker threads, so these tests do not run inside a transaction."""
+
+    def setUp(self):
+        flight = SingleFlight(lock_dir=tempfile.mkdtemp(), wait_seconds=5, result_ttl=30)
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        for name, value in (('lookup_flight', flight), ('bulk_lookup_executor', self.executor)):
+            patcher = mock.patch.object(views, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.executor.shutdown)
+
+        user = get_user_model().objects.create_user(username='u', email='u@example.com', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        Medicine.objects.create(medicine_name='Paracetamol', medicine_type='Allopathic', treats_disease='Fever')
+        ExternalLookup.objects.create(term='unknownium', result=None, fetched_at=timezone.now())
+
+    @staticmethod
+    def fake_lookup(name):
+        if name == 'Slowmycin':
+            time.sleep(3)
+        return IBUPROFEN_RESULT if name == 'Ibuprofen' else None
+
+    def test_resolves_local_cached_external_and_slow_names(self):
+        with mock.patch.object(views, 'query_medlineplus_api', side_effect=self.fake_lookup):
+            started = time.perf_counter()
+            response = self.client.post('/api/v1/medicines/bulk-lookup/', {
+                'names': ['paracetamol', 'Unknownium', 'Ibuprofen', 'Slowmycin', 'PARACETAMOL'],
+            }, format='json')
+            elapsed = time.perf_counter() - started
+
+        self.assertEqual(response.status_code, 200)
+        statuses = {item['name']: item['status'] for item in response.data['results']}
+        self.assertEqual(statuses, {
+            'paracetamol': 'local', 'Unknownium': 'not_found', 'Ibuprofen': 'external', 'Slowmycin': 'timeout',
+        })
+        self.assertLess(elapsed, 2.5)  # Bounded by the shared deadline, not by the slowest lookup
+        self.assertTrue(ExternalLookup.objects.filter(term='ibuprofen').exists())
+
+        # The slow lookup finishes in the background and is cached for the next request
+        self.executor.shutdown(wait=True)
+        self.assertTrue(ExternalLookup.objects.filter(term='slowmycin').exists())
+
+    def test_partial_names_match_the_catalogue_like_search(self):
+        Medicine.objects.create(medicine_name='Paracetamol 500mg Tablet', medicine_type='Allopathic', treats_disease='Fever')
+        with mock.patch.object(views, 'query_medlineplus_api') as query:
+            response = self.client.post('/api/v1/medicines/bulk-lookup/', {'names': ['paracetamol 500']}, format='json')
+        query.assert_not_called()
+        result = response.data['results'][0]
+        self.assertEqual(result['status'], 'local')
+        self.assertEqual(result['medicines'][0]['medicine_name'], 'Paracetamol 500mg Tablet')
+
+    def test_rejects_too_many_names(self):
+        with override_settings(MEDICINE_BULK_LOOKUP_MAX_NAMES=2):
+            response = self.client.post('/api/v1/medicines/bulk-lookup/', {'names': ['a1', 'b2', 'c3']}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class InteractionIndexTest(TestCase):
+    def setUp(self):
+        # A fresh index per test; the module-level one may hold terms from another test's rolled-back rows
+        patcher = mock.patch.object(views, 'interaction_index', InteractionIndex())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        user = get_user_model().objects.create_user(username='u', email='u@example.com', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        rebuild_terms([
+            Medicine.objects.create(
+                medicine_name='Ibuprofen', medicine_type='Allopathic', treats_disease='Arthritis',
+                side_effects='Upset stomach, dizziness', contraindications='Severe liver or kidney impairment; peptic ulcer',
+            ),
+            Medicine.objects.create(
+                medicine_name='Prednisolone', medicine_type='Allopathic', treats_disease='Asthma',
+                side_effects='Stomach ulcer, raised blood sugar', contraindications='Uncontrolled diabetes',
+            ),
+            Medicine.objects.create(medicine_name='Tulsi', medicine_type='Ayurvedic', treats_disease='Common Cold',
+                                    contraindications='None'),
+        ])
+
+    def test_extract_terms(self):
+        self.assertEqual(extract_terms('Severe liver or kidney impairment'), {'liver disease', 'kidney disease'})
+        self.assertEqual(extract_terms('Use with caution in high blood pressure, pregnancy (consult doctor)'),
+                         {'hypertension', 'pregnancy'})
+        self.assertEqual(extract_terms('None widely known, consult practitioner'), set())
+
+    def test_check_reports_drug_and_condition_conflicts(self):
+        response = self.client.post('/api/v1/medicines/interactions/check/', {
+            'medicines': ['ibuprofen', 'Prednisolone', 'Tulsi', 'Madeupium'],
+            'conditions': ['Chronic kidney disease', 'Type 2 diabetes'],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['medicines'], ['Ibuprofen', 'Prednisolone', 'Tulsi'])
+        self.assertEqual(response.data['unknown_medicines'], ['Madeupium'])
+        self.assertEqual(response.data['drug_conflicts'], [{
+            'medicine': 'Ibuprofen', 'conflicts_with': 'Prednisolone', 'reason': 'side_effect', 'terms': ['stomach ulcer'],
+        }])
+        self.assertEqual(response.data['condition_conflicts'], [
+            {'medicine': 'Ibuprofen', 'condition': 'Chronic kidney disease', 'terms': ['kidney disease']},
+            {'medicine': 'Prednisolone', 'condition': 'Type 2 diabetes', 'terms': ['diabetes']},
+        ])
+        self.assertTrue(response.data['has_conflicts'])
+
+    def test_rejects_missing_medicines(self):
+        response = self.client.post('/api/v1/medicines/interactions/check/', {'conditions': ['asthma']}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_medicines_without_terms_match_case_insensitively(self):
+        Medicine.objects.create(medicine_name='Ashwagandha', medicine_type='Ayurvedic', treats_disease='')
+        report = views.interaction_index.check(['ashwagandha', 'tulsi'])
+        self.assertEqual(report['medicines'], ['Tulsi', 'Ashwagandha'])
+        self.assertEqual(report['unknown_medicines'], [])
+
+    def test_index_reloads_only_when_the_terms_version_changes(self):
+        index = views.interaction_index
+        index.check(['Ibuprofen'])
+        with self.assertNumQueries(0):  # One cache read, no table scan
+            index.check(['Ibuprofen', 'Prednisolone'])
+
+        rebuild_terms([Medicine.objects.create(medicine_name='Metformin', medicine_type='Allopathic',
+                                               treats_disease='Diabetes', contraindications='Kidney disease')])
+        report = index.check(['Metformin'], ['Chronic kidney disease'])
+        self.assertEqual(report['condition_conflicts'][0]['medicine'], 'Metformin')
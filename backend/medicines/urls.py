@@ -1,6 +1,10 @@
 from django.urls import path
-from .views import MedicineSearchView
+from .views import BulkMedicineLookupView, InteractionCheckView, MedicineSearchView, MedicinesByDiseaseView, SourceHealthView
 
 urlpatterns = [
     path('search/', MedicineSearchView.as_view(), name='medicine-search'),
+    path('bulk-lookup/', BulkMedicineLookupView.as_view(), name='medicine-bulk-lookup'),
+    path('interactions/check/', InteractionCheckView.as_view(), name='medicine-interaction-check'),
+    path('by-disease/', MedicinesByDiseaseView.as_view(), name='medicines-by-disease'),
+    path('sources/health/', SourceHealthView.as_view(), name='medicine-source-health'),
 ]
\ No newline at end of file
@@ -1,23 +1,118 @@
 # medicines/views.py
 
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .models import Medicine
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from django.db.models import Q
+from django.db.models.functions import Lower
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial, reduce
+from .interactions import interaction_index, rebuild_terms
+from .models import Medicine, ExternalLookup
 from .serializers import MedicineSerializer
+from .replay import configure_session
+from .single_flight import lookup_flight, normalize_term
+from .source_health import source_health
 import requests
 import xml.etree.ElementTree as ET
 import re
 from bs4 import BeautifulSoup
+import operator
+import threading
 import time
 import urllib.parse
 
-def query_medlineplus_api(medicine_name):
+# Shared HTTP session for every outbound lookup. Keeping one session gives us
+# connection reuse and a single place to mount transport adapters (e.g. the
+# record/replay adapters in medicines/replay.py).
+http_session = requests.Session()
+configure_session(http_session)
+
+def clean_extracted_text(text):
+    """Clean and format extracted text properly."""
+    if not text:
+        return None
+    
+    # Remove HTML tags if present
+    text = re.sub(r'<[^>]+>', '', text)
+    # Remove extra whitespaces and normalize
+    text = re.sub(r'\s+', ' ', text)
+    # Remove special characters that cause formatting issues
+    text = re.sub(r'[^\w\s.,;:!?()-]', ' ', text)
+    # Clean up multiple spaces
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+def extract_detailed_info(summary_text):
+    """Extract structured information from summary text."""
+    if not summary_text:
+        return "Not specified.", "Not specified."
+    
+    uses = "Not specified."
+    side_effects = "Not specified."
+    
+    # Extract uses/indications
+    use_patterns = [
+        r'(?:used to treat|treats|treatment (?:of|for)|indicated for|prescribed for)\s+([^.!?]+)',
+        r'(?:helps (?:treat|with)|effective (?:for|against))\s+([^.!?]+)',
+        r'(?:medication is used|drug is used|medicine is used)\s+(?:to|for)\s+([^.!?]+)'
+    ]
+    
+    for pattern in use_patterns:
+        match = re.search(pattern, summary_text, re.IGNORECASE)
+        if match:
+            uses = clean_extracted_text(match.group(1))
+            break
+    
+    # If no specific pattern found, look for treatment-related sentences
+    if uses == "Not specified.":
+        sentences = summary_text.split('.')
+        for sentence in sentences:
+            if any(keyword in sentence.lower() for keyword in ['treat', 'therapy', 'condition', 'disease', 'disorder']):
+                uses = clean_extracted_text(sentence)
+                break
+    
+    # Extract side effects
+    side_effect_patterns = [
+        r'(?:side effects?|adverse (?:effects?|reactions?)|may cause|can cause)\s*(?:include|are|:)?\s*([^.!?]+)',
+        r'(?:common side effects?|possible (?:side effects?|reactions?))\s*(?:include|are|:)?\s*([^.!?]+)',
+        r'(?:warning|caution|alert)[^.!?]*([^.!?]*(?:effects?|reactions?)[^.!?]*)'
+    ]
+    
+    for pattern in side_effect_patterns:
+        match = re.search(pattern, summary_text, re.IGNORECASE)
+        if match:
+            side_effects = clean_extracted_text(match.group(1))
+            break
+    
+    # If no specific pattern found, look for warning-related sentences
+    if side_effects == "Not specified.":
+        sentences = summary_text.split('.')
+        for sentence in sentences:
+            if any(keyword in sentence.lower() for keyword in ['side effect', 'warning', 'caution', 'adverse', 'reaction']):
+                side_effects = clean_extracted_text(sentence)
+                break
+    
+    return uses, side_effects
+
+def query_medlineplus_api(medicine_name, use_fallback=True):
     """
     Queries the official MedlinePlus Web Service API for drug information.
     This is the most robust and reliable method.
+    Pass use_fallback=False to query MedlinePlus alone (used by the benchmark).
+    Returns None only when the sources answered without the drug; raises
+    SourceUnavailable when the answer is missing because sources failed.
     """
+    def give_up(error=None):
+        result = fallback_drug_search(medicine_name) if use_fallback else None
+        if result is None and error is not None:
+            raise SourceUnavailable(f"MedlinePlus: {error}")
+        return result
+
     print(f"\n--- QUERYING MedlinePlus API for '{medicine_name}' ---")
     try:
         # This is the correct, official API endpoint
@@ -31,7 +126,7 @@ def query_medlineplus_api(medicine_name):
         
         print(f"1. Fetching API data from: {base_url} with params: {params}")
         
-        response = requests.get(base_url, params=params, timeout=15)
+        response = http_session.get(base_url, params=params, timeout=15)
         response.raise_for_status()
         
         # The API returns XML, so we parse it
@@ -43,7 +138,7 @@ def query_medlineplus_api(medicine_name):
         if first_result is None:
             print("   - INFO: No results found in the MedlinePlus API.")
             # FALLBACK TO OTHER SOURCES
-            return fallback_drug_search(medicine_name)
+            return give_up()
 
         print("2. Found results. Parsing XML data...")
         
@@ -54,73 +149,6 @@ def query_medlineplus_api(medicine_name):
                 return clean_extracted_text(found.text.strip())
             return None
 
-        def clean_extracted_text(text):
-            """Clean and format extracted text properly."""
-            if not text:
-                return None
-            
-            # Remove HTML tags if present
-            text = re.sub(r'<[^>]+>', '', text)
-            # Remove extra whitespaces and normalize
-            text = re.sub(r'\s+', ' ', text)
-            # Remove special characters that cause formatting issues
-            text = re.sub(r'[^\w\s.,;:!?()-]', ' ', text)
-            # Clean up multiple spaces
-            text = re.sub(r'\s+', ' ', text)
-            return text.strip()
-
-        def extract_detailed_info(summary_text):
-            """Extract structured information from summary text."""
-            if not summary_text:
-                return "Not specified.", "Not specified."
-            
-            uses = "Not specified."
-            side_effects = "Not specified."
-            
-            # Extract uses/indications
-            use_patterns = [
-                r'(?:used to treat|treats|treatment (?:of|for)|indicated for|prescribed for)\s+([^.!?]+)',
-                r'(?:helps (?:treat|with)|effective (?:for|against))\s+([^.!?]+)',
-                r'(?:medication is used|drug is used|medicine is used)\s+(?:to|for)\s+([^.!?]+)'
-            ]
-            
-            for pattern in use_patterns:
-                match = re.search(pattern, summary_text, re.IGNORECASE)
-                if match:
-                    uses = clean_extracted_text(match.group(1))
-                    break
-            
-            # If no specific pattern found, look for treatment-related sentences
-            if uses == "Not specified.":
-                sentences = summary_text.split('.')
-                for sentence in sentences:
-                    if any(keyword in sentence.lower() for keyword in ['treat', 'therapy', 'condition', 'disease', 'disorder']):
-                        uses = clean_extracted_text(sentence)
-                        break
-            
-            # Extract side effects
-            side_effect_patterns = [
-                r'(?:side effects?|adverse (?:effects?|reactions?)|may cause|can cause)\s*(?:include|are|:)?\s*([^.!?]+)',
-                r'(?:common side effects?|possible (?:side effects?|reactions?))\s*(?:include|are|:)?\s*([^.!?]+)',
-                r'(?:warning|caution|alert)[^.!?]*([^.!?]*(?:effects?|reactions?)[^.!?]*)'
-            ]
-            
-            for pattern in side_effect_patterns:
-                match = re.search(pattern, summary_text, re.IGNORECASE)
-                if match:
-                    side_effects = clean_extracted_text(match.group(1))
-                    break
-            
-            # If no specific pattern found, look for warning-related sentences
-            if side_effects == "Not specified.":
-                sentences = summary_text.split('.')
-                for sentence in sentences:
-                    if any(keyword in sentence.lower() for keyword in ['side effect', 'warning', 'caution', 'adverse', 'reaction']):
-                        side_effects = clean_extracted_text(sentence)
-                        break
-            
-            return uses, side_effects
-
         def scrape_medlineplus_page_if_available(element):
             """Try to get better information by scraping the actual page."""
             try:
@@ -135,7 +163,7 @@ def query_medlineplus_api(medicine_name):
                         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
                     }
                     
-                    page_response = requests.get(page_url, headers=headers, timeout=10)
+                    page_response = http_session.get(page_url, headers=headers, timeout=10)
                     if page_response.status_code == 200:
                         soup = BeautifulSoup(page_response.content, 'html.parser')
                         
@@ -170,7 +198,7 @@ def query_medlineplus_api(medicine_name):
         generic_terms = ['pain relievers', 'blood thinners', 'antibiotics', 'medicines', 'drugs']
         if any(term in page_title.lower() for term in generic_terms) and medicine_name.lower() not in page_title.lower():
             print(f"   - Got generic info '{page_title}', trying other sources")
-            return fallback_drug_search(medicine_name)
+            return give_up()
         
         # Try to get better content by scraping the actual page first
         scraped_content = scrape_medlineplus_page_if_available(first_result)
@@ -197,7 +225,7 @@ def query_medlineplus_api(medicine_name):
         # If still no useful content, try other sources
         if not full_summary or full_summary == "Not specified.":
             print("   - No useful content from MedlinePlus, trying other sources")
-            return fallback_drug_search(medicine_name)
+            return give_up()
         
         uses, side_effects = extract_detailed_info(full_summary)
         
@@ -213,14 +241,18 @@ def query_medlineplus_api(medicine_name):
 
     except requests.exceptions.RequestException as e:
         print(f"   - CRITICAL ERROR during API request: {e}")
-        return fallback_drug_search(medicine_name)
+        return give_up(e)
     except ET.ParseError as e:
         print(f"   - CRITICAL ERROR parsing XML response: {e}")
-        return fallback_drug_search(medicine_name)
+        return give_up(e)
 
 # NEW FALLBACK SCRAPING FUNCTIONS
 def fallback_drug_search(medicine_name):
-    """Try multiple drug databases when MedlinePlus fails"""
+    """
+    Try multiple drug databases when MedlinePlus fails. Raises SourceUnavailable
+    instead of returning None when a source failed or was skipped, since then
+    "not found" is not a real answer.
+    """
     print(f"\n--- FALLBACK SEARCH for '{medicine_name}' ---")
     
     scrapers = [
@@ -230,43 +262,95 @@ def fallback_drug_search(medicine_name):
         scrape_medscape
     ]
     
-    for scraper in scrapers:
-        try:
-            print(f"Trying {scraper.__name__}...")
-            result = scraper(medicine_name)
-            
-            if result and is_valid_result(result, medicine_name):
-                print(f"✓ SUCCESS with {scraper.__name__}")
-                return result
-            
-            time.sleep(1)  # Small delay between attempts
-            
-        except Exception as e:
-            print(f"✗ {scraper.__name__} failed: {e}")
+    # Try the healthiest sources first and skip any whose circuit is open
+    unanswered = []
+    for scraper in source_health.order(scrapers):
+        health = source_health.get(scraper.__name__)
+        if not health.allow_request():
+            print(f"⏭ Skipping {scraper.__name__}: circuit {health.state}")
+            unanswered.append(scraper.__name__)
             continue
+
+        result, failed = run_source(scraper, medicine_name, health)
+        if result:
+            print(f"✓ SUCCESS with {scraper.__name__}")
+            return result
+        if failed:
+            unanswered.append(scraper.__name__)
+        
+        time.sleep(1)  # Small delay between attempts
     
-    print("✗ All fallback sources failed")
+    if unanswered:
+        print(f"✗ No fallback source had '{medicine_name}'; unavailable: {', '.join(unanswered)}")
+        raise SourceUnavailable(f"No answer from {', '.join(unanswered)}")
+    print("✗ No fallback source lists this medicine")
     return None
 
-def is_valid_result(result, medicine_name):
-    """Check if the result contains valid medicine information"""
-    if not result:
-        return False
-    
-    treats = result.get('treats_disease', '')
-    side_effects = result.get('side_effects', '')
-    
+def search_source(scraper, medicine_name, health=None):
+    """
+    Run one scraper and record the call on its source's circuit breaker. Only
+    errors count as failures: a site that answers but does not list the drug
+    (a misspelled or unknown name) is healthy. Returns a valid result or None.
+    """
+    return run_source(scraper, medicine_name, health)[0]
+
+def run_source(scraper, medicine_name, health=None):
+    """search_source, also telling whether the scraper failed: (result or None, failed)."""
+    health = health or source_health.get(scraper.__name__)
+    started = time.perf_counter()
+    failed = False
+    try:
+        print(f"Trying {scraper.__name__}...")
+        result = scraper(medicine_name)
+    except Exception as e:
+        print(f"✗ {scraper.__name__} failed: {e}")
+        result, failed = None, True
+    health.record(not failed, time.perf_counter() - started)
+
+    if result and is_valid_result(result, medicine_name):
+        return result, False
+    if not failed:
+        print(f"✗ {scraper.__name__} has no match for '{medicine_name}'")
+    return None, failed
+
+def is_informative_text(text, min_length):
+    """Check that an extracted field holds real content rather than a placeholder"""
     # Check if we got meaningful content
     invalid_responses = [
         'not available', 'not specified', 'information not available',
         'no specific information', 'consult healthcare', 'access denied'
     ]
+    return bool(text) and len(text) > min_length and not any(phrase in text.lower() for phrase in invalid_responses)
+
+def is_valid_result(result, medicine_name):
+    """Check if the result contains valid medicine information"""
+    if not result:
+        return False
     
-    treats_valid = treats and len(treats) > 30 and not any(phrase in treats.lower() for phrase in invalid_responses)
-    effects_valid = side_effects and len(side_effects) > 20 and not any(phrase in side_effects.lower() for phrase in invalid_responses)
+    treats_valid = is_informative_text(result.get('treats_disease', ''), 30)
+    effects_valid = is_informative_text(result.get('side_effects', ''), 20)
     
     return treats_valid or effects_valid
 
+class SourceUnavailable(Exception):
+    """A drug site could not be searched (network error, HTTP error or bot-check page)."""
+
+# Phrases of the bot-check and block pages served in place of the real content
+BOT_CHECK_MARKERS = (b'are you a robot', b'verify you are human', b'unusual traffic', b'access denied', b'cf-chl-')
+
+def fetch_page(url, headers):
+    """GET a page for a scraper; raises SourceUnavailable unless the site really answered."""
+    try:
+        response = http_session.get(url, headers=headers, timeout=15)
+    except requests.RequestException as e:
+        raise SourceUnavailable(str(e)) from e
+    if response.status_code in (403, 429) or response.status_code >= 500:
+        raise SourceUnavailable(f"HTTP {response.status_code} from {url}")
+    head = response.content[:5000].lower()
+    if any(marker in head for marker in BOT_CHECK_MARKERS):
+        raise SourceUnavailable(f"Bot-check page from {url}")
+    return response
+
 def scrape_drugs_com(medicine_name):
     """Scrape Drugs.com"""
     try:
@@ -278,19 +362,19 @@ def scrape_drugs_com(medicine_name):
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
         }
         
-        response = requests.get(url, headers=headers, timeout=15)
+        response = fetch_page(url, headers)
         
         if response.status_code != 200:
             # Try search
             search_url = f"https://www.drugs.com/search.php?searchterm={urllib.parse.quote(medicine_name)}"
-            response = requests.get(search_url, headers=headers, timeout=15)
+            response = fetch_page(search_url, headers)
             soup = BeautifulSoup(response.content, 'html.parser')
             
             # Find exact medicine link
             for link in soup.find_all('a', href=re.compile(r'^/.*\.html$')):
                 if medicine_name.lower() in link.get_text().lower():
                     url = "https://www.drugs.com" + link['href']
-                    response = requests.get(url, headers=headers, timeout=15)
+                    response = fetch_page(url, headers)
                     break
             else:
                 return None
@@ -314,6 +398,8 @@ def scrape_drugs_com(medicine_name):
             'meal_relation': 'Check with pharmacist',
         }
         
+    except SourceUnavailable:
+        raise
     except Exception as e:
         return None
 
@@ -324,7 +410,7 @@ def scrape_rxlist(medicine_name):
         
         headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
         
-        response = requests.get(search_url, headers=headers, timeout=15)
+        response = fetch_page(search_url, headers)
         soup = BeautifulSoup(response.content, 'html.parser')
         
         # Find first drug result
@@ -336,7 +422,7 @@ def scrape_rxlist(medicine_name):
         if not drug_url.startswith('http'):
             drug_url = "https://www.rxlist.com" + drug_url
         
-        response = requests.get(drug_url, headers=headers, timeout=15)
+        response = fetch_page(drug_url, headers)
         soup = BeautifulSoup(response.content, 'html.parser')
         
         title = soup.find('h1')
@@ -354,6 +440,8 @@ def scrape_rxlist(medicine_name):
             'meal_relation': 'Check drug label',
         }
         
+    except SourceUnavailable:
+        raise
     except Exception as e:
         return None
 
@@ -364,7 +452,7 @@ def scrape_webmd(medicine_name):
         
         headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
         
-        response = requests.get(search_url, headers=headers, timeout=15)
+        response = fetch_page(search_url, headers)
         soup = BeautifulSoup(response.content, 'html.parser')
         
         # Find drug link
@@ -373,7 +461,7 @@ def scrape_webmd(medicine_name):
             return None
         
         drug_url = "https://www.webmd.com" + drug_link['href']
-        response = requests.get(drug_url, headers=headers, timeout=15)
+        response = fetch_page(drug_url, headers)
         soup = BeautifulSoup(response.content, 'html.parser')
         
         title = soup.find('h1')
@@ -391,6 +479,8 @@ def scrape_webmd(medicine_name):
             'meal_relation': 'Follow instructions',
         }
         
+    except SourceUnavailable:
+        raise
     except Exception as e:
         return None
 
@@ -402,7 +492,7 @@ def scrape_medscape(medicine_name):
         
         headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
         
-        response = requests.get(url, headers=headers, timeout=15)
+        response = fetch_page(url, headers)
         soup = BeautifulSoup(response.content, 'html.parser')
         
         title = soup.find('h1')
@@ -420,6 +510,8 @@ def scrape_medscape(medicine_name):
             'meal_relation': 'Check with doctor',
         }
         
+    except SourceUnavailable:
+        raise
     except Exception as e:
         return None
 
@@ -470,12 +562,113 @@ def clean_scraped_text(text):
     if len(text) > 300:
         sentences = text[:300].rsplit('.', 1)
         if len(sentences) > 1 and len(sentences[0]) > 50:
-            text = sentences + '.'
+            text = sentences[0] + '.'
         else:
             text = text[:300] + "..."
     
     return text
 
+# --- CACHED EXTERNAL LOOKUPS (stale-while-revalidate) ---
+
+refresh_executor = ThreadPoolExecutor(max_workers=settings.MEDICINE_REFRESH_WORKERS, thread_name_prefix='medicine-refresh')
+bulk_lookup_executor = ThreadPoolExecutor(max_workers=settings.MEDICINE_BULK_LOOKUP_WORKERS, thread_name_prefix='bulk-lookup')
+_pending_refreshes = set()
+_pending_lock = threading.Lock()
+
+def promote_to_catalogue(result):
+    """Save a validated external result as a Medicine so later searches are served from the DB"""
+    name = (result.get('medicine_name') or '').strip()[:255]
+    if not name:
+        return None
+    existing = Medicine.objects.filter(medicine_name=name).first()
+    if existing and not existing.source:
+        return existing  # Never overwrite curated catalogue rows with scraped text
+    medicine, _ = Medicine.objects.update_or_create(
+        medicine_name=name,
+        defaults={
+            'medicine_type': 'Allopathic',
+            'treats_disease': (result.get('treats_disease') or '')[:255],
+            'side_effects': result.get('side_effects'),
+            'frequency': (result.get('frequency') or '')[:100] or None,
+            'meal_relation': (result.get('meal_relation') or '')[:100] or None,
+            'source': (result.get('source') or 'External')[:100],
+        }
+    )
+    rebuild_terms([medicine])
+    print(f"[INFO] Promoted '{name}' into the local medicine catalogue")
+    return medicine
+
+def store_external_result(term, result):
+    """Cache an external lookup result and promote it into the catalogue if it is valid"""
+    ExternalLookup.objects.update_or_create(term=term, defaults={'result': result, 'fetched_at': timezone.now()})
+    if result and is_valid_result(result, term):
+        return promote_to_catalogue(result)
+    return None
+
+def refresh_external_entry(term, search_term=None):
+    """
+    Fetch a term through the external chain, cache the result and promote it if
+    it is valid. SourceUnavailable propagates and nothing is cached.
+    """
+    result = lookup_flight.do(term, lambda: query_medlineplus_api(search_term or term))
+    store_external_result(term, result)
+    return result
+
+def _background_refresh(term):
+    try:
+        refresh_external_entry(term)
+    except Exception as e:
+        print(f"[WARNING] Background refresh of '{term}' failed: {e}")
+    finally:
+        with _pending_lock:
+            _pending_refreshes.discard(term)
+        close_old_connections()
+
+def schedule_refresh(term):
+    """Queue a background refresh unless one is already pending for this term"""
+    with _pending_lock:
+        if term in _pending_refreshes:
+            return False
+        _pending_refreshes.add(term)
+    refresh_executor.submit(_background_refresh, term)
+    return True
+
+def lookup_external_medicine(search_term):
+    """
+    Serve an external result with stale-while-revalidate semantics:
+    fresh entries are returned as is, entries past the soft TTL are returned
+    immediately while a background refresh is queued, and entries past the
+    hard TTL (or never seen) are fetched synchronously. When the sources are
+    down, the expired entry (or nothing) is served and nothing is cached.
+    """
+    term = normalize_term(search_term)
+    entry = ExternalLookup.objects.filter(term=term).first()
+    if entry and serve_cached_entry(entry):
+        return entry.result
+    try:
+        return refresh_external_entry(term, search_term)
+    except SourceUnavailable as e:
+        print(f"[WARNING] External lookup of '{term}' unavailable: {e}")
+        return entry.result if entry else None
+
+def serve_cached_entry(entry):
+    """
+    Apply the soft/hard TTL rules to a cached lookup. Returns True if the entry
+    may be served (queueing a background refresh when it is stale), False if it
+    has expired and must be fetched again. "Not found" entries only live for
+    MEDICINE_NEGATIVE_TTL_SECONDS and are never served stale.
+    """
+    age = (timezone.now() - entry.fetched_at).total_seconds()
+    if entry.result is None:
+        return age < settings.MEDICINE_NEGATIVE_TTL_SECONDS
+    if age < settings.MEDICINE_EXTERNAL_SOFT_TTL_SECONDS:
+        return True
+    if age < settings.MEDICINE_EXTERNAL_HARD_TTL_SECONDS:
+        print(f"[INFO] Serving stale result for '{entry.term}' and refreshing in the background")
+        schedule_refresh(entry.term)
+        return True
+    return False
+
 class MedicineSearchView(APIView):
     """
     Hybrid search view. First checks local DB, then falls back to the MedlinePlus API.
@@ -492,9 +685,161 @@ class MedicineSearchView(APIView):
             serializer = MedicineSerializer(db_results, many=True)
             return Response(serializer.data)
 
-        # Updated to call the new MedlinePlus API function
-        api_data = query_medlineplus_api(search_term)
+        # External lookups are cached and refreshed in the background; concurrent
+        # searches for the same term share one upstream lookup.
+        api_data = lookup_external_medicine(search_term)
         if api_data:
             return Response([api_data])
 
         return Response([])
+
+
+class BulkMedicineLookupView(APIView):
+    """
+    Resolves many medicine names in one call (e.g. all drugs on a prescription).
+    Local and cached hits are found with one query each; the remaining names are
+    looked up externally in parallel under one shared deadline.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        names = request.data.get('names')
+        if not isinstance(names, list) or not names:
+            return Response({"error": "'names' must be a non-empty list of medicine names."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(names) > settings.MEDICINE_BULK_LOOKUP_MAX_NAMES:
+            return Response({"error": f"At most {settings.MEDICINE_BULK_LOOKUP_MAX_NAMES} names can be looked up at once."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Keep the caller's order, one entry per distinct (normalized) name
+        requested = {}
+        for name in names:
+            if isinstance(name, str) and len(name.strip()) >= 2:
+                requested.setdefault(normalize_term(name), name.strip())
+        if not requested:
+            return Response({"error": "Each name must be at least 2 characters long."}, status=status.HTTP_400_BAD_REQUEST)
+
+        answers = {}
+
+        # 1. Local catalogue: exact names through the LOWER(medicine_name) index, then
+        #    substring matches for the rest like MedicineSearchView, one query each
+        def add_local(term, medicine):
+            answer = answers.setdefault(term, {"status": "local", "medicines": []})
+            answer["medicines"].append(MedicineSerializer(medicine).data)
+
+        for medicine in Medicine.objects.annotate(name_key=Lower('medicine_name')).filter(name_key__in=list(requested)):
+            add_local(normalize_term(medicine.medicine_name), medicine)
+        unmatched = [term for term in requested if term not in answers]
+        if unmatched:
+            contains_any = reduce(operator.or_, (Q(medicine_name__icontains=term) for term in unmatched))
+            for medicine in Medicine.objects.filter(contains_any):
+                for term in unmatched:
+                    if term in normalize_term(medicine.medicine_name):
+                        add_local(term, medicine)
+
+        # 2. Cached external lookups, one IN query
+        misses = [term for term in requested if term not in answers]
+        for entry in ExternalLookup.objects.filter(term__in=misses):
+            if serve_cached_entry(entry):
+                answers[entry.term] = self.external_answer(entry.result, "cached")
+
+        # 3. Everything else goes to the external chain concurrently under one deadline
+        misses = [term for term in requested if term not in answers]
+        if misses:
+            answers.update(self.lookup_externally(misses, requested))
+
+        return Response({"results": [{"name": requested[term], **answers[term]} for term in requested]})
+
+    @staticmethod
+    def external_answer(result, state):
+        if result:
+            return {"status": state, "medicines": [result]}
+        return {"status": "not_found", "medicines": []}
+
+    def lookup_externally(self, terms, requested):
+        answers = {}
+        request_thread = threading.current_thread()
+        futures = {
+            bulk_lookup_executor.submit(lookup_flight.do, term, partial(query_medlineplus_api, requested[term])): term
+            for term in terms
+        }
+        done, _ = wait(futures, timeout=settings.MEDICINE_BULK_LOOKUP_DEADLINE_SECONDS)
+
+        for future, term in futures.items():
+            if future not in done:
+                # The lookup keeps running on the shared pool; its result is cached for the next request
+                future.add_done_callback(partial(store_late_result, term, request_thread))
+                answers[term] = {"status": "timeout", "medicines": []}
+                continue
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"[WARNING] Bulk lookup of '{term}' failed: {e}")
+                answers[term] = {"status": "error", "medicines": []}
+                continue
+            # Results in time are stored from this thread, so the request does not wait on worker writes
+            store_external_result(term, result)
+            answers[term] = self.external_answer(result, "external")
+        return answers
+
+
+def store_late_result(term, request_thread, future):
+    """Done-callback for a bulk lookup that missed the deadline: cache its result anyway."""
+    try:
+        store_external_result(term, future.result())
+        print(f"[INFO] Late bulk lookup of '{term}' cached")
+    except Exception as e:
+        print(f"[WARNING] Late bulk lookup of '{term}' failed: {e}")
+    finally:
+        # Runs on the worker thread, unless the lookup finished just as the request gave up on it
+        if threading.current_thread() is not request_thread:
+            close_old_connections()
+
+
+class InteractionCheckView(APIView):
+    """
+    Checks a list of medicines for conflicts with each other and with the
+    patient's conditions, using the precomputed contraindication index.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        medicines = request.data.get('medicines')
+        conditions = request.data.get('conditions', [])
+        if isinstance(conditions, str):
+            conditions = [conditions]
+        if not isinstance(medicines, list) or not medicines or not isinstance(conditions, list):
+            return Response({"error": "'medicines' must be a non-empty list and 'conditions' a list of strings."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(medicines) > settings.MEDICINE_BULK_LOOKUP_MAX_NAMES:
+            return Response({"error": f"At most {settings.MEDICINE_BULK_LOOKUP_MAX_NAMES} medicines can be checked at once."}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = interaction_index.check(
+            [str(name) for name in medicines],
+            [str(condition) for condition in conditions if str(condition).strip()],
+        )
+        return Response(report)
+
+
+class MedicinesByDiseaseView(APIView):
+    """
+    Returns the medicines that treat a disease, using the disease -> medicine
+    index built by load_medicines (a single indexed query).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        disease = request.query_params.get('disease', '').strip()
+        if not disease:
+            return Response({"error": "A 'disease' query parameter is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        medicines = Medicine.objects.treating(disease)
+        return Response(MedicineSerializer(medicines, many=True).data)
+
+
+class SourceHealthView(APIView):
+    """
+    Admin-only view exposing circuit breaker state and health scores
+    for each external drug source, in the order they will be tried.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response({"sources": sorted(source_health.snapshot(), key=lambda s: -s['score'])})
@@ -1,3 +1,6 @@
 from django.contrib import admin
+from .models import Report, ReportJob, ReportText
 
-# Register your models here.
+admin.site.register(ReportJob)
+admin.site.register(Report)
+admin.site.register(ReportText)
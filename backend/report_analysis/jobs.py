@@ -0,0 +1,226 @@
+# report_analysis/jobs.py
+
+"""
+Database-backed queue for report analysis.
+
+An upload becomes a QUEUED ReportJob row. Workers (the process_report_jobs
+command, and optionally a few threads inside the web process) claim jobs with
+a conditional UPDATE, so each job is processed by exactly one worker even when
+several run at once, and record the stage they are in as they go. While a job
+runs its worker refreshes updated_at every REPORT_JOB_HEARTBEAT_SECONDS; jobs
+whose worker died stop being refreshed and are re-queued once that is longer
+than REPORT_JOB_STALE_SECONDS ago.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import result_cache
+from .models import Report, ReportJob
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def enqueue_report(user, uploaded_file, enrich=None):
+    """
+    Store the upload as a queued job and wake the in-process workers once it is
+    committed. A file whose result can be served from the cache (see
+    cached_report_result) becomes a finished job at once.
+    """
+    from .views import cached_report_result, patient_details
+
+    digest = result_cache.content_hash(uploaded_file)
+    enrich = enrich or settings.REPORT_LLM_ENRICHMENT
+    cached = cached_report_result(digest, patient_details(user), enrich)
+    if cached is not None:
+        job = create_finished_job(user, uploaded_file.name, digest, cached, enrich=enrich)
+        print(f"[INFO] Report {digest[:12]} already processed, job {job.id} finished from cache")
+        return job
+
+    job = ReportJob(user=user, original_name=uploaded_file.name[:255], content_hash=digest, enrich=enrich)
+    job.report_file.save(uploaded_file.name, uploaded_file, save=False)
+    job.save()
+    print(f"[INFO] Queued report job {job.id} for '{job.original_name}'")
+    transaction.on_commit(wake_in_process_workers)
+    return job
+
+
+def create_finished_job(user, file_name, digest, result, enrich=None, report=None):
+    """
+    A DONE job holding a result that was produced outside the queue (from the
+    cache or in the request), saved to the user's history unless `report` already is.
+    """
+    report = report or Report.objects.record(user, file_name, digest, result)
+    return ReportJob.objects.create(
+        user=user, original_name=file_name[:255], content_hash=digest, enrich=enrich or settings.REPORT_LLM_ENRICHMENT,
+        status=ReportJob.DONE, analysis=result['analysis'], analysis_source=result['analysis_source'],
+        lab_values=result['lab_values'], extracted_text_preview=result['extracted_text_preview'],
+        llm_pending=result.get('llm_pending', False), report=report, finished_at=timezone.now(),
+    )
+
+
+def attach_late_analysis(job_id, future):
+    """
+    When an LLM call that missed its latency budget finishes, put its answer on
+    the job and its history entry in place of the local summary (a failed call
+    just clears llm_pending).
+    """
+    def save(future):
+        try:
+            analysis = future.result()
+        except Exception as e:
+            print(f"[WARNING] Late LLM analysis for job {job_id} failed: {e}")
+            analysis = None
+        try:
+            fields = {'llm_pending': False, 'updated_at': timezone.now()}
+            if analysis:
+                fields.update(analysis=analysis, analysis_source='llm')
+                print(f"[INFO] Late LLM analysis attached to report job {job_id}")
+            ReportJob.objects.filter(pk=job_id).update(**fields)
+            if 'analysis' in fields:
+                Report.objects.filter(jobs__pk=job_id).update(analysis=analysis, analysis_source='llm')
+        finally:
+            close_old_connections()
+
+    future.add_done_callback(save)
+
+
+def requeue_stale_jobs():
+    """Put jobs abandoned by a crashed worker back in the queue, or fail them after too many attempts."""
+    cutoff = timezone.now() - timedelta(seconds=settings.REPORT_JOB_STALE_SECONDS)
+    stale = ReportJob.objects.filter(status__in=ReportJob.IN_PROGRESS, updated_at__lt=cutoff)
+    for job in stale.filter(attempts__gte=settings.REPORT_JOB_MAX_ATTEMPTS).only('pk', 'report_file'):
+        # Failed for good, so the upload goes the same way as in finish_job
+        failed = stale.filter(pk=job.pk).update(
+            status=ReportJob.FAILED, error="Processing the report took too long. Please try again.",
+            report_file='', updated_at=timezone.now(), finished_at=timezone.now(),
+        )
+        if failed:
+            job.report_file.delete(save=False)
+    return stale.update(status=ReportJob.QUEUED, updated_at=timezone.now())
+
+
+def claim_next_job():
+    """Atomically take the oldest queued job, or return None when the queue is empty."""
+    requeue_stale_jobs()
+    for job_id in ReportJob.objects.filter(status=ReportJob.QUEUED).values_list('id', flat=True)[:10]:
+        claimed = ReportJob.objects.filter(pk=job_id, status=ReportJob.QUEUED).update(
+            status=ReportJob.EXTRACTING, attempts=F('attempts') + 1, updated_at=timezone.now(),
+        )
+        if claimed:  # Another worker may have taken it between the SELECT and the UPDATE
+            return ReportJob.objects.get(pk=job_id)
+    return None
+
+
+class Heartbeat:
+    """
+    Refreshes a running job's updated_at from a background thread, so a long OCR
+    or LLM stage is not mistaken for a dead worker and processed a second time.
+    """
+
+    def __init__(self, job_id, interval):
+        self.job_id = job_id
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._beat, name=f'report-job-heartbeat-{job_id}', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _beat(self):
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    ReportJob.objects.filter(pk=self.job_id, status__in=ReportJob.IN_PROGRESS).update(
+                        updated_at=timezone.now())
+                except Exception as e:
+                    print(f"[WARNING] Heartbeat for report job {self.job_id} failed: {e}")
+        finally:
+            close_old_connections()
+
+
+def set_stage(job, stage):
+    if job.status != stage:
+        job.status = stage
+        ReportJob.objects.filter(pk=job.pk).update(status=stage, updated_at=timezone.now())
+        print(f"[INFO] Report job {job.id}: {stage}")
+
+
+def finish_job(job, **fields):
+    # The upload is only needed while the job runs
+    job.report_file.delete(save=False)
+    fields.update(report_file='', updated_at=timezone.now(), finished_at=timezone.now())
+    ReportJob.objects.filter(pk=job.pk).update(**fields)
+
+
+def run_job(job):
+    """Process one claimed job and store its outcome."""
+    from .views import ReportProcessingError, patient_details, process_report
+
+    started = time.perf_counter()
+    pending = []
+    try:
+        with Heartbeat(job.pk, settings.REPORT_JOB_HEARTBEAT_SECONDS), job.report_file.open('rb') as report_file:
+            result = process_report(report_file, job.original_name, on_stage=lambda stage: set_stage(job, stage),
+                                    digest=job.content_hash or None, patient=patient_details(job.user),
+                                    enrich=job.enrich, on_fallback=pending.append)
+    except ReportProcessingError as e:
+        finish_job(job, status=ReportJob.FAILED, error=str(e))
+    except Exception as e:
+        print(f"❌ ERROR: Report job {job.id} failed: {e}")
+        finish_job(job, status=ReportJob.FAILED, error="An internal error occurred during processing.")
+    else:
+        report = Report.objects.record(job.user, job.original_name, job.content_hash, result)
+        finish_job(job, status=ReportJob.DONE, analysis=result['analysis'], analysis_source=result['analysis_source'],
+                   lab_values=result['lab_values'], extracted_text_preview=result['extracted_text_preview'],
+                   llm_pending=bool(pending), report=report)
+        if pending:  # Only once the local summary is saved, so the late answer cannot be overwritten
+            attach_late_analysis(job.id, pending[0])
+    print(f"[INFO] Report job {job.id} finished in {time.perf_counter() - started:.1f}s")
+
+
+def process_available_jobs(limit=None):
+    """Run queued jobs one after another until the queue is empty (or `limit` jobs ran)."""
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
+
+
+def _drain_in_background():
+    close_old_connections()
+    try:
+        process_available_jobs()
+    except Exception as e:
+        print(f"[WARNING] In-process report worker stopped: {e}")
+    finally:
+        close_old_connections()
+
+
+def wake_in_process_workers():
+    """Let the web process's own worker threads drain the queue (no-op when they are disabled)."""
+    global _executor
+    workers = settings.REPORT_JOB_IN_PROCESS_WORKERS
+    if workers <= 0:
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='report-job')
+    _executor.submit(_drain_in_background)
@@ -0,0 +1,374 @@
+# report_analysis/lab_values.py
+
+"""
+Local extraction and flagging of lab values.
+
+Most lab reports are tables of "analyte  value  unit  reference range" lines.
+parse_lab_values recognises those lines for common analytes and flags each
+value as low, normal or high, using the range printed on the report when
+there is one and the reference-range table below otherwise. It needs no
+network call and runs in milliseconds, so the LLM analysis becomes optional.
+
+The table is indexed once at import time by (analyte, sex); each entry holds
+the age bands with their accepted units and limits.
+"""
+
+import re
+
+# analyte: (display name, aliases as printed on reports)
+ANALYTES = {
+    'hemoglobin': ('Hemoglobin', ['hemoglobin', 'haemoglobin', 'hb', 'hgb']),
+    'rbc': ('RBC Count', ['total rbc count', 'rbc count', 'red blood cell count', 'rbc']),
+    'wbc': ('WBC Count', ['total leucocyte count', 'total leukocyte count', 'total wbc count', 'wbc count',
+                          'white blood cell count', 'tlc', 'wbc']),
+    'platelets': ('Platelet Count', ['platelet count', 'platelets', 'plt']),
+    'hematocrit': ('Hematocrit', ['hematocrit', 'haematocrit', 'packed cell volume', 'pcv', 'hct']),
+    'mcv': ('MCV', ['mean corpuscular volume', 'mcv']),
+    'esr': ('ESR', ['erythrocyte sedimentation rate', 'esr']),
+    'glucose_fasting': ('Fasting Glucose', ['fasting blood sugar', 'fasting plasma glucose', 'fasting glucose',
+                                            'glucose fasting', 'blood sugar fasting', 'glucose (fasting)', 'fbs']),
+    'glucose_pp': ('Post-prandial Glucose', ['post prandial blood sugar', 'postprandial blood sugar',
+                                             'postprandial glucose', 'glucose pp', 'blood sugar pp', 'ppbs']),
+    'glucose_random': ('Random Glucose', ['random blood sugar', 'random glucose', 'glucose random', 'rbs', 'glucose']),
+    'hba1c': ('HbA1c', ['glycated hemoglobin', 'glycosylated hemoglobin', 'glycated haemoglobin',
+                        'glycosylated haemoglobin', 'hba1c']),
+    'total_cholesterol': ('Total Cholesterol', ['total cholesterol', 'cholesterol total', 'serum cholesterol', 'cholesterol']),
+    'hdl': ('HDL Cholesterol', ['hdl cholesterol', 'hdl-c', 'hdl']),
+    'ldl': ('LDL Cholesterol', ['ldl cholesterol', 'ldl-c', 'ldl']),
+    'triglycerides': ('Triglycerides', ['triglycerides', 'serum triglycerides', 'tg']),
+    'creatinine': ('Creatinine', ['serum creatinine', 'creatinine']),
+    'urea': ('Urea', ['blood urea', 'serum urea', 'urea']),
+    'bun': ('Blood Urea Nitrogen', ['blood urea nitrogen', 'bun']),
+    'uric_acid': ('Uric Acid', ['serum uric acid', 'uric acid']),
+    'tsh': ('TSH', ['thyroid stimulating hormone', 'tsh']),
+    't3': ('Total T3', ['total t3', 'triiodothyronine', 't3']),
+    't4': ('Total T4', ['total t4', 'thyroxine', 't4']),
+    'alt': ('ALT (SGPT)', ['sgpt', 'alt']),
+    'ast': ('AST (SGOT)', ['sgot', 'ast']),
+    'bilirubin_total': ('Total Bilirubin', ['total bilirubin', 'bilirubin total', 'serum bilirubin']),
+    'vitamin_d': ('Vitamin D', ['25-hydroxy vitamin d', '25 hydroxy vitamin d', '25-oh vitamin d', 'vitamin d3', 'vitamin d']),
+    'vitamin_b12': ('Vitamin B12', ['vitamin b12', 'b12']),
+    'sodium': ('Sodium', ['serum sodium', 'sodium', 'na+', 'na']),
+    'potassium': ('Potassium', ['serum potassium', 'potassium', 'k+', 'k']),
+    'calcium': ('Calcium', ['serum calcium', 'total calcium', 'calcium']),
+}
+
+# Accepted units, after normalize_unit
+G_DL = ('g/dl',)
+MG_DL = ('mg/dl',)
+PERCENT = ('%',)
+THOUSAND_PER_UL = ('10^3/ul', 'x10^3/ul', '10³/ul', 'x10³/ul', 'thou/ul', 'k/ul', '10^9/l', 'x10^9/l')
+PER_CUMM = ('/cumm', 'cells/cumm', '/ul', 'cells/ul', '/mm3', 'cells/mm3')
+MILLION_PER_UL = ('10^6/ul', 'x10^6/ul', '10⁶/ul', 'mill/ul', 'million/ul', 'millions/cumm', 'mill/cumm', '10^12/l', 'x10^12/l')
+LAKH_PER_CUMM = ('lakhs/cumm', 'lakh/cumm', 'lakhs/ul')
+MEQ_L = ('meq/l', 'mmol/l')
+
+ANY = 'any'
+ADULT_AGE = 30  # Used when the patient's age is unknown
+
+# (analyte, sex, min age, max age (exclusive, None = no limit), units, low, high)
+REFERENCE_RANGES = [
+    ('hemoglobin', 'male', 18, None, G_DL, 13.0, 17.0),
+    ('hemoglobin', 'female', 18, None, G_DL, 12.0, 15.5),
+    ('hemoglobin', ANY, 18, None, G_DL, 12.0, 17.0),
+    ('hemoglobin', ANY, 6, 18, G_DL, 11.5, 15.5),
+    ('hemoglobin', ANY, 0, 6, G_DL, 11.0, 14.0),
+    ('rbc', 'male', 18, None, MILLION_PER_UL, 4.5, 5.5),
+    ('rbc', 'female', 18, None, MILLION_PER_UL, 3.8, 4.8),
+    ('rbc', ANY, 0, None, MILLION_PER_UL, 3.8, 5.5),
+    ('wbc', ANY, 0, None, THOUSAND_PER_UL, 4.0, 11.0),
+    ('wbc', ANY, 0, None, PER_CUMM, 4000, 11000),
+    ('platelets', ANY, 0, None, THOUSAND_PER_UL, 150, 450),
+    ('platelets', ANY, 0, None, PER_CUMM, 150000, 450000),
+    ('platelets', ANY, 0, None, LAKH_PER_CUMM, 1.5, 4.5),
+    ('hematocrit', 'male', 18, None, PERCENT, 40, 50),
+    ('hematocrit', 'female', 18, None, PERCENT, 36, 46),
+    ('hematocrit', ANY, 0, None, PERCENT, 36, 50),
+    ('mcv', ANY, 0, None, ('fl',), 83, 101),
+    ('esr', 'male', 0, None, ('mm/hr', 'mm/1sthr', 'mm/h'), 0, 15),
+    ('esr', 'female', 0, None, ('mm/hr', 'mm/1sthr', 'mm/h'), 0, 20),
+    ('esr', ANY, 0, None, ('mm/hr', 'mm/1sthr', 'mm/h'), 0, 20),
+    ('glucose_fasting', ANY, 0, None, MG_DL, 70, 100),
+    ('glucose_fasting', ANY, 0, None, ('mmol/l',), 3.9, 5.6),
+    ('glucose_pp', ANY, 0, None, MG_DL, 70, 140),
+    ('glucose_random', ANY, 0, None, MG_DL, 70, 140),
+    ('hba1c', ANY, 0, None, PERCENT, 4.0, 5.6),
+    ('total_cholesterol', ANY, 0, None, MG_DL, 0, 200),
+    ('hdl', 'male', 18, None, MG_DL, 40, 100),
+    ('hdl', 'female', 18, None, MG_DL, 50, 100),
+    ('hdl', ANY, 0, None, MG_DL, 40, 100),
+    ('ldl', ANY, 0, None, MG_DL, 0, 100),
+    ('triglycerides', ANY, 0, None, MG_DL, 0, 150),
+    ('creatinine', 'male', 18, None, MG_DL, 0.7, 1.3),
+    ('creatinine', 'female', 18, None, MG_DL, 0.6, 1.1),
+    ('creatinine', ANY, 18, None, MG_DL, 0.6, 1.3),
+    ('urea', ANY, 0, None, MG_DL, 15, 40),
+    ('bun', ANY, 0, None, MG_DL, 7, 20),
+    ('uric_acid', 'male', 18, None, MG_DL, 3.4, 7.0),
+    ('uric_acid', 'female', 18, None, MG_DL, 2.4, 6.0),
+    ('uric_acid', ANY, 18, None, MG_DL, 2.4, 7.0),
+    ('tsh', ANY, 18, None, ('uiu/ml', 'miu/l', 'mu/l', 'uu/ml'), 0.4, 4.5),
+    ('t3', ANY, 18, None, ('ng/dl',), 80, 200),
+    ('t4', ANY, 18, None, ('ug/dl',), 5.0, 12.0),
+    ('alt', ANY, 0, None, ('u/l', 'iu/l'), 7, 56),
+    ('ast', ANY, 0, None, ('u/l', 'iu/l'), 10, 40),
+    ('bilirubin_total', ANY, 0, None, MG_DL, 0.2, 1.2),
+    ('vitamin_d', ANY, 0, None, ('ng/ml',), 30, 100),
+    ('vitamin_b12', ANY, 0, None, ('pg/ml',), 200, 900),
+    ('sodium', ANY, 0, None, MEQ_L, 135, 145),
+    ('potassium', ANY, 0, None, MEQ_L, 3.5, 5.1),
+    ('calcium', ANY, 0, None, MG_DL, 8.6, 10.3),
+]
+
+
+def _build_index():
+    index = {}
+    for analyte, sex, min_age, max_age, units, low, high in REFERENCE_RANGES:
+        index.setdefault((analyte, sex), []).append((min_age, max_age, frozenset(units), low, high))
+    return index
+
+
+def _build_units():
+    units_by_analyte = {}
+    for analyte, _, _, _, units, _, _ in REFERENCE_RANGES:
+        units_by_analyte.setdefault(analyte, set()).update(units)
+    return units_by_analyte
+
+
+REFERENCE_INDEX = _build_index()
+# Every unit the table knows per analyte
+ANALYTE_UNITS = _build_units()
+
+# Aliases short enough to be an initial or a word ("K. Sharma", "NA"); only read with a unit the table knows
+UNIT_REQUIRED_ALIASES = {'k', 'na'}
+
+# One pattern for every alias, longest first so "hdl cholesterol" wins over "cholesterol"
+_ALIAS_TO_ANALYTE = {alias: analyte for analyte, (_, aliases) in ANALYTES.items() for alias in aliases}
+ANALYTE_LINE = re.compile(
+    r'^[\s\-*•\d.)]*(?<!\w)(?P<name>' + '|'.join(
+        re.escape(alias) for alias in sorted(_ALIAS_TO_ANALYTE, key=len, reverse=True)
+    ) + r')(?![\w+])(?P<rest>.*)$',
+    re.IGNORECASE,
+)
+NUMBER = r'\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?'
+# "1st hour", "2nd hr": part of the test name, not its value
+ORDINAL = r'\d+(?:st|nd|rd|th)\b'
+VALUE = re.compile(
+    r'^(?:[^\d<>]|' + ORDINAL + r'){0,40}?(?P<comparator>[<>]=?)?\s*(?P<value>' + NUMBER + r')'
+    r'(?![\d/])(?!(?:st|nd|rd|th)\b)',
+    re.IGNORECASE,
+)
+REPORTED_RANGE = re.compile(
+    r'(?P<low>' + NUMBER + r')\s*(?:-|–|to)\s*(?P<high>' + NUMBER + r')'
+    r'|(?P<upper_cmp><=?|up\s*to)\s*(?P<upper>' + NUMBER + r')'
+    r'|(?P<lower_cmp>>=?)\s*(?P<lower>' + NUMBER + r')',
+    re.IGNORECASE,
+)
+UNIT = re.compile(r'(?:[a-zµμ%/^³⁶]|(?:x?10[\^]?\d)|(?<=/)\d)[\w/^µμ%.³⁶]*', re.IGNORECASE)
+NOT_UNITS = {'h', 'l', 'high', 'low', 'normal', 'to', 'up', 'method', 'ref', 'range', 'reference', 'interval', 'result'}
+
+
+def to_number(text):
+    return float(text.replace(',', ''))
+
+
+def normalize_unit(unit):
+    unit = unit.lower().replace('µ', 'u').replace('μ', 'u').replace(' ', '')
+    return unit.replace('cu.mm', 'cumm').replace('cmm', 'cumm').replace('mm³', 'mm3').rstrip('.')
+
+
+def find_unit(text):
+    for match in UNIT.finditer(text):
+        unit = match.group(0)
+        if unit.lower().strip('.') not in NOT_UNITS:
+            return unit
+    return ''
+
+
+def reference_range(analyte, unit, sex=None, age=None):
+    """(low, high) from the table for this analyte, unit, sex and age, or None if the table has no match."""
+    unit = normalize_unit(unit)
+    age = ADULT_AGE if age is None else age
+    sexes = [sex, ANY] if sex in ('male', 'female') else [ANY]
+    for key in sexes:
+        for min_age, max_age, units, low, high in REFERENCE_INDEX.get((analyte, key), []):
+            if min_age <= age and (max_age is None or age < max_age) and unit in units:
+                return low, high
+    return None
+
+
+def parse_line(line, sex=None, age=None):
+    """The lab value on one line of report text, as a dict, or None if the line is not an analyte result."""
+    match = ANALYTE_LINE.match(line)
+    if not match:
+        return None
+    rest = match.group('rest')
+    value_match = VALUE.match(rest)
+    if not value_match:
+        return None
+
+    analyte = _ALIAS_TO_ANALYTE[match.group('name').lower()]
+    value = to_number(value_match.group('value'))
+    after_value = rest[value_match.end():]
+
+    low = high = None
+    range_source = None
+    range_match = REPORTED_RANGE.search(after_value)
+    unit_text = after_value
+    if range_match:
+        if range_match.group('low') is not None:
+            low, high = to_number(range_match.group('low')), to_number(range_match.group('high'))
+        elif range_match.group('upper') is not None:
+            high = to_number(range_match.group('upper'))
+        else:
+            low = to_number(range_match.group('lower'))
+        range_source = 'report'
+        unit_text = after_value[:range_match.start()] + ' ' + after_value[range_match.end():]
+
+    unit = find_unit(unit_text)
+    if match.group('name').lower() in UNIT_REQUIRED_ALIASES and normalize_unit(unit) not in ANALYTE_UNITS[analyte]:
+        return None
+    if range_source is None:
+        table_range = reference_range(analyte, unit, sex, age)
+        if table_range:
+            low, high = table_range
+            range_source = 'table'
+
+    if range_source is None:
+        status = 'unknown'
+    elif low is not None and value < low:
+        status = 'low'
+    elif high is not None and value > high:
+        status = 'high'
+    else:
+        status = 'normal'
+
+    return {
+        'analyte': analyte,
+        'name': ANALYTES[analyte][0],
+        'value': value,
+        'unit': unit,
+        'reference_low': low,
+        'reference_high': high,
+        'range_source': range_source,
+        'status': status,
+        'line': line.strip(),
+    }
+
+
+def parse_lab_values(text, sex=None, age=None):
+    """Every recognised lab value in the text, first occurrence per analyte, in report order."""
+    sex = sex.lower() if sex else None
+    results, seen = [], set()
+    for line in text.splitlines():
+        result = parse_line(line, sex, age)
+        if result and result['analyte'] not in seen:
+            seen.add(result['analyte'])
+            results.append(result)
+    return results
+
+
+def format_range(result):
+    low, high = result['reference_low'], result['reference_high']
+    if low is not None and high is not None:
+        return f"{low:g} - {high:g}"
+    if high is not None:
+        return f"up to {high:g}"
+    return f"at least {low:g}"
+
+
+# Rule-based text for the local summary, keyed by (analyte, status). Worded as
+# cautiously as the LLM prompt asks: possibilities, never diagnoses.
+POSSIBLE_CONDITIONS = {
+    ('hemoglobin', 'low'): "Low hemoglobin might indicate anemia, for example from low iron or vitamin levels.",
+    ('hemoglobin', 'high'): "High hemoglobin can be seen with dehydration, smoking or living at altitude.",
+    ('rbc', 'low'): "A low red cell count might be related to anemia.",
+    ('wbc', 'low'): "A low white cell count can occur with some viral infections or medicines.",
+    ('wbc', 'high'): "A high white cell count often goes with an infection or inflammation.",
+    ('platelets', 'low'): "Low platelets might be related to infections such as dengue, medicines or other causes.",
+    ('platelets', 'high'): "High platelets can be a reaction to inflammation, infection or low iron.",
+    ('esr', 'high'): "A raised ESR is a general sign of inflammation somewhere in the body.",
+    ('glucose_fasting', 'high'): "High fasting glucose might indicate prediabetes or diabetes.",
+    ('glucose_pp', 'high'): "High glucose after meals might indicate prediabetes or diabetes.",
+    ('glucose_random', 'high'): "High blood glucose might indicate prediabetes or diabetes.",
+    ('hba1c', 'high'): "A high HbA1c reflects raised average blood sugar over the last 2-3 months.",
+    ('total_cholesterol', 'high'): "High cholesterol is a risk factor for heart disease.",
+    ('ldl', 'high'): "High LDL (\"bad\") cholesterol is a risk factor for heart disease.",
+    ('hdl', 'low'): "Low HDL (\"good\") cholesterol is a risk factor for heart disease.",
+    ('triglycerides', 'high'): "High triglycerides are linked to diet, weight, alcohol and blood sugar.",
+    ('creatinine', 'high'): "High creatinine might indicate reduced kidney function or dehydration.",
+    ('urea', 'high'): "High urea can be seen with dehydration or reduced kidney function.",
+    ('uric_acid', 'high'): "High uric acid can be associated with gout or kidney stones.",
+    ('tsh', 'high'): "A high TSH might indicate an underactive thyroid (hypothyroidism).",
+    ('tsh', 'low'): "A low TSH might indicate an overactive thyroid (hyperthyroidism).",
+    ('alt', 'high'): "A raised ALT (SGPT) can point to liver inflammation or fatty liver.",
+    ('ast', 'high'): "A raised AST (SGOT) can come from the liver or from muscles.",
+    ('bilirubin_total', 'high'): "High bilirubin can be related to the liver, the bile ducts or red cell breakdown.",
+    ('vitamin_d', 'low'): "Low vitamin D is common and can affect bone and muscle health.",
+    ('vitamin_b12', 'low'): "Low vitamin B12 can cause tiredness, anemia or tingling in the hands and feet.",
+    ('sodium', 'low'): "Low sodium can be related to fluid balance, medicines or hormonal causes.",
+    ('potassium', 'low'): "Low potassium can be related to vomiting, diarrhoea or some medicines.",
+    ('potassium', 'high'): "High potassium can be related to kidney function or some medicines.",
+    ('calcium', 'low'): "Low calcium is often related to low vitamin D.",
+}
+PRECAUTIONS = {
+    'hemoglobin': "Include iron-rich foods such as leafy greens, lentils, beans and dates.",
+    'glucose_fasting': "Limit sugary drinks and refined carbohydrates, and stay physically active.",
+    'glucose_pp': "Limit sugary drinks and refined carbohydrates, and stay physically active.",
+    'glucose_random': "Limit sugary drinks and refined carbohydrates, and stay physically active.",
+    'hba1c': "Limit sugary drinks and refined carbohydrates, and stay physically active.",
+    'total_cholesterol': "Prefer whole grains, vegetables and unsaturated fats over fried and processed food.",
+    'ldl': "Prefer whole grains, vegetables and unsaturated fats over fried and processed food.",
+    'hdl': "Regular exercise and not smoking help raise HDL cholesterol.",
+    'triglycerides': "Cut down on sugar, refined carbohydrates and alcohol.",
+    'creatinine': "Drink enough water and avoid painkillers without medical advice.",
+    'urea': "Drink enough water and avoid painkillers without medical advice.",
+    'uric_acid': "Drink plenty of water and limit red meat, seafood and alcohol.",
+    'vitamin_d': "Safe sunlight exposure and vitamin D-rich foods such as eggs and fortified milk can help.",
+    'vitamin_b12': "Dairy, eggs and fortified foods are good sources of vitamin B12.",
+}
+GENERAL_PRECAUTION = "Keep a balanced diet, stay active, sleep well and drink enough water."
+DISCLAIMER = (
+    "This summary only compares your values with typical reference ranges; it is not medical advice or a "
+    "diagnosis. A value slightly outside a range can be normal for you. Please discuss your report with a "
+    "doctor, who can interpret it together with your history and suggest any treatment."
+)
+
+
+def format_lab_summary(results):
+    """
+    A markdown summary of the lab values built from the templates above, in the
+    same four sections as the LLM analysis (see build_analysis_prompt).
+    """
+    flagged = [r for r in results if r['status'] in ('low', 'high')]
+    lines = ["### 📝 Report Summary"]
+    if not results:
+        lines.append("No common lab values could be recognised automatically in this report.")
+    else:
+        lines.append(
+            f"{len(results)} test result(s) were read from your report; "
+            + (f"{len(flagged)} of them are outside the reference range:" if flagged
+               else "all of them with a known reference range are within it.")
+        )
+        for r in flagged:
+            lines.append(
+                f"- **{r['name']}**: {r['value']:g} {r['unit']} is **{r['status']}** "
+                f"(reference {format_range(r)} {r['unit']}).".replace('  ', ' ')
+            )
+
+    lines += ["", "### 🔍 Possible Conditions"]
+    conditions = [POSSIBLE_CONDITIONS[(r['analyte'], r['status'])] for r in flagged
+                  if (r['analyte'], r['status']) in POSSIBLE_CONDITIONS]
+    if conditions:
+        lines += [f"- {condition} This is not a diagnosis." for condition in conditions]
+    elif flagged:
+        lines.append("- The values outside their range are best interpreted by your doctor.")
+    else:
+        lines.append("- Nothing in the recognised values points to a particular condition.")
+
+    lines += ["", "### 🛡 General Precautions"]
+    precautions = list(dict.fromkeys(PRECAUTIONS[r['analyte']] for r in flagged if r['analyte'] in PRECAUTIONS))
+    lines += [f"- {precaution}" for precaution in precautions + [GENERAL_PRECAUTION]]
+
+    lines += ["", "### ❗ Important Guidance & Disclaimer", DISCLAIMER]
+    return "\n".join(lines)
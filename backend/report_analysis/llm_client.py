@@ -0,0 +1,409 @@
+# report_analysis/llm_client.py
+
+"""
+The one way report analysis talks to an LLM.
+
+LLMClient wraps a backend (Gemini over HTTP, or the local stub) with:
+- a keep-alive requests session, so calls reuse connections;
+- a deadline per call (REPORT_LLM_TIMEOUT_SECONDS) that covers waiting for a
+  slot, every attempt and the pauses between them;
+- retries with jittered exponential backoff on 429, 5xx and connection
+  errors, honouring Retry-After;
+- a semaphore capping the calls in flight in this process
+  (REPORT_LLM_MAX_CONCURRENT_CALLS), so a slow upstream cannot tie up every
+  worker thread;
+- counters for latency, tokens, retries and errors (see LLMMetrics).
+
+The backend is chosen by REPORT_LLM_BACKEND: 'gemini', 'stub', or the dotted
+path of a class with the same generate/stream methods.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError, ReadTimeoutError
+
+from .text_prep import estimate_tokens
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+LATENCY_WINDOW = 500  # Calls kept for the latency percentiles
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class LLMError(Exception):
+    """
+    An LLM call failed. `kind` says how: 'config', 'http', 'transport',
+    'format', 'timeout', 'busy' or 'cancelled' (a stream closed by its reader);
+    `retryable` whether another attempt may succeed.
+    """
+
+    def __init__(self, message, kind, retryable=False, retry_after=None):
+        super().__init__(message)
+        self.kind = kind
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def parse_retry_after(response):
+    try:
+        return max(0.0, float(response.headers.get('Retry-After', '')))
+    except ValueError:
+        return None
+
+
+class GeminiBackend:
+    """Gemini's generateContent and streamGenerateContent endpoints over one pooled session."""
+    name = 'gemini'
+
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max(settings.REPORT_LLM_MAX_CONCURRENT_CALLS, 10))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @staticmethod
+    def endpoint(action):
+        return f"{settings.GEMINI_API_BASE_URL.rstrip('/')}/models/{settings.GEMINI_MODEL}:{action}"
+
+    @staticmethod
+    def api_key():
+        api_key = os.getenv('GEMINI_API_KEY')
+        if not api_key:
+            raise LLMError("GEMINI_API_KEY not found in environment variables.", 'config')
+        return api_key
+
+    def post(self, action, prompt, timeout, **kwargs):
+        try:
+            response = self.session.post(
+                self.endpoint(action),
+                params={**kwargs.pop('params', {}), 'key': self.api_key()},
+                json={"contents": [{"parts": [{"text": prompt}]}]},
+                timeout=(min(settings.REPORT_LLM_CONNECT_TIMEOUT_SECONDS, timeout), timeout),
+                **kwargs,
+            )
+        except requests.exceptions.Timeout as e:
+            raise LLMError(f"Gemini timed out: {e}", 'timeout', retryable=True)
+        except requests.exceptions.RequestException as e:
+            raise LLMError(f"Gemini request failed: {e}", 'transport', retryable=True)
+        if response.status_code >= 400:
+            response.content  # Read the (short) error body so the connection goes back to the pool
+            response.close()
+            raise LLMError(f"Gemini returned HTTP {response.status_code}", 'http',
+                           retryable=response.status_code in RETRYABLE_STATUS_CODES,
+                           retry_after=parse_retry_after(response))
+        return response
+
+    @staticmethod
+    def read_json(response, deadline):
+        """
+        Read and decode the response body by `deadline`. The requests timeout only
+        bounds each socket read, so a body trickling in would otherwise outlive
+        the call; read1 returns whatever has arrived, so the deadline is checked
+        between reads.
+        """
+        chunks = []
+        with response:
+            try:
+                while chunk := response.raw.read1(64 * 1024, decode_content=True):
+                    chunks.append(chunk)
+                    if time.monotonic() > deadline:
+                        raise LLMError("Gemini response ran past the deadline", 'timeout', retryable=True)
+            except ReadTimeoutError as e:
+                raise LLMError(f"Gemini timed out: {e}", 'timeout', retryable=True)
+            except HTTPError as e:
+                raise LLMError(f"Gemini response was cut off: {e}", 'transport', retryable=True)
+        try:
+            return json.loads(b''.join(chunks))
+        except ValueError as e:
+            raise LLMError(f"Gemini returned a body that is not JSON: {e}", 'format')
+
+    def generate(self, prompt, timeout):
+        """Return (text, usage) for one prompt; usage holds prompt_tokens and output_tokens when Gemini reports them."""
+        deadline = time.monotonic() + timeout
+        result = self.read_json(self.post('generateContent', prompt, timeout, stream=True), deadline)
+        try:
+            text = result['candidates'][0]['content']['parts'][0]['text']
+            usage = self.usage(result)
+        except (KeyError, IndexError, TypeError, AttributeError) as e:
+            raise LLMError(f"Could not parse Gemini response structure: {e}", 'format')
+        return text, usage
+
+    def stream(self, prompt, timeout):
+        """Yield (text, usage) pieces as Gemini generates them; the read timeout also applies between chunks."""
+        timeout = min(timeout, settings.GEMINI_STREAM_READ_TIMEOUT_SECONDS)
+        response = self.post('streamGenerateContent', prompt, timeout, params={'alt': 'sse'}, stream=True)
+        with response:
+            # chunk_size=None hands over each HTTP chunk as soon as it arrives instead of filling a buffer
+            lines = response.iter_lines(chunk_size=None, decode_unicode=True)
+            while True:
+                try:
+                    line = next(lines, None)
+                except requests.exceptions.Timeout as e:
+                    raise LLMError(f"Gemini stream stalled: {e}", 'timeout', retryable=True)
+                except requests.exceptions.RequestException as e:
+                    raise LLMError(f"Gemini stream was cut off: {e}", 'transport', retryable=True)
+                if line is None:
+                    break
+                if not line or not line.startswith('data:'):
+                    continue
+                try:
+                    event = json.loads(line[len('data:'):])
+                    parts = [part.get('text') for candidate in event.get('candidates', [])[:1]
+                             for part in candidate.get('content', {}).get('parts', [])]
+                except (ValueError, AttributeError, TypeError) as e:
+                    raise LLMError(f"Could not parse Gemini stream event: {e}", 'format')
+                for text in parts:
+                    if text:
+                        yield text, self.usage(event)
+
+    @staticmethod
+    def usage(result):
+        metadata = result.get('usageMetadata') or {}
+        return {
+            'prompt_tokens': metadata.get('promptTokenCount'),
+            'output_tokens': metadata.get('candidatesTokenCount'),
+        }
+
+
+class StubBackend:
+    """
+    Local stand-in for tests and load tests: answers every prompt with a canned
+    analysis after REPORT_LLM_STUB_DELAY_SECONDS, without any network access.
+    """
+    name = 'stub'
+    response = (
+        "### 📝 Report Summary\nThis is a stub analysis.\n\n"
+        "### 🔍 Possible Conditions\n- None.\n\n"
+        "### 🛡 General Precautions\n- None.\n\n"
+        "### ❗ Important Guidance & Disclaimer\nThis is not medical advice. Please consult a doctor."
+    )
+
+    def __init__(self, delay=None):
+        self.delay = settings.REPORT_LLM_STUB_DELAY_SECONDS if delay is None else delay
+
+    def generate(self, prompt, timeout):
+        if self.delay > timeout:
+            time.sleep(timeout)
+            raise LLMError("Stub backend timed out", 'timeout', retryable=True)
+        time.sleep(self.delay)
+        return self.response, {'prompt_tokens': None, 'output_tokens': None}
+
+    def stream(self, prompt, timeout):
+        pieces = self.response.split('\n\n')
+        for index, piece in enumerate(pieces):
+            time.sleep(self.delay / len(pieces))
+            yield piece + ('\n\n' if index < len(pieces) - 1 else ''), {'prompt_tokens': None, 'output_tokens': None}
+
+
+BACKENDS = {'gemini': GeminiBackend, 'stub': StubBackend}
+
+
+class LLMMetrics:
+    """Thread-safe counters for one client; snapshot() is what the metrics endpoint shows."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.in_flight = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.errors = {}  # kind -> count
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def started(self):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+
+    def retried(self):
+        with self._lock:
+            self.retries += 1
+
+    def finished(self, latency, prompt, text=None, usage=None, error=None):
+        usage = usage or {}
+        with self._lock:
+            self.in_flight -= 1
+            self.latencies.append(latency)
+            self.prompt_tokens += usage.get('prompt_tokens') or estimate_tokens(prompt)
+            if error is None:
+                self.successes += 1
+                self.output_tokens += usage.get('output_tokens') or estimate_tokens(text or '')
+            else:
+                self.failures += 1
+                self.timeouts += error.kind in ('timeout', 'busy')
+                self.errors[error.kind] = self.errors.get(error.kind, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+
+            def percentile(share):
+                return round(latencies[min(len(latencies) - 1, int(share * len(latencies)))] * 1000, 1) if latencies else None
+
+            return {
+                'calls': self.calls,
+                'successes': self.successes,
+                'failures': self.failures,
+                'retries': self.retries,
+                'timeouts': self.timeouts,
+                'in_flight': self.in_flight,
+                'errors': dict(self.errors),
+                'prompt_tokens': self.prompt_tokens,
+                'output_tokens': self.output_tokens,
+                'latency_ms_p50': percentile(0.5),
+                'latency_ms_p95': percentile(0.95),
+                'latency_ms_max': round(latencies[-1] * 1000, 1) if latencies else None,
+            }
+
+
+class LLMClient:
+    def __init__(self, backend, max_concurrent, timeout, max_retries, backoff):
+        self.backend = backend
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.metrics = LLMMetrics()
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrent))
+
+    @staticmethod
+    def remaining(deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMError("The LLM call ran past its deadline", 'timeout')
+        return remaining
+
+    def backoff_delay(self, attempt, retry_after=None):
+        # Full jitter around the exponential step, so retries from many workers do not line up
+        delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+        return max(delay, retry_after or 0)
+
+    def acquire(self, deadline):
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise LLMError("Too many LLM calls in flight", 'busy')
+
+    def retry_or_raise(self, error, attempt, deadline):
+        """Sleep before the next attempt, or re-raise if the error is final or the deadline would pass."""
+        if not error.retryable or attempt >= self.max_retries:
+            raise error
+        delay = self.backoff_delay(attempt, error.retry_after)
+        if time.monotonic() + delay >= deadline:
+            raise error
+        print(f"[WARNING] LLM call failed ({error}), retrying in {delay:.1f}s")
+        self.metrics.retried()
+        time.sleep(delay)
+
+    def generate(self, prompt, timeout=None):
+        """Return the answer to one prompt; raises LLMError once retries or the deadline are used up."""
+        deadline = time.monotonic() + (timeout or self.timeout)
+        self.metrics.started()
+        started, acquired = time.monotonic(), False
+        text = usage = error = None
+        try:
+            self.acquire(deadline)
+            acquired = True
+            attempt = 0
+            while True:
+                try:
+                    text, usage = self.backend.generate(prompt, self.remaining(deadline))
+                    return text
+                except LLMError as e:
+                    self.retry_or_raise(e, attempt, deadline)
+                    attempt += 1
+        except LLMError as e:
+            error = e
+            raise
+        except Exception as e:  # A backend bug still has to leave the counters right
+            error = LLMError(str(e), 'transport')
+            raise
+        finally:
+            self.metrics.finished(time.monotonic() - started, prompt, text, usage, error)
+            if acquired:
+                self._slots.release()
+
+    def stream(self, prompt, timeout=None):
+        """
+        Yield the answer in pieces as it is generated. Failures before the first
+        piece are retried like generate(); the deadline only bounds the wait for
+        that first piece, after which GEMINI_STREAM_READ_TIMEOUT_SECONDS bounds
+        the gap between pieces. The concurrency slot is held until the stream ends.
+        """
+        deadline = time.monotonic() + (timeout or self.timeout)
+        self.metrics.started()
+        started, acquired = time.monotonic(), False
+        pieces, usage = [], None
+        # Until the stream ends, a reader that stops early (GeneratorExit) counts as cancelled
+        error = LLMError("The stream was closed before it ended", 'cancelled')
+        try:
+            self.acquire(deadline)
+            acquired = True
+            attempt = 0
+            while True:
+                try:
+                    for text, usage in self.backend.stream(prompt, self.remaining(deadline)):
+                        pieces.append(text)
+                        yield text
+                    break
+                except LLMError as e:
+                    if pieces:
+                        raise
+                    self.retry_or_raise(e, attempt, deadline)
+                    attempt += 1
+            error = None
+        except LLMError as e:
+            error = e
+            raise
+        except Exception as e:
+            error = LLMError(str(e), 'transport')
+            raise
+        finally:
+            self.metrics.finished(time.monotonic() - started, prompt, ''.join(pieces), usage, error)
+            if acquired:
+                self._slots.release()
+
+
+def build_client():
+    backend_class = BACKENDS.get(settings.REPORT_LLM_BACKEND) or import_string(settings.REPORT_LLM_BACKEND)
+    return LLMClient(
+        backend_class(),
+        max_concurrent=settings.REPORT_LLM_MAX_CONCURRENT_CALLS,
+        timeout=settings.REPORT_LLM_TIMEOUT_SECONDS,
+        max_retries=settings.REPORT_LLM_MAX_RETRIES,
+        backoff=settings.REPORT_LLM_RETRY_BACKOFF_SECONDS,
+    )
+
+
+def get_client():
+    """The process-wide client, built from the settings on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = build_client()
+        return _client
+
+
+def reset_client():
+    global _client
+    with _client_lock:
+        _client = None
+
+
+@receiver(setting_changed)
+def _reset_on_setting_change(setting, **kwargs):
+    if setting.startswith('REPORT_LLM_'):
+        reset_client()
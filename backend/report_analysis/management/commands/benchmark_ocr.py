@@ -0,0 +1,154 @@
+import json
+import os
+import statistics
+import time
+from difflib import SequenceMatcher
+
+try:
+    import resource  # Unix only; used for the CPU time of the tesseract processes
+except ImportError:
+    resource = None
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+from report_analysis.ocr import ocr_image, ocr_options, ocr_page_chunk, open_pdf
+from report_analysis.uploads import PDF, sniff_report_type
+
+# Preprocessing presets compared by default; 'current' is whatever the settings say
+VARIANTS = {
+    'raw': {'dpi': 144, 'max_side': 0, 'color': 'none', 'deskew': False},  # Behaviour before preprocessing existed
+    'fast': {'dpi': 150, 'max_side': 1600, 'color': 'gray', 'deskew': False},
+    'gray': {'dpi': 200, 'max_side': 2500, 'color': 'gray', 'deskew': False},
+    'binary': {'dpi': 200, 'max_side': 2500, 'color': 'binary', 'deskew': False},
+    'binary_deskew': {'dpi': 200, 'max_side': 2500, 'color': 'binary', 'deskew': True},
+    'sharp': {'dpi': 300, 'max_side': 3500, 'color': 'gray', 'deskew': False},
+}
+
+
+def normalize_text(text):
+    return ' '.join(text.split())
+
+
+def char_accuracy(expected, actual):
+    """Share of characters that line up between the expected and OCR'd text (1.0 = identical)."""
+    expected, actual = normalize_text(expected), normalize_text(actual)
+    if not expected and not actual:
+        return 1.0
+    matcher = SequenceMatcher(None, expected, actual, autojunk=False)
+    matched = sum(block.size for block in matcher.get_matching_blocks())
+    return matched / max(len(expected), len(actual))
+
+
+def child_cpu_seconds():
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Command(BaseCommand):
+    help = 'Compares OCR preprocessing settings on sample reports: OCR time and character accuracy'
+
+    def add_arguments(self, parser):
+        parser.add_argument('samples', nargs='+',
+                            help='Report files (PDF or image) or folders of them. A sibling .txt file '
+                                 'with the same name holds the expected text, used for accuracy.')
+        parser.add_argument('--variants', default='current,' + ','.join(VARIANTS),
+                            help=f"Comma separated subset of: current, {', '.join(VARIANTS)}")
+        parser.add_argument('--repeat', type=int, default=1, help='Runs per sample and variant')
+        parser.add_argument('--per-page', action='store_true',
+                            help='Run Tesseract once per page instead of once per PDF (REPORT_OCR_BATCH off)')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        samples = self.find_samples(options['samples'])
+        if not samples:
+            raise CommandError('No PDF or image samples found.')
+
+        variants = {}
+        for name in (v.strip() for v in options['variants'].split(',') if v.strip()):
+            if name == 'current':
+                variants[name] = ocr_options()
+            elif name in VARIANTS:
+                variants[name] = VARIANTS[name]
+            else:
+                raise CommandError(f"Unknown variant: {name}")
+            variants[name] = {**variants[name], 'batch': not options['per_page']}
+
+        report = {name: self.run_variant(variant, samples, options['repeat']) for name, variant in variants.items()}
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_table(report, variants, len(samples))
+
+    @staticmethod
+    def find_samples(paths):
+        """[(path, kind, expected text or None)] for every PDF/image among the given files and folders."""
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                files += sorted(os.path.join(path, name) for name in os.listdir(path))
+            else:
+                files.append(path)
+
+        samples = []
+        for path in files:
+            if not os.path.isfile(path) or path.endswith('.txt'):
+                continue
+            with open(path, 'rb') as f:
+                kind = sniff_report_type(f)
+            if kind is None:
+                continue
+            truth_path = os.path.splitext(path)[0] + '.txt'
+            expected = None
+            if os.path.exists(truth_path):
+                with open(truth_path, encoding='utf-8') as f:
+                    expected = f.read()
+            samples.append((path, kind, expected))
+        return samples
+
+    def run_variant(self, variant, samples, repeat):
+        wall_times, cpu_times, accuracies = [], [], []
+        for path, kind, expected in samples:
+            for _ in range(repeat):
+                cpu_before = time.process_time() + child_cpu_seconds()
+                started = time.perf_counter()
+                text = self.ocr_sample(path, kind, variant)
+                wall_times.append(time.perf_counter() - started)
+                cpu_times.append(time.process_time() + child_cpu_seconds() - cpu_before)
+                if expected is not None:
+                    accuracies.append(char_accuracy(expected, text))
+
+        return {
+            'runs': len(wall_times),
+            'wall_s_mean': round(statistics.mean(wall_times), 3),
+            'wall_s_total': round(sum(wall_times), 3),
+            'cpu_s_mean': round(statistics.mean(cpu_times), 3),
+            'accuracy': round(statistics.mean(accuracies), 4) if accuracies else None,
+        }
+
+    @staticmethod
+    def ocr_sample(path, kind, variant):
+        if kind == PDF:
+            with open_pdf(path) as pdf_document:
+                pages = list(range(min(pdf_document.page_count, settings.REPORT_OCR_MAX_PAGES)))
+            return '\n'.join(text for _, text in ocr_page_chunk(path, pages, variant))
+        with Image.open(path) as img:
+            return ocr_image(img, variant)
+
+    def print_table(self, report, variants, sample_count):
+        batch = next(iter(variants.values()))['batch']
+        self.stdout.write(f"{sample_count} sample(s), {'one Tesseract run per PDF' if batch else 'one Tesseract run per page'}")
+        header = f"{'variant':<14} {'dpi':>4} {'max side':>8} {'color':>7} {'deskew':>6} {'runs':>5} {'mean s':>8} {'cpu s':>8} {'accuracy':>9}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, row in report.items():
+            variant = variants[name]
+            accuracy = f"{row['accuracy'] * 100:.1f}%" if row['accuracy'] is not None else 'n/a'
+            self.stdout.write(
+                f"{name:<14} {variant['dpi']:>4} {variant['max_side'] or '-':>8} {variant['color']:>7} "
+                f"{'yes' if variant['deskew'] else 'no':>6} {row['runs']:>5} {row['wall_s_mean']:>8.3f} "
+                f"{row['cpu_s_mean']:>8.3f} {accuracy:>9}"
+            )
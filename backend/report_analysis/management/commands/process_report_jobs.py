@@ -0,0 +1,64 @@
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from report_analysis.jobs import process_available_jobs
+
+
+class Command(BaseCommand):
+    help = 'Runs a pool of workers that process queued report analysis jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Jobs processed at the same time')
+        parser.add_argument('--poll', type=float, default=settings.REPORT_JOB_POLL_SECONDS,
+                            help='Seconds to wait before checking an empty queue again')
+        parser.add_argument('--once', action='store_true', help='Exit as soon as the queue is empty')
+
+    def handle(self, *args, **options):
+        self.processed = 0
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+
+        self.stdout.write(self.style.SUCCESS(f"Starting {options['workers']} report worker(s)."))
+        if options['workers'] <= 1:
+            try:
+                self.work(options['poll'], options['once'])
+            except KeyboardInterrupt:
+                pass
+            self.stdout.write(self.style.SUCCESS(f'Processed {self.processed} report job(s).'))
+            return
+
+        threads = [
+            threading.Thread(target=self.work, args=(options['poll'], options['once']), name=f'report-worker-{i}')
+            for i in range(options['workers'])
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping after the current jobs...')
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {self.processed} report job(s).'))
+
+    def work(self, poll, once):
+        while not self.stop.is_set():
+            close_old_connections()
+            try:
+                processed = process_available_jobs(limit=1)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Worker error: {e}'))
+                processed = 0
+            with self.lock:
+                self.processed += processed
+            if not processed:
+                if once:
+                    break
+                self.stop.wait(poll)
+        close_old_connections()
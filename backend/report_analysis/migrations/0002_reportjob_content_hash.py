@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-19 00:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("report_analysis", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reportjob",
+            name="content_hash",
+            field=models.CharField(
+                blank=True, db_index=True, default="", max_length=64
+            ),
+        ),
+    ]
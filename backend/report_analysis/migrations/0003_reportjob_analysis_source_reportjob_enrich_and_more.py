@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-19 00:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("report_analysis", "0002_reportjob_content_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reportjob",
+            name="analysis_source",
+            field=models.CharField(blank=True, default="", max_length=10),
+        ),
+        migrations.AddField(
+            model_name="reportjob",
+            name="enrich",
+            field=models.CharField(
+                choices=[
+                    ("auto", "When no lab values are recognised"),
+                    ("always", "Always"),
+                    ("never", "Never"),
+                ],
+                default="auto",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="reportjob",
+            name="lab_values",
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
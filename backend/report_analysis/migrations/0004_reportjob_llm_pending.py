@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 00:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("report_analysis", "0003_reportjob_analysis_source_reportjob_enrich_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reportjob",
+            name="llm_pending",
+            field=models.BooleanField(default=False),
+        ),
+    ]
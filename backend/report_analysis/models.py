@@ -1,3 +1,129 @@
+import uuid
+import zlib
+
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class ReportText(models.Model):
+    """
+    The extracted text of one distinct upload, zlib-compressed. Identified by the
+    SHA-256 of the file, so the same report uploaded by several users is stored
+    once and shared by all their Report rows.
+    """
+    content_hash = models.CharField(max_length=64, unique=True)
+    compressed_text = models.BinaryField()
+    length = models.PositiveIntegerField()  # Characters before compression
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def store(cls, digest, text):
+        blob, _ = cls.objects.get_or_create(content_hash=digest, defaults={
+            'compressed_text': zlib.compress(text.encode('utf-8'), 6),
+            'length': len(text),
+        })
+        return blob
+
+    @property
+    def text(self):
+        return zlib.decompress(bytes(self.compressed_text)).decode('utf-8')
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} ({self.length} chars)"
+
+
+class ReportManager(models.Manager):
+    def record(self, user, file_name, digest, result):
+        """Save a finished analysis to the user's history, linked to the stored text of the file."""
+        return self.create(
+            user=user,
+            text=ReportText.objects.filter(content_hash=digest).first(),
+            original_name=file_name[:255],
+            analysis=result['analysis'],
+            analysis_source=result['analysis_source'],
+            lab_values=result['lab_values'],
+            extracted_text_preview=result['extracted_text_preview'],
+            timings=result.get('timings', {}),
+        )
+
+    def latest_llm_analysis(self, digest):
+        """The most recent successful LLM analysis of this file by any user, or None."""
+        # Failed calls are saved with analysis_source 'failed'
+        return (self.filter(text__content_hash=digest, analysis_source='llm')
+                .order_by('-created_at').values_list('analysis', flat=True).first())
+
+
+class Report(models.Model):
+    """One analyzed upload in a user's report history."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reports')
+    text = models.ForeignKey(ReportText, on_delete=models.PROTECT, related_name='reports', blank=True, null=True)
+    original_name = models.CharField(max_length=255)
+    analysis = models.TextField(blank=True, default='')
+    analysis_source = models.CharField(max_length=10, blank=True, default='')  # 'local', 'llm' or 'failed'
+    lab_values = models.JSONField(blank=True, default=list)
+    extracted_text_preview = models.TextField(blank=True, default='')
+    timings = models.JSONField(blank=True, default=dict)  # Seconds spent per stage, and in total
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ReportManager()
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['user', '-created_at'])]
+
+    def __str__(self):
+        return f"{self.original_name} for {self.user}"
+
+
+class ReportJob(models.Model):
+    """
+    One uploaded report waiting for or going through analysis. The row is the
+    queue entry: workers claim QUEUED jobs and move them through the stages
+    below while the client polls the status endpoint.
+    """
+    QUEUED = 'queued'
+    EXTRACTING = 'extracting'
+    OCR = 'ocr'
+    ANALYZING = 'analyzing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (EXTRACTING, 'Extracting text'),
+        (OCR, 'Running OCR'),
+        (ANALYZING, 'Analyzing'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    IN_PROGRESS = [EXTRACTING, OCR, ANALYZING]
+    ENRICH_CHOICES = [
+        ('auto', 'When no lab values are recognised'),
+        ('always', 'Always'),
+        ('never', 'Never'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='report_jobs')
+    report_file = models.FileField(upload_to='report_jobs/')
+    original_name = models.CharField(max_length=255)
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)  # SHA-256 of the upload
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    enrich = models.CharField(max_length=10, choices=ENRICH_CHOICES, default='auto')  # When to ask the LLM
+    analysis = models.TextField(blank=True, default='')
+    analysis_source = models.CharField(max_length=10, blank=True, default='')  # 'local', 'llm' or 'failed'
+    lab_values = models.JSONField(blank=True, default=list)
+    llm_pending = models.BooleanField(default=False)  # Local summary shown, LLM answer still on its way
+    report = models.ForeignKey(Report, on_delete=models.SET_NULL, related_name='jobs', blank=True, null=True)
+    extracted_text_preview = models.TextField(blank=True, default='')
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.original_name} ({self.status}) for {self.user}"
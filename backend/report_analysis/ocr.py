@@ -0,0 +1,269 @@
+# report_analysis/ocr.py
+
+"""
+OCR for scanned PDF reports.
+
+Rendering a page and running Tesseract on it is CPU-bound and each page is
+independent, so pages are split into contiguous chunks and OCR'd in a process
+pool, one chunk per worker; the texts are put back in page order afterwards.
+Each worker opens the PDF once for its whole chunk. The pool is created on
+first use and reused for later reports.
+
+Every image goes through preprocess_image first (target resolution, grayscale
+or black and white, optional deskew, see the REPORT_OCR_* settings); smaller,
+cleaner images are what keeps Tesseract's CPU time down. With REPORT_OCR_BATCH
+each chunk of pages is OCR'd by one Tesseract run instead of one per page.
+
+The worker functions only take plain arguments (the PDF's path, or its bytes
+for small in-memory uploads, page numbers and the Tesseract path) because they
+run in spawned processes without Django set up.
+"""
+
+import multiprocessing
+import os
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz  # PyMuPDF
+import numpy as np
+import pytesseract
+from PIL import Image, ImageOps
+
+from django.conf import settings
+
+COLOR_MODES = ('none', 'gray', 'binary')
+DESKEW_MAX_ANGLE = 5.0  # degrees; phone photos of paper are rarely worse
+DESKEW_STEP = 0.5
+DESKEW_SAMPLE_SIDE = 800  # skew is estimated on a copy this size
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def ocr_options():
+    """Preprocessing settings as a plain dict, so they can be sent to pool workers."""
+    return {
+        'dpi': settings.REPORT_OCR_DPI,
+        'max_side': settings.REPORT_OCR_MAX_SIDE,
+        'color': settings.REPORT_OCR_COLOR_MODE,
+        'deskew': settings.REPORT_OCR_DESKEW,
+        'batch': settings.REPORT_OCR_BATCH,
+    }
+
+
+def otsu_threshold(gray):
+    """Grey level that best separates ink from paper (Otsu's method on the histogram)."""
+    histogram = gray.histogram()[:256]
+    total = sum(histogram)
+    weighted_total = sum(level * count for level, count in enumerate(histogram))
+    background = weighted_background = 0
+    best_variance, threshold = -1.0, 127
+    for level, count in enumerate(histogram):
+        background += count
+        if background == 0:
+            continue
+        foreground = total - background
+        if foreground == 0:
+            break
+        weighted_background += level * count
+        mean_background = weighted_background / background
+        mean_foreground = (weighted_total - weighted_background) / foreground
+        variance = background * foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_variance, threshold = variance, level
+    return threshold
+
+
+def estimate_skew(gray):
+    """
+    Angle (degrees, counter-clockwise) that makes the text lines horizontal.
+    Text rows give the sharpest row-by-row ink profile when they are level,
+    so the angle with the largest profile variance wins.
+    """
+    sample = gray.copy()
+    sample.thumbnail((DESKEW_SAMPLE_SIDE, DESKEW_SAMPLE_SIDE))
+    threshold = otsu_threshold(sample)
+    steps = int(DESKEW_MAX_ANGLE / DESKEW_STEP)
+    best_angle, best_score = 0.0, -1.0
+    for step in range(-steps, steps + 1):
+        angle = step * DESKEW_STEP
+        rotated = sample.rotate(angle, resample=Image.BILINEAR, fillcolor=255)
+        ink_per_row = (np.asarray(rotated) <= threshold).sum(axis=1)
+        score = float(np.var(ink_per_row))
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+
+def preprocess_image(img, options):
+    """
+    Prepare an image for Tesseract: undo EXIF rotation, shrink it so its long
+    side is at most max_side pixels, convert to grayscale or black and white,
+    and optionally straighten it.
+    """
+    img = ImageOps.exif_transpose(img)
+    max_side = options['max_side']
+    if max_side and max(img.size) > max_side:
+        scale = max_side / max(img.size)
+        img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.LANCZOS)
+
+    if options['color'] == 'none':
+        return img if img.mode in ('RGB', 'L') else img.convert('RGB')
+
+    img = img.convert('L')
+    if options['deskew']:
+        angle = estimate_skew(img)
+        if angle:
+            img = img.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    if options['color'] == 'binary':
+        threshold = otsu_threshold(img)
+        img = img.point(lambda level: 255 if level > threshold else 0)
+    return img
+
+
+def render_page(page, options):
+    """Render a PDF page at the target DPI, capped so its long side is at most max_side pixels."""
+    zoom = options['dpi'] / 72
+    if options['max_side']:
+        zoom = min(zoom, options['max_side'] / max(page.rect.width, page.rect.height))
+    colorspace = fitz.csRGB if options['color'] == 'none' else fitz.csGRAY
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=colorspace, alpha=False)
+    # Wrap the raw samples instead of encoding a PNG only to decode it again
+    return Image.frombytes('L' if pix.n == 1 else 'RGB', (pix.width, pix.height), pix.samples)
+
+
+def ocr_image(img, options, tesseract_cmd=None):
+    """Preprocess an image and return Tesseract's text for it."""
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    return pytesseract.image_to_string(preprocess_image(img, options))
+
+
+def ocr_page_image(page, options, tesseract_cmd=None):
+    """Render one PyMuPDF page and return Tesseract's text for it."""
+    return ocr_image(render_page(page, options), options, tesseract_cmd)
+
+
+def open_pdf(pdf_source):
+    """Open a PDF from a file path or from its bytes."""
+    if isinstance(pdf_source, (bytes, bytearray)):
+        return fitz.open(stream=pdf_source, filetype="pdf")
+    return fitz.open(pdf_source)
+
+
+def run_tesseract_batch(image_paths, work_dir, tesseract_cmd=None):
+    """
+    OCR several image files with one Tesseract process: it reads a file that
+    lists the images and writes all pages to one text file, each page followed
+    by a form feed. Returns the texts in the order of image_paths.
+    """
+    list_path = os.path.join(work_dir, 'pages.txt')
+    with open(list_path, 'w') as f:
+        f.write(''.join(f'{path}\n' for path in image_paths))
+    output_base = os.path.join(work_dir, 'output')
+    command = [tesseract_cmd or pytesseract.pytesseract.tesseract_cmd, list_path, output_base]
+    try:
+        process = subprocess.run(command, capture_output=True)
+    except FileNotFoundError:
+        raise pytesseract.TesseractNotFoundError()
+    if process.returncode:
+        raise pytesseract.TesseractError(process.returncode, process.stderr.decode(errors='replace').strip())
+
+    with open(f'{output_base}.txt', encoding='utf-8') as f:
+        pages = f.read().split('\f')
+    if len(pages) != len(image_paths) + 1 or pages[-1].strip():
+        raise pytesseract.TesseractError(0, f"expected {len(image_paths)} pages of output, got {len(pages) - 1}")
+    return pages[:-1]
+
+
+def ocr_page_chunk(pdf_source, page_numbers, options, tesseract_cmd=None):
+    """
+    Pool worker: OCR a run of pages of one PDF, returning [(page_number, text), ...].
+    With options['batch'] the pages are rendered and preprocessed one at a time
+    into uncompressed PGM/PPM files and OCR'd by a single Tesseract run, so the
+    process start and language model load are paid once per chunk, not per page.
+    """
+    with open_pdf(pdf_source) as pdf_document:
+        if not options.get('batch') or len(page_numbers) < 2:
+            return [(number, ocr_page_image(pdf_document[number], options, tesseract_cmd)) for number in page_numbers]
+
+        with tempfile.TemporaryDirectory(prefix='report-ocr-') as work_dir:
+            image_paths = []
+            for number in page_numbers:
+                path = os.path.join(work_dir, f'page-{number:04d}.pnm')
+                preprocess_image(render_page(pdf_document[number], options), options).save(path, format='PPM')
+                image_paths.append(path)
+            return list(zip(page_numbers, run_tesseract_batch(image_paths, work_dir, tesseract_cmd)))
+
+
+def worker_count():
+    return max(1, settings.REPORT_OCR_WORKERS or os.cpu_count() or 1)
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the web process runs threads (job workers, refreshers)
+            _pool = ProcessPoolExecutor(max_workers=worker_count(), mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def split_pages(page_numbers, chunks):
+    """Split page numbers into `chunks` contiguous runs of near-equal length."""
+    size, extra = divmod(len(page_numbers), chunks)
+    runs, start = [], 0
+    for index in range(chunks):
+        end = start + size + (index < extra)
+        runs.append(page_numbers[start:end])
+        start = end
+    return [run for run in runs if run]
+
+
+def ocr_pdf_pages(pdf_source, page_numbers):
+    """
+    OCR the given pages (0-based) of a PDF and return their texts in page order.
+    Runs in the process pool when there is more than one page and worker,
+    otherwise in this process.
+    """
+    page_numbers = list(page_numbers)
+    tesseract_cmd = pytesseract.pytesseract.tesseract_cmd
+    options = ocr_options()
+    workers = min(worker_count(), len(page_numbers))
+    if workers <= 1:
+        return [text for _, text in ocr_page_chunk(pdf_source, page_numbers, options, tesseract_cmd)]
+
+    pool = get_pool()
+    try:
+        futures = [
+            pool.submit(ocr_page_chunk, pdf_source, run, options, tesseract_cmd)
+            for run in split_pages(page_numbers, workers)
+        ]
+        results = dict(pair for future in futures for pair in future.result())
+    except BrokenProcessPool as e:
+        print(f"[WARNING] OCR process pool broke ({e}), OCR'ing in this process instead")
+        reset_pool()
+        return [text for _, text in ocr_page_chunk(pdf_source, page_numbers, options, tesseract_cmd)]
+    return [results[number] for number in page_numbers]
+
+
+def ocr_pdf(pdf_source, page_numbers):
+    """OCR up to REPORT_OCR_MAX_PAGES of the given pages of a PDF; returns {page_number: text}."""
+    page_numbers = list(page_numbers)
+    max_pages = settings.REPORT_OCR_MAX_PAGES
+    if len(page_numbers) > max_pages:
+        print(f"[WARNING] {len(page_numbers)} pages need OCR, only the first {max_pages} are OCR'd (REPORT_OCR_MAX_PAGES)")
+        page_numbers = page_numbers[:max_pages]
+    print(f"[INFO] Performing OCR on {len(page_numbers)} page(s) with up to {worker_count()} worker(s)...")
+    return dict(zip(page_numbers, ocr_pdf_pages(pdf_source, page_numbers)))
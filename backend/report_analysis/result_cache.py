@@ -0,0 +1,50 @@
+# report_analysis/result_cache.py
+
+"""
+Content-addressed cache of report results.
+
+Uploads are identified by the SHA-256 of their bytes, so the same PDF uploaded
+again (after a refresh, from another device, or on retry) maps to the same
+entries whatever its file name. Extracted text and the finished analysis are
+cached separately: if the LLM call failed, a retry still skips extraction
+and OCR.
+"""
+
+import hashlib
+
+from django.core.cache import caches
+
+# Bump when the prompt or the response format changes so old analyses are not served
+ANALYSIS_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+
+
+def content_hash(report_file):
+    """SHA-256 hex digest of a file-like object, read in chunks; leaves it rewound."""
+    digest = hashlib.sha256()
+    report_file.seek(0)
+    for chunk in iter(lambda: report_file.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    report_file.seek(0)
+    return digest.hexdigest()
+
+
+def _cache():
+    return caches['reports']
+
+
+def get_text(digest):
+    return _cache().get(f'report-text:{digest}')
+
+
+def set_text(digest, text):
+    _cache().set(f'report-text:{digest}', text)
+
+
+def get_analysis(digest):
+    """The cached response payload for this upload, or None."""
+    return _cache().get(f'report-analysis:v{ANALYSIS_VERSION}:{digest}')
+
+
+def set_analysis(digest, payload):
+    _cache().set(f'report-analysis:v{ANALYSIS_VERSION}:{digest}', payload)
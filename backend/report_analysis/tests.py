@@ -1,3 +1,921 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from PIL import Image, ImageDraw
+import fitz
+import pytesseract
+
+from users.models import UserProfile
+
+from . import jobs, lab_values, llm_client, ocr, text_prep, views
+from .models import Report, ReportJob, ReportText
+
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default-tests'},
+    'reports': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'report-tests'},
+    'dashboard': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'dashboard-tests'},
+}
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+REPORT_TEXT = "Hemoglobin 11.2 g/dL (13.0 - 17.0)\nGlucose fasting 132 mg/dL (70 - 100)"
+
+
+class ReportJobTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=media_root, REPORT_JOB_IN_PROCESS_WORKERS=0, CACHES=TEST_CACHES,
+                                    REPORT_LLM_ENRICHMENT='always')
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        for name, kwargs in (
+            ('extract_text_from_image', {'return_value': REPORT_TEXT}),
+            ('analyze_report_with_gemini', {'return_value': '### 📝 Report Summary\nMostly normal.'}),
+        ):
+            patcher = mock.patch.object(views, name, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        caches['reports'].clear()
+        self.addCleanup(caches['reports'].clear)
+
+        self.user = get_user_model().objects.create_user(username='u', email='u@example.com', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, name='report.png', content=PNG_SIGNATURE + b'not really a png', url='/api/v1/reports/jobs/'):
+        return self.client.post(url, {
+            'report_file': SimpleUploadedFile(name, content, content_type='image/png'),
+        }, format='multipart')
+
+    def test_upload_returns_job_id_and_worker_completes_it(self):
+        response = self.upload(content=PNG_SIGNATURE + b'a report nobody uploaded before')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], ReportJob.QUEUED)
+        job_id = response.data['job_id']
+
+        stages = []
+        original_set_stage = jobs.set_stage
+        with mock.patch.object(jobs, 'set_stage', side_effect=lambda job, stage: (stages.append(stage), original_set_stage(job, stage))):
+            self.assertEqual(jobs.process_available_jobs(), 1)
+        self.assertEqual(stages, [ReportJob.EXTRACTING, ReportJob.OCR, ReportJob.ANALYZING])
+
+        response = self.client.get(f'/api/v1/reports/jobs/{job_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], ReportJob.DONE)
+        self.assertIn('Mostly normal', response.data['analysis'])
+        self.assertFalse(ReportJob.objects.get(pk=job_id).report_file)  # Upload removed once processed
+
+    def test_repeat_upload_is_served_from_cache(self):
+        first = self.upload('report.png', url='/api/v1/reports/analyze/')
+        second = self.upload('renamed.png', url='/api/v1/reports/analyze/')
+        per_upload = ('timings', 'report_id')
+        self.assertEqual({k: v for k, v in first.data.items() if k not in per_upload},
+                         {k: v for k, v in second.data.items() if k not in per_upload})
+        views.extract_text_from_image.assert_called_once()
+        views.analyze_report_with_gemini.assert_called_once()
+
+        # The same bytes through the job API finish without being queued
+        response = self.upload('again.png')
+        self.assertEqual(response.data['status'], ReportJob.DONE)
+        self.assertEqual(response.data['analysis'], first.data['analysis'])
+        self.assertFalse(ReportJob.objects.filter(status=ReportJob.QUEUED).exists())
+        views.analyze_report_with_gemini.assert_called_once()
+
+        self.upload('other.png', content=PNG_SIGNATURE + b'a different report', url='/api/v1/reports/analyze/')
+        self.assertEqual(views.analyze_report_with_gemini.call_count, 2)
+
+    def test_failed_analysis_is_retried_without_extracting_again(self):
+        with mock.patch.object(views, 'analyze_report_with_gemini',
+                               side_effect=views.AnalysisError("Sorry, an error occurred while analyzing the report.")):
+            self.upload(url='/api/v1/reports/analyze/')
+        response = self.upload(url='/api/v1/reports/analyze/')
+        self.assertIn('Mostly normal', response.data['analysis'])
+        views.extract_text_from_image.assert_called_once()
+
+    def test_unreadable_report_fails_with_message(self):
+        job_id = self.upload().data['job_id']
+        with mock.patch.object(views, 'extract_text_from_image', return_value=''):
+            jobs.process_available_jobs()
+        response = self.client.get(f'/api/v1/reports/jobs/{job_id}/')
+        self.assertEqual(response.data['status'], ReportJob.FAILED)
+        self.assertIn('Could not extract readable text', response.data['error'])
+
+    def test_rejects_unsupported_files_and_hides_other_users_jobs(self):
+        self.assertEqual(self.upload('report.pdf', content=b'PK\x03\x04 a zipped word file').status_code, 400)
+
+        job_id = self.upload().data['job_id']
+        other = get_user_model().objects.create_user(username='o', email='o@example.com', password='pass12345')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(f'/api/v1/reports/jobs/{job_id}/').status_code, 404)
+
+    def test_file_type_comes_from_magic_bytes(self):
+        typed = 'Patient: A. Kumar  Hemoglobin 11.2 g/dL  Glucose 132 mg/dL'
+        response = self.upload('scan.png', content=make_scanned_pdf([300], typed_pages={0: typed}),
+                               url='/api/v1/reports/analyze/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Hemoglobin 11.2', response.data['extracted_text_preview'])
+        views.extract_text_from_image.assert_not_called()
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=100)
+    def test_spooled_pdf_is_opened_by_path(self):
+        typed = 'Patient: A. Kumar  Hemoglobin 11.2 g/dL  Glucose 132 mg/dL'
+        with mock.patch.object(views, 'open_pdf', wraps=views.open_pdf) as open_pdf:
+            self.upload('report.pdf', content=make_scanned_pdf([300], typed_pages={0: typed}),
+                        url='/api/v1/reports/analyze/')
+        self.assertIsInstance(open_pdf.call_args.args[0], str)
+
+    @override_settings(REPORT_UPLOAD_MAX_BYTES=1000)
+    def test_rejects_oversized_uploads_before_parsing(self):
+        with mock.patch.object(views, 'extract_text_from_pdf') as extract:
+            response = self.upload('big.pdf', content=b'%PDF-1.7' + b'0' * 2000, url='/api/v1/reports/analyze/')
+            self.assertEqual(response.status_code, 413)
+            self.assertEqual(self.upload('big.pdf', content=b'%PDF-1.7' + b'0' * 2000).status_code, 413)
+        extract.assert_not_called()
+        self.assertFalse(ReportJob.objects.exists())
+
+    def test_stale_jobs_are_retried_then_failed(self):
+        job = ReportJob.objects.get(pk=self.upload().data['job_id'])
+        long_ago = timezone.now() - timedelta(hours=1)
+        ReportJob.objects.filter(pk=job.pk).update(status=ReportJob.OCR, attempts=1, updated_at=long_ago)
+        self.assertEqual(jobs.claim_next_job().pk, job.pk)
+
+        upload_path = job.report_file.path
+        ReportJob.objects.filter(pk=job.pk).update(status=ReportJob.OCR, attempts=2, updated_at=long_ago)
+        self.assertIsNone(jobs.claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.FAILED)
+        self.assertFalse(job.report_file)
+        self.assertFalse(os.path.exists(upload_path))  # The upload of a job that failed for good is removed
+
+    def test_process_report_jobs_command(self):
+        self.upload(content=PNG_SIGNATURE + b'first report')
+        self.upload(content=PNG_SIGNATURE + b'second report')
+        out = io.StringIO()
+        call_command('process_report_jobs', '--workers', '1', '--once', stdout=out)
+        self.assertIn('Processed 2 report job(s).', out.getvalue())
+        self.assertEqual(ReportJob.objects.filter(status=ReportJob.DONE).count(), 2)
+
+
+# Stands in for the tesseract binary: "reads" an image by reporting its width
+FAKE_TESSERACT = f"""#!{sys.executable}
+import sys
+from PIL import Image, UnidentifiedImageError
+with open(sys.argv[2] + '.txt', 'w') as f:
+    try:
+        f.write(f'page width {{Image.open(sys.argv[1]).width}}')
+        call = 'single'
+    except UnidentifiedImageError:  # Like Tesseract: a file that is not an image lists the images to OCR
+        for path in open(sys.argv[1]).read().split():
+            f.write(f'page width {{Image.open(path).width}}\\f')
+        call = 'batch'
+with open(sys.argv[0] + '.calls', 'a') as calls:
+    calls.write(call + '\\n')
+"""
+
+
+def make_scanned_pdf(widths, typed_pages=None):
+    """A PDF with one text-less page per width (in points); typed_pages maps page numbers to a text layer."""
+    typed_pages = typed_pages or {}
+    with fitz.open() as pdf:
+        for number, width in enumerate(widths):
+            page = pdf.new_page(width=width, height=100)
+            if number in typed_pages:
+                page.insert_text((5, 20), typed_pages[number], fontsize=6)
+            else:
+                page.draw_rect(fitz.Rect(10, 10, 40, 40), fill=(0, 0, 0))
+        return pdf.tobytes()
+
+
+@override_settings(REPORT_OCR_DPI=144)  # 2x render zoom
+class ParallelOcrTest(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        fake = os.path.join(tmp_dir, 'tesseract')
+        with open(fake, 'w') as f:
+            f.write(FAKE_TESSERACT)
+        os.chmod(fake, os.stat(fake).st_mode | stat.S_IEXEC)
+
+        self.calls_log = fake + '.calls'
+
+        patcher = mock.patch.object(pytesseract.pytesseract, 'tesseract_cmd', fake)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(ocr.reset_pool)
+
+    def tesseract_calls(self):
+        if not os.path.exists(self.calls_log):
+            return []
+        with open(self.calls_log) as f:
+            return f.read().split()
+
+    def test_split_pages(self):
+        self.assertEqual(ocr.split_pages(list(range(7)), 3), [[0, 1, 2], [3, 4], [5, 6]])
+        self.assertEqual(ocr.split_pages([0], 4), [[0]])
+
+    @override_settings(REPORT_OCR_WORKERS=2, REPORT_OCR_MAX_PAGES=4)
+    def test_pages_ocrd_in_pool_keep_their_order_up_to_the_limit(self):
+        pdf = io.BytesIO(make_scanned_pdf([100, 150, 200, 250, 300]))
+        text = views.extract_text_from_pdf(pdf)
+        # 2x render zoom, fifth page dropped by the page limit
+        self.assertEqual(text.split('\f'), ['page width 200', 'page width 300', 'page width 400', 'page width 500'])
+
+    @override_settings(REPORT_OCR_WORKERS=1)
+    def test_single_worker_ocrs_in_process(self):
+        with mock.patch.object(ocr, 'get_pool') as get_pool:
+            text = views.extract_text_from_pdf(io.BytesIO(make_scanned_pdf([100, 120])))
+        get_pool.assert_not_called()
+        self.assertEqual(text, 'page width 200\fpage width 240')
+
+    @override_settings(REPORT_OCR_WORKERS=1)
+    def test_only_pages_without_text_layer_are_ocrd(self):
+        typed = 'Patient: A. Kumar  Hemoglobin 11.2 g/dL  Glucose 132 mg/dL'
+        pdf = make_scanned_pdf([300, 100, 300, 120], typed_pages={0: typed, 2: typed})
+        with mock.patch.object(ocr, 'ocr_pdf_pages', wraps=ocr.ocr_pdf_pages) as ocr_pages:
+            text = views.extract_text_from_pdf(io.BytesIO(pdf))
+        self.assertEqual(ocr_pages.call_args.args[1], [1, 3])
+        self.assertEqual([line for line in text.splitlines() if line], [typed, 'page width 200', typed, 'page width 240'])
+
+    @override_settings(REPORT_OCR_WORKERS=1)
+    def test_pages_are_ocrd_by_one_tesseract_run(self):
+        pdf = make_scanned_pdf([100, 120, 140])
+        self.assertEqual(views.extract_text_from_pdf(io.BytesIO(pdf)), 'page width 200\fpage width 240\fpage width 280')
+        self.assertEqual(self.tesseract_calls(), ['batch'])
+
+        with override_settings(REPORT_OCR_BATCH=False):
+            self.assertEqual(views.extract_text_from_pdf(io.BytesIO(pdf)), 'page width 200\fpage width 240\fpage width 280')
+        self.assertEqual(self.tesseract_calls(), ['batch', 'single', 'single', 'single'])
+
+    def test_pages_are_rendered_without_png_encoding(self):
+        with fitz.open(stream=make_scanned_pdf([100]), filetype='pdf') as pdf, \
+                mock.patch.object(fitz.Pixmap, 'tobytes') as tobytes:
+            img = ocr.render_page(pdf[0], ocr.ocr_options() | {'dpi': 144})
+        tobytes.assert_not_called()
+        self.assertEqual((img.mode, img.size), ('L', (200, 200)))
+        self.assertEqual(img.getpixel((50, 50)), 0)  # Inside the black square
+
+    def test_benchmark_ocr_command(self):
+        samples = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, samples, ignore_errors=True)
+        Image.new('RGB', (3000, 100), 'white').save(os.path.join(samples, 'photo.png'))
+        with open(os.path.join(samples, 'photo.txt'), 'w') as f:
+            f.write('page width 3000')
+        with open(os.path.join(samples, 'scan.pdf'), 'wb') as f:
+            f.write(make_scanned_pdf([100]))
+
+        out = io.StringIO()
+        call_command('benchmark_ocr', samples, '--variants', 'raw,fast', '--json', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['raw']['runs'], 2)
+        self.assertEqual(report['raw']['accuracy'], 1.0)  # Full size photo reaches the "OCR"
+        self.assertLess(report['fast']['accuracy'], 1.0)  # Shrunk to 1600 px
+
+
+class OcrPreprocessingTest(TestCase):
+    options = {'dpi': 200, 'max_side': 1000, 'color': 'gray', 'deskew': False}
+
+    def test_large_photos_are_shrunk_and_grayscaled(self):
+        img = ocr.preprocess_image(Image.new('RGB', (4000, 3000), 'white'), self.options)
+        self.assertEqual((img.size, img.mode), ((1000, 750), 'L'))
+
+    def test_binary_mode_leaves_only_black_and_white(self):
+        img = Image.linear_gradient('L').resize((300, 300))
+        img = ocr.preprocess_image(img, dict(self.options, color='binary'))
+        self.assertEqual({level for _, level in img.getcolors()}, {0, 255})
+
+    def test_deskew_straightens_rotated_text_lines(self):
+        page = Image.new('L', (600, 600), 255)
+        draw = ImageDraw.Draw(page)
+        for y in range(60, 560, 40):
+            draw.rectangle((50, y, 550, y + 8), fill=0)
+        tilted = page.rotate(3, resample=Image.BICUBIC, fillcolor=255)
+        self.assertAlmostEqual(ocr.estimate_skew(tilted), -3.0, delta=0.5)
+        self.assertEqual(ocr.estimate_skew(page), 0.0)
+
+    def test_pdf_pages_render_at_target_dpi_within_max_side(self):
+        with fitz.open(stream=make_scanned_pdf([72, 720]), filetype='pdf') as pdf:
+            self.assertEqual(ocr.render_page(pdf[0], self.options).size[0], 200)  # 1 inch at 200 DPI
+            self.assertEqual(ocr.render_page(pdf[1], self.options).size[0], 1000)  # capped by max_side
+
+
+class StubGeminiHandler(BaseHTTPRequestHandler):
+    """Answers streamGenerateContent like Gemini does in SSE mode, one chunk every `delay` seconds."""
+    protocol_version = 'HTTP/1.1'
+    chunks = ['### 📝 Report Summary\n', 'Hemoglobin is slightly low. ', 'Please consult a doctor.']
+    delay = 0.3
+    status = 200
+
+    def do_POST(self):
+        self.server.requests.append(self.path)
+        self.rfile.read(int(self.headers['Content-Length']))
+        if self.status != 200:
+            self.send_error(self.status)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for index, text in enumerate(self.chunks):
+            if index:
+                time.sleep(self.delay)
+            event = {'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}}]}
+            self.write_chunk(f'data: {json.dumps(event)}\r\n\r\n'.encode())
+        self.write_chunk(b'')
+
+    def write_chunk(self, data):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_server(test, handler):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    test.addCleanup(server.server_close)
+    test.addCleanup(server.shutdown)
+    return server
+
+
+class ReportStreamTest(TestCase):
+    def setUp(self):
+        self.server = start_stub_server(self, StubGeminiHandler)
+        overrides = override_settings(
+            CACHES=TEST_CACHES, GEMINI_API_BASE_URL=f'http://127.0.0.1:{self.server.server_port}/v1beta',
+            REPORT_LLM_ENRICHMENT='always', REPORT_LLM_RETRY_BACKOFF_SECONDS=0.01,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        caches['reports'].clear()
+        self.addCleanup(caches['reports'].clear)
+
+        for patcher in (
+            mock.patch.object(views, 'extract_text_from_image', return_value=REPORT_TEXT),
+            mock.patch.dict(os.environ, {'GEMINI_API_KEY': 'test-key'}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        user = get_user_model().objects.create_user(username='u', email='u@example.com', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def stream(self):
+        response = self.client.post('/api/v1/reports/analyze/stream/', {
+            'report_file': SimpleUploadedFile('report.png', PNG_SIGNATURE + b'scan', content_type='image/png'),
+        }, format='multipart')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events, started = [], time.perf_counter()
+        for raw in response.streaming_content:
+            raw = raw.decode() if isinstance(raw, bytes) else raw
+            name, data = (line.split(': ', 1)[1] for line in raw.strip().split('\n'))
+            events.append((name, json.loads(data), time.perf_counter() - started))
+        return events
+
+    def test_chunks_are_relayed_as_they_arrive(self):
+        events = self.stream()
+        self.assertEqual([name for name, _, _ in events], ['meta', 'chunk', 'chunk', 'chunk', 'done'])
+        self.assertIn('Hemoglobin 11.2', events[0][1]['extracted_text_preview'])
+        self.assertEqual(events[-1][1]['analysis'], ''.join(StubGeminiHandler.chunks))
+        first_chunk_at, done_at = events[1][2], events[-1][2]
+        self.assertLess(first_chunk_at, 0.25)  # Not held back until the whole answer is generated
+        self.assertGreaterEqual(done_at, 0.55)
+        self.assertIn(':streamGenerateContent?alt=sse', self.server.requests[0])
+
+        # The finished answer is cached, a repeat upload does not reach the model again
+        self.assertEqual(self.stream()[-1][1]['analysis'], ''.join(StubGeminiHandler.chunks))
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_model_errors_become_an_error_event(self):
+        with mock.patch.object(StubGeminiHandler, 'status', 500):
+            events = self.stream()
+        self.assertEqual([name for name, _, _ in events], ['meta', 'error'])
+        self.assertEqual(len(self.server.requests), 3)  # First attempt and REPORT_LLM_MAX_RETRIES retries
+        # Nothing was cached for the failed attempt
+        self.assertEqual(self.stream()[-1][0], 'done')
+        self.assertEqual(len(self.server.requests), 4)
+
+
+class LongReportTest(TestCase):
+    def test_prepare_report_text_drops_noise_and_repeated_headers(self):
+        page = "CITY LABS   Pvt Ltd\nDr. R. Mehta, MD Pathology\n\nHemoglobin    {hb}  g/dL\n~~ ,, ..\nPage {n} of 3\n\f"
+        text = ''.join(page.format(hb=hb, n=n) for n, hb in ((1, 11.2), (2, 11.9), (3, 12.4)))
+        self.assertEqual(text_prep.prepare_report_text(text), (
+            "CITY LABS Pvt Ltd\nDr. R. Mehta, MD Pathology\n\nHemoglobin 11.2 g/dL\n\n"
+            "Hemoglobin 11.9 g/dL\n\nHemoglobin 12.4 g/dL"
+        ))
+
+    def test_repeated_table_cells_are_kept(self):
+        # PyMuPDF gives one table cell per line, so units and results repeat on every page
+        rows = (
+            ("Hemoglobin\n11.2\ng/dL\nMCHC\n33\ng/dL", "Urine sugar\nNegative\nUrine ketones\nNegative"),
+            ("Glucose\n90\nmg/dL\nUrea\n30\nmg/dL", "Bile salts\nNegative\nBile pigments\nNegative"),
+            ("Sodium\n140\nmmol/L\nChloride\n101\nmmol/L", "Nitrite\nNegative\nBlood\nNegative"),
+        )
+        text = ''.join(f"CITY LABS\n{blood}\n{urine}\nDr. R. Mehta\f" for blood, urine in rows)
+        pages = text_prep.prepare_report_text(text).split('\n\n')
+        self.assertEqual(pages[0].split('\n'), ['CITY LABS', 'Hemoglobin', '11.2', 'g/dL', 'MCHC', '33', 'g/dL',
+                                                'Urine sugar', 'Negative', 'Urine ketones', 'Negative', 'Dr. R. Mehta'])
+        self.assertEqual(pages[1].split('\n'), ['Glucose', '90', 'mg/dL', 'Urea', '30', 'mg/dL',
+                                                'Bile salts', 'Negative', 'Bile pigments', 'Negative'])
+
+    def test_split_into_chunks_respects_the_budget(self):
+        paragraphs = [f"Test {n}: " + "value " * 30 for n in range(40)]
+        chunks = text_prep.split_into_chunks('\n\n'.join(paragraphs), max_tokens=100)
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(text_prep.estimate_tokens(chunk) <= 100 for chunk in chunks))
+        self.assertEqual('\n\n'.join(chunks), '\n\n'.join(paragraphs))  # Nothing lost or reordered
+        self.assertEqual(text_prep.split_into_chunks('x' * 950, max_tokens=100), ['x' * 400, 'x' * 400, 'x' * 150])
+
+    @override_settings(REPORT_LLM_MAX_INPUT_TOKENS=200, REPORT_LLM_CHUNK_TOKENS=100, REPORT_LLM_MAX_PARALLEL_CALLS=4)
+    def test_long_reports_are_condensed_in_parallel_then_combined(self):
+        prompts = []
+
+        def fake_gemini(prompt):
+            prompts.append(prompt)
+            time.sleep(0.3)
+            return 'Hemoglobin 11.2 g/dL LOW' if 'You are reading part' in prompt else 'final analysis'
+
+        report = '\n\n'.join(f"Test {n}: " + "value " * 30 for n in range(12))
+        with mock.patch.object(views, 'generate_with_gemini', side_effect=fake_gemini):
+            started = time.perf_counter()
+            analysis = views.analyze_report_with_gemini(report)
+            elapsed = time.perf_counter() - started
+
+        self.assertEqual(analysis, 'final analysis')
+        self.assertEqual(len(prompts), 7)  # 6 parts of two tests each + the combining call
+        self.assertIn('Part 6:\nHemoglobin 11.2 g/dL LOW', prompts[-1])
+        self.assertLess(elapsed, 1.2)  # 6 parts on 4 threads take two rounds (~0.3 s each), not six
+
+    @override_settings(REPORT_LLM_MAX_INPUT_TOKENS=200, REPORT_LLM_CHUNK_TOKENS=100)
+    def test_failed_part_fails_the_analysis(self):
+        report = '\n\n'.join(f"Test {n}: " + "value " * 30 for n in range(12))
+        with mock.patch.object(views, 'generate_with_gemini',
+                               side_effect=views.AnalysisError('Sorry, an error occurred while analyzing the report.')) as gemini:
+            with self.assertRaises(views.AnalysisError):
+                views.analyze_report_with_gemini(report)
+        self.assertEqual(gemini.call_count, 6)  # The combining call is never made
+
+    def test_short_reports_use_a_single_call(self):
+        with mock.patch.object(views, 'generate_with_gemini', return_value='analysis') as gemini:
+            views.analyze_report_with_gemini(REPORT_TEXT)
+        gemini.assert_called_once()
+        self.assertIn('Glucose fasting 132 mg/dL', gemini.call_args.args[0])
+
+
+class LabValueTest(TestCase):
+    def setUp(self):
+        overrides = override_settings(CACHES=TEST_CACHES, REPORT_JOB_IN_PROCESS_WORKERS=0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        caches['reports'].clear()
+        self.addCleanup(caches['reports'].clear)
+
+        self.user = get_user_model().objects.create_user(username='u', email='u@example.com', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_parses_values_units_and_printed_ranges(self):
+        text = (
+            "Patient: K. Sharma   Age: 40\n"
+            "1. HbA1c : 6.8 % 4.0-5.6\n"
+            "Total Leucocyte Count 4,500 /cumm\n"
+            "TSH 3.1 µIU/mL\n"
+            "HDL Cholesterol (Direct) 38 mg/dL >40\n"
+            "Creatinine 1.2 mmol/l\n"
+        )
+        results = {r['analyte']: r for r in lab_values.parse_lab_values(text)}
+        self.assertEqual(list(results), ['hba1c', 'wbc', 'tsh', 'hdl', 'creatinine'])
+        self.assertEqual((results['hba1c']['status'], results['hba1c']['range_source']), ('high', 'report'))
+        self.assertEqual((results['wbc']['value'], results['wbc']['status']), (4500, 'normal'))
+        self.assertEqual(results['tsh']['range_source'], 'table')
+        self.assertEqual((results['hdl']['reference_low'], results['hdl']['status']), (40, 'low'))
+        # No printed range and a unit the table does not know: not guessed
+        self.assertEqual(results['creatinine']['status'], 'unknown')
+
+    def test_table_ranges_depend_on_sex_and_age(self):
+        line = "Hemoglobin 12.5 g/dL"
+        self.assertEqual(lab_values.parse_lab_values(line, 'Male', 40)[0]['status'], 'low')
+        self.assertEqual(lab_values.parse_lab_values(line, 'Female', 40)[0]['status'], 'normal')
+        self.assertEqual(lab_values.parse_lab_values(line, 'Other', 10)[0]['reference_low'], 11.5)
+
+    def test_ordinal_in_test_name_is_not_the_value(self):
+        result = lab_values.parse_lab_values("ESR 1st hour 20 mm/hr", 'Male', 40)[0]
+        self.assertEqual((result['analyte'], result['value'], result['unit']), ('esr', 20, 'mm/hr'))
+        self.assertEqual(result['status'], 'high')
+
+    def test_short_aliases_need_a_unit(self):
+        text = (
+            "K 12 Sector 4\n"
+            "Na 2 copies\n"
+            "10K 5 steps\n"
+            "Na+ 140 mEq/L\n"
+            "K 5.9 mmol/L\n"
+        )
+        results = {r['analyte']: r for r in lab_values.parse_lab_values(text)}
+        self.assertEqual(list(results), ['sodium', 'potassium'])
+        self.assertEqual((results['potassium']['value'], results['potassium']['status']), (5.9, 'high'))
+
+    def upload(self, content=PNG_SIGNATURE + b'cbc', url='/api/v1/reports/analyze/', **data):
+        return self.client.post(url, {
+            'report_file': SimpleUploadedFile('report.png', content, content_type='image/png'), **data,
+        }, format='multipart')
+
+    def test_recognised_report_is_answered_without_the_llm(self):
+        UserProfile.objects.create(user=self.user, age=35, gender='Female')
+        text = "Hemoglobin 12.5 g/dL\nFasting Blood Sugar 132 mg/dL"
+        with mock.patch.object(views, 'extract_text_from_image', return_value=text), \
+                mock.patch.object(views, 'analyze_report_with_gemini') as gemini:
+            response = self.upload()
+            job = self.upload(url='/api/v1/reports/jobs/')  # Text is cached: the job finishes at once
+        gemini.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['analysis_source'], 'local')
+        self.assertEqual([r['status'] for r in response.data['lab_values']], ['normal', 'high'])  # Female range
+        self.assertIn('**Fasting Glucose**: 132 mg/dL is **high**', response.data['analysis'])
+        self.assertIn('not medical advice', response.data['analysis'])
+        self.assertEqual(job.data['status'], ReportJob.DONE)
+        self.assertEqual(job.data['lab_values'], response.data['lab_values'])
+
+    def test_enrich_chooses_when_the_llm_is_asked(self):
+        with mock.patch.object(views, 'extract_text_from_image', return_value=REPORT_TEXT), \
+                mock.patch.object(views, 'analyze_report_with_gemini', return_value='llm analysis') as gemini:
+            always = self.upload(enrich='always')
+            self.assertEqual((always.data['analysis'], always.data['analysis_source']), ('llm analysis', 'llm'))
+            self.assertEqual(len(always.data['lab_values']), 2)
+
+            with mock.patch.object(views, 'extract_text_from_image', return_value='Dear doctor, please review.'):
+                unrecognised = self.upload(content=PNG_SIGNATURE + b'letter')
+                never = self.upload(content=PNG_SIGNATURE + b'letter', enrich='never')
+            self.assertEqual(unrecognised.data['analysis_source'], 'llm')  # auto: nothing recognised
+            self.assertEqual(never.data['analysis_source'], 'local')
+            self.assertEqual(gemini.call_count, 2)
+
+        self.assertEqual(self.upload(enrich='sometimes').status_code, 400)
+
+
+class StubGenerateHandler(BaseHTTPRequestHandler):
+    """
+    Answers generateContent like Gemini, after `delay` seconds; the first `failures`
+    requests get a 503. `body` replaces the JSON answer; with `trickle` set the
+    body is sent one byte every `trickle` seconds.
+    """
+    protocol_version = 'HTTP/1.1'
+    failures = 0
+    failure_status = 503
+    delay = 0
+    body = None
+    trickle = 0
+
+    def do_POST(self):
+        self.server.requests.append(self.path)
+        self.server.ports.add(self.client_address[1])
+        self.rfile.read(int(self.headers['Content-Length']))
+        if len(self.server.requests) <= self.failures:
+            self.send_response(self.failure_status)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        time.sleep(self.delay)
+        body = self.body or json.dumps({
+            'candidates': [{'content': {'parts': [{'text': 'analysis'}], 'role': 'model'}}],
+            'usageMetadata': {'promptTokenCount': 12, 'candidatesTokenCount': 5},
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not self.trickle:
+            self.wfile.write(body)
+            return
+        try:
+            for index in range(len(body)):
+                self.wfile.write(body[index:index + 1])
+                self.wfile.flush()
+                time.sleep(self.trickle)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class LLMClientTest(TestCase):
+    def setUp(self):
+        self.server = start_stub_server(self, StubGenerateHandler)
+        self.server.ports = set()
+        overrides = override_settings(
+            GEMINI_API_BASE_URL=f'http://127.0.0.1:{self.server.server_port}/v1beta', REPORT_LLM_BACKEND='gemini',
+            REPORT_LLM_RETRY_BACKOFF_SECONDS=0.01, REPORT_LLM_MAX_RETRIES=2,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        patcher = mock.patch.dict(os.environ, {'GEMINI_API_KEY': 'test-key'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_retries_server_errors_over_one_connection_and_counts_them(self):
+        client = llm_client.get_client()
+        with mock.patch.object(StubGenerateHandler, 'failures', 2):
+            self.assertEqual(client.generate('prompt'), 'analysis')
+        self.assertEqual(client.generate('prompt'), 'analysis')
+        self.assertEqual(len(self.server.requests), 4)
+        self.assertEqual(len(self.server.ports), 1)  # Keep-alive: every call reused the same connection
+
+        metrics = client.metrics.snapshot()
+        self.assertEqual((metrics['calls'], metrics['successes'], metrics['retries']), (2, 2, 2))
+        self.assertEqual((metrics['prompt_tokens'], metrics['output_tokens']), (24, 10))  # From usageMetadata
+
+    def test_client_errors_are_not_retried(self):
+        with mock.patch.object(StubGenerateHandler, 'failures', 5), \
+                mock.patch.object(StubGenerateHandler, 'failure_status', 400):
+            with self.assertRaisesMessage(views.AnalysisError, "Sorry, an error occurred while analyzing the report."):
+                views.generate_with_gemini('prompt')
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(llm_client.get_client().metrics.snapshot()['errors'], {'http': 1})
+
+    @override_settings(REPORT_LLM_TIMEOUT_SECONDS=0.3)
+    def test_slow_upstream_is_cut_off_at_the_deadline(self):
+        started = time.perf_counter()
+        with mock.patch.object(StubGenerateHandler, 'delay', 2):
+            with self.assertRaisesMessage(views.AnalysisError, 'taking too long'):
+                views.generate_with_gemini('prompt')
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertEqual(llm_client.get_client().metrics.snapshot()['timeouts'], 1)
+
+    def test_body_that_is_not_json_is_a_format_error(self):
+        client = llm_client.get_client()
+        with mock.patch.object(StubGenerateHandler, 'body', b'<html>Bad gateway</html>'):
+            with self.assertRaises(llm_client.LLMError) as error:
+                client.generate('prompt')
+        self.assertEqual(error.exception.kind, 'format')
+        self.assertEqual(len(self.server.requests), 1)
+        metrics = client.metrics.snapshot()
+        self.assertEqual((metrics['in_flight'], metrics['errors']), (0, {'format': 1}))
+
+    @override_settings(REPORT_LLM_TIMEOUT_SECONDS=0.5, REPORT_LLM_MAX_RETRIES=0)
+    def test_trickling_body_is_cut_off_at_the_deadline(self):
+        # Every read finishes well within the timeout, but the whole body would take seconds
+        started = time.perf_counter()
+        with mock.patch.object(StubGenerateHandler, 'trickle', 0.05):
+            with self.assertRaises(llm_client.LLMError) as error:
+                llm_client.get_client().generate('prompt')
+        self.assertLess(time.perf_counter() - started, 1.5)
+        self.assertEqual(error.exception.kind, 'timeout')
+        self.assertEqual(llm_client.get_client().metrics.snapshot()['in_flight'], 0)
+
+    @override_settings(REPORT_LLM_BACKEND='stub', REPORT_LLM_STUB_DELAY_SECONDS=0.2, REPORT_LLM_MAX_CONCURRENT_CALLS=2)
+    def test_concurrent_calls_are_capped(self):
+        client = llm_client.get_client()
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client.generate, args=('prompt',)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertGreaterEqual(time.perf_counter() - started, 0.4)  # Two rounds of two calls
+        self.assertEqual(client.metrics.snapshot()['successes'], 4)
+        self.assertEqual(len(self.server.requests), 0)  # The stub backend never touches the network
+
+        # A call that cannot get a slot before its deadline fails instead of queueing forever
+        blocker = threading.Thread(target=lambda: [client.generate('prompt') for _ in range(2)])
+        other = threading.Thread(target=client.generate, args=('prompt',))
+        blocker.start(), other.start()
+        time.sleep(0.05)
+        with self.assertRaises(llm_client.LLMError) as error:
+            client.generate('prompt', timeout=0.05)
+        self.assertEqual(error.exception.kind, 'busy')
+        blocker.join(), other.join()
+
+    @override_settings(REPORT_LLM_BACKEND='stub')
+    def test_metrics_endpoint_is_admin_only(self):
+        user = get_user_model().objects.create_user(username='u', email='u@example.com', password='pass12345')
+        api = APIClient()
+        api.force_authenticate(user)
+        self.assertEqual(api.get('/api/v1/reports/llm/metrics/').status_code, 403)
+        user.is_staff = True
+        user.save()
+        response = api.get('/api/v1/reports/llm/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['backend'], 'stub')
+        self.assertIn('latency_ms_p95', response.data)
+
+
+class JobHeartbeatTest(TransactionTestCase):
+    """The heartbeat writes from its own thread, so this test does not run inside a transaction."""
+
+    @override_settings(REPORT_JOB_IN_PROCESS_WORKERS=0, REPORT_JOB_STALE_SECONDS=1, REPORT_JOB_HEARTBEAT_SECONDS=0.1,
+                       CACHES=TEST_CACHES)
+    def test_long_stage_is_not_requeued(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        user = get_user_model().objects.create_user(username='u', email='u@example.com', password='pass12345')
+        requeued = []
+
+        def slow_ocr(image_file):
+            time.sleep(1.5)  # Longer than REPORT_JOB_STALE_SECONDS
+            requeued.append(jobs.requeue_stale_jobs())
+            return REPORT_TEXT
+
+        with override_settings(MEDIA_ROOT=media_root), \
+                mock.patch.object(views, 'extract_text_from_image', side_effect=slow_ocr):
+            job = jobs.enqueue_report(user, SimpleUploadedFile('scan.png', PNG_SIGNATURE + b'slow scan'))
+            self.assertEqual(jobs.process_available_jobs(), 1)
+        self.assertEqual(requeued, [0])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (ReportJob.DONE, 1))
+
+
+class LatencyBudgetTest(TransactionTestCase):
+    """The late LLM answer is saved from an executor thread, so these tests do not run inside a transaction."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = override_settings(
+            MEDIA_ROOT=media_root, CACHES=TEST_CACHES, REPORT_JOB_IN_PROCESS_WORKERS=0,
+            REPORT_LLM_ENRICHMENT='always', REPORT_LLM_LATENCY_BUDGET_SECONDS=0.2,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        caches['reports'].clear()
+        self.addCleanup(caches['reports'].clear)
+
+        self.llm_may_answer = threading.Event()
+        self.addCleanup(self.llm_may_answer.set)
+
+        def slow_gemini(report_text):
+            self.llm_may_answer.wait(5)
+            return '### 📝 Report Summary\nLate but detailed.'
+
+        for patcher in (
+            mock.patch.object(views, 'extract_text_from_image', return_value=REPORT_TEXT),
+            mock.patch.object(views, 'analyze_report_with_gemini', side_effect=slow_gemini),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.user = get_user_model().objects.create_user(username='u', email='u@example.com', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, url='/api/v1/reports/analyze/'):
+        return self.client.post(url, {
+            'report_file': SimpleUploadedFile('report.png', PNG_SIGNATURE + b'scan', content_type='image/png'),
+        }, format='multipart')
+
+    def wait_for_llm_answer(self, job_id):
+        self.llm_may_answer.set()
+        for _ in range(100):
+            job = ReportJob.objects.get(pk=job_id)
+            if not job.llm_pending:
+                return job
+            time.sleep(0.05)
+        self.fail('The late LLM answer was never attached to the job')
+
+    def test_slow_llm_gets_local_summary_then_answer_on_job(self):
+        started = time.perf_counter()
+        response = self.upload()
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertEqual((response.data['analysis_source'], response.data['llm_pending']), ('local', True))
+        self.assertIn('**Hemoglobin**: 11.2 g/dL is **low**', response.data['analysis'])
+        self.assertIn('### 🛡 General Precautions', response.data['analysis'])
+
+        job = self.wait_for_llm_answer(response.data['job_id'])
+        self.assertEqual((job.analysis, job.analysis_source), ('### 📝 Report Summary\nLate but detailed.', 'llm'))
+        detail = self.client.get(response.data['status_url'])
+        self.assertEqual(detail.data['analysis_source'], 'llm')
+        self.assertFalse(detail.data['llm_pending'])
+
+        # The late answer was cached too
+        self.assertEqual(self.upload().data['analysis_source'], 'llm')
+
+    def test_queued_job_finishes_with_local_summary_first(self):
+        job_id = self.upload(url='/api/v1/reports/jobs/').data['job_id']
+        jobs.process_available_jobs()
+        job = ReportJob.objects.get(pk=job_id)
+        self.assertEqual((job.status, job.analysis_source, job.llm_pending), (ReportJob.DONE, 'local', True))
+
+        job = self.wait_for_llm_answer(job_id)
+        self.assertEqual(job.analysis_source, 'llm')
+        self.assertIn('Late but detailed', job.analysis)
+
+
+class ReportHistoryTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=media_root, CACHES=TEST_CACHES, REPORT_JOB_IN_PROCESS_WORKERS=0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        caches['reports'].clear()
+        self.addCleanup(caches['reports'].clear)
+
+        patcher = mock.patch.object(views, 'extract_text_from_image', return_value=REPORT_TEXT)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = get_user_model().objects.create_user(username='u', email='u@example.com', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, content=PNG_SIGNATURE + b'scan', url='/api/v1/reports/analyze/'):
+        return self.client.post(url, {
+            'report_file': SimpleUploadedFile('report.png', content, content_type='image/png'),
+        }, format='multipart')
+
+    def test_failed_analysis_is_not_reused_by_later_uploads(self):
+        no_lab_values = 'Chest X-ray: no focal consolidation. Heart size normal.'
+        with mock.patch.object(views, 'extract_text_from_image', return_value=no_lab_values), \
+                mock.patch.object(views, 'analyze_report_with_gemini',
+                                  side_effect=views.AnalysisError("Sorry, an error occurred while analyzing the report.")) as analyze:
+            first = self.upload()
+            caches['reports'].clear()  # Only the database remembers the first upload now
+            second = self.upload()
+        self.assertEqual(analyze.call_count, 2)
+        self.assertEqual(Report.objects.get(pk=first.data['report_id']).analysis_source, 'failed')
+        self.assertEqual(second.data['analysis_source'], 'failed')
+
+    def test_answer_starting_with_sorry_is_a_real_analysis(self):
+        no_lab_values = 'Chest X-ray: no focal consolidation. Heart size normal.'
+        answer = "Sorry, this report has no lab values to compare, but the X-ray findings look normal."
+        with mock.patch.object(views, 'extract_text_from_image', return_value=no_lab_values), \
+                mock.patch.object(views, 'analyze_report_with_gemini', return_value=answer) as analyze:
+            first = self.upload()
+            caches['reports'].clear()
+            second = self.upload()
+        analyze.assert_called_once()  # Stored as a successful analysis and reused
+        self.assertEqual(Report.objects.get(pk=first.data['report_id']).analysis_source, 'llm')
+        self.assertEqual((second.data['analysis'], second.data['analysis_source']), (answer, 'llm'))
+
+    def test_analyses_are_saved_with_shared_compressed_text_and_timings(self):
+        report_id = self.upload().data['report_id']
+        other = get_user_model().objects.create_user(username='o', email='o@example.com', password='pass12345')
+        self.client.force_authenticate(other)
+        self.upload()
+        self.upload(url='/api/v1/reports/jobs/')  # Finished from the stored text at once
+
+        self.assertEqual(ReportText.objects.count(), 1)  # One blob for the same file across users
+        blob = ReportText.objects.get()
+        self.assertEqual((blob.text, blob.length), (REPORT_TEXT, len(REPORT_TEXT)))
+        self.assertNotIn(b'Hemoglobin', bytes(blob.compressed_text))
+        self.assertEqual(Report.objects.filter(text=blob).count(), 3)
+
+        report = Report.objects.get(pk=report_id)
+        self.assertEqual(report.user, self.user)
+        self.assertIn('extracting', report.timings)
+        self.assertIn('total', report.timings)
+
+    def test_revisit_is_served_from_the_database(self):
+        self.upload()
+        caches['reports'].clear()
+        with mock.patch.object(views, 'extract_report_text') as extract:
+            response = self.upload()
+        extract.assert_not_called()
+        self.assertEqual(response.data['lab_values'][0]['analyte'], 'hemoglobin')
+
+    def test_history_is_paginated_without_loading_texts(self):
+        for number in range(3):
+            self.upload(content=PNG_SIGNATURE + b'scan %d' % number)
+        other = get_user_model().objects.create_user(username='o', email='o@example.com', password='pass12345')
+        Report.objects.create(user=other, original_name='not yours.png')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/reports/history/', {'page_size': 2})
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(response.data['results'][0]['text_length'], len(REPORT_TEXT))
+        self.assertEqual(len(queries), 2)  # Count and page
+        self.assertTrue(all('compressed_text' not in query['sql'] and '"analysis"' not in query['sql']
+                            for query in queries.captured_queries))
+
+        report_id = response.data['results'][0]['report_id']
+        detail = self.client.get(f'/api/v1/reports/history/{report_id}/')
+        self.assertEqual(detail.data['extracted_text'], REPORT_TEXT)
+        self.assertIn('### 📝 Report Summary', detail.data['analysis'])
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(f'/api/v1/reports/history/{report_id}/').status_code, 404)
@@ -0,0 +1,118 @@
+# report_analysis/text_prep.py
+
+"""
+Cleaning and sizing of extracted report text before it goes to the LLM.
+
+Extracted text carries a lot of noise that costs tokens without helping the
+analysis: runs of spaces from table layouts, OCR debris lines, and the lab's
+letterhead, address and signature repeated on every page. prepare_report_text
+removes those; estimate_tokens and split_into_chunks let long reports be
+analyzed in pieces that fit the model's budget.
+"""
+
+import re
+
+# "Page 2 of 5", "Page 3", "2/5", "- 4 -"
+PAGE_NUMBER = re.compile(r'^(?:page\s*\d+(?:\s*(?:of|/)\s*\d+)?|\d+\s*/\s*\d+|-\s*\d+\s*-)$', re.IGNORECASE)
+# A short line at the top or bottom of this many pages, and nowhere else, is a
+# header or footer (letterhead, address, signature). Pages are separated by form feeds.
+REPEATED_LINE_MIN_COUNT = 3
+REPEATED_LINE_MAX_LENGTH = 120
+EDGE_LINES = 3  # Lines at the top and at the bottom of a page that may be header or footer
+# Rough size of a token for English text and lab values
+CHARS_PER_TOKEN = 4
+
+
+def collapse_lines(text):
+    """Collapse runs of spaces/tabs, trim lines and keep at most one blank line in a row."""
+    lines = [' '.join(line.split()) for line in text.split('\n')]
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip()
+
+
+def normalize_whitespace(text):
+    """collapse_lines on every page; pages stay separated by form feeds."""
+    return '\f'.join(collapse_lines(page) for page in text.replace('\r', '\n').split('\f'))
+
+
+def is_noise(line):
+    # Page numbers and OCR debris (lines without a single letter or digit)
+    return bool(line) and (PAGE_NUMBER.match(line) is not None or not any(char.isalnum() for char in line))
+
+
+def edge_indexes(lines):
+    """Indexes of the first and last EDGE_LINES non-blank lines of a page."""
+    filled = [index for index, line in enumerate(lines) if line]
+    return set(filled[:EDGE_LINES] + filled[-EDGE_LINES:])
+
+
+def strip_repeated_lines(text):
+    """
+    Drop page numbers, OCR debris and every copy but the first of page headers
+    and footers: short lines found among the first or last lines of at least
+    REPEATED_LINE_MIN_COUNT pages and never in a page body. Lines repeated
+    inside the body, like the units or "Negative" of a lab table whose cells
+    come one per line, are kept.
+    """
+    pages = [[line for line in page.split('\n') if not is_noise(line)] for page in text.split('\f')]
+    edge_counts, body_lines = {}, set()
+    for lines in pages:
+        edges = edge_indexes(lines)
+        for line in {lines[index] for index in edges}:
+            edge_counts[line] = edge_counts.get(line, 0) + 1
+        body_lines.update(line for index, line in enumerate(lines) if index not in edges)
+    headers = {line for line, count in edge_counts.items()
+               if count >= REPEATED_LINE_MIN_COUNT and len(line) <= REPEATED_LINE_MAX_LENGTH and line not in body_lines}
+
+    kept_pages, seen = [], set()
+    for lines in pages:
+        edges = edge_indexes(lines)
+        kept = []
+        for index, line in enumerate(lines):
+            if index in edges and line in headers:
+                if line in seen:
+                    continue
+                seen.add(line)
+            kept.append(line)
+        kept_pages.append('\n'.join(kept).strip())
+    return re.sub(r'\n{3,}', '\n\n', '\n\n'.join(page for page in kept_pages if page)).strip()
+
+
+def prepare_report_text(text):
+    return strip_repeated_lines(normalize_whitespace(text))
+
+
+def estimate_tokens(text):
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def split_into_chunks(text, max_tokens):
+    """
+    Split text into pieces of at most max_tokens (estimated), breaking between
+    paragraphs where possible, then between lines, and only inside a line
+    when a single line is too long.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return [text]
+
+    pieces = []  # (separator before the piece, piece)
+    for paragraph in text.split('\n\n'):
+        if len(paragraph) <= max_chars:
+            pieces.append(('\n\n', paragraph))
+            continue
+        for index, line in enumerate(paragraph.split('\n')):
+            separator = '\n\n' if index == 0 else '\n'
+            for start in range(0, max(len(line), 1), max_chars):
+                pieces.append((separator if start == 0 else '', line[start:start + max_chars]))
+
+    chunks, current = [], ''
+    for separator, piece in pieces:
+        candidate = f'{current}{separator}{piece}' if current else piece
+        if len(candidate) <= max_chars:
+            current = candidate
+        else:
+            chunks.append(current)
+            current = piece
+    if current:
+        chunks.append(current)
+    return [chunk for chunk in chunks if chunk.strip()]
@@ -0,0 +1,45 @@
+# report_analysis/uploads.py
+
+"""
+Helpers for handling report uploads without holding them in memory.
+
+Django already spools uploads larger than FILE_UPLOAD_MAX_MEMORY_SIZE to a
+temporary file; these helpers let the rest of the pipeline use that file
+directly (PyMuPDF and the OCR workers open it by path) and decide what a file
+is from its first bytes instead of its name.
+"""
+
+PDF = 'pdf'
+IMAGE = 'image'
+
+# PDF readers accept the header anywhere in the first 1024 bytes
+PDF_HEADER_WINDOW = 1024
+IMAGE_SIGNATURES = (
+    b'\x89PNG\r\n\x1a\n',  # PNG
+    b'\xff\xd8\xff',  # JPEG
+    b'GIF87a', b'GIF89a',
+    b'BM',  # BMP
+    b'II*\x00', b'MM\x00*',  # TIFF, little/big endian
+)
+
+
+def sniff_report_type(report_file):
+    """Return PDF or IMAGE from the file's magic bytes, or None for anything else. Leaves the file rewound."""
+    report_file.seek(0)
+    head = report_file.read(PDF_HEADER_WINDOW)
+    report_file.seek(0)
+    if b'%PDF-' in head:
+        return PDF
+    if head.startswith(IMAGE_SIGNATURES):
+        return IMAGE
+    return None
+
+
+def local_path(report_file):
+    """Path of the file on local disk (spooled upload or stored file), or None if it only lives in memory."""
+    if hasattr(report_file, 'temporary_file_path'):
+        return report_file.temporary_file_path()
+    try:
+        return report_file.path
+    except (AttributeError, NotImplementedError, ValueError):
+        return None
@@ -1,6 +1,15 @@
 from django.urls import path
-from .views import ReportAnalysisView
+from .views import (
+    LLMMetricsView, ReportAnalysisStreamView, ReportAnalysisView, ReportHistoryDetailView, ReportHistoryView,
+    ReportJobDetailView, ReportJobListView,
+)
 
 urlpatterns = [
     path('analyze/', ReportAnalysisView.as_view(), name='report-analysis'),
+    path('analyze/stream/', ReportAnalysisStreamView.as_view(), name='report-analysis-stream'),
+    path('jobs/', ReportJobListView.as_view(), name='report-job-list'),
+    path('jobs/<uuid:job_id>/', ReportJobDetailView.as_view(), name='report-job-detail'),
+    path('history/', ReportHistoryView.as_view(), name='report-history'),
+    path('history/<uuid:report_id>/', ReportHistoryDetailView.as_view(), name='report-history-detail'),
+    path('llm/metrics/', LLMMetricsView.as_view(), name='report-llm-metrics'),
 ]
@@ -8,107 +8,77 @@
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.pagination import PageNumberPagination
 from rest_framework import status
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from PIL import Image
 import pytesseract
-import requests
 import json
-import PyPDF2
-import fitz  # PyMuPDF
-import io
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import threading
+import time
 import os  
 from dotenv import load_dotenv  
+from .jobs import attach_late_analysis, create_finished_job, enqueue_report
+from .lab_values import format_lab_summary, parse_lab_values
+from .llm_client import LLMError
+from . import llm_client, result_cache
+from .models import Report, ReportJob, ReportText
+from .ocr import ocr_image, ocr_options, ocr_pdf, open_pdf
+from .text_prep import estimate_tokens, prepare_report_text, split_into_chunks
+from .uploads import PDF, local_path, sniff_report_type
 
 load_dotenv()
 
 # Add this line to explicitly point to your Tesseract installation.
 pytesseract.pytesseract.tesseract_cmd = r'C:\Users\Excel\AppData\Local\Programs\Tesseract-OCR\tesseract.exe'
 
-def extract_text_from_pdf(pdf_file):
-    """Extract text from PDF file using multiple methods"""
+def extract_text_from_pdf(pdf_file, on_stage=None):
+    """
+    Extract text from a PDF in a single PyMuPDF pass: every page's text layer is
+    kept, and only pages with too little text (scanned pages) are sent to OCR, so
+    a typed first page no longer hides scanned result pages behind it.
+    on_stage(stage) is called when OCR starts.
+    """
     try:
-        pdf_file.seek(0)  # Reset file pointer
-        
-        # Method 1: Try PyPDF2 for text-based PDFs
-        print("[INFO] Attempting text extraction using PyPDF2...")
-        try:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            text = ""
-            
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                page_text = page.extract_text()
-                text += page_text + "\n"
-            
-            # Check if we got meaningful text (not just whitespace/special chars)
-            if text.strip() and len(text.strip()) > 10:
-                print(f"[SUCCESS] PyPDF2 extracted {len(text)} characters")
-                return text.strip()
-            else:
-                print("[INFO] PyPDF2 extracted minimal text, trying PyMuPDF...")
-        except Exception as e:
-            print(f"[WARNING] PyPDF2 failed: {e}")
-        
-        # Method 2: Try PyMuPDF for better text extraction
-        pdf_file.seek(0)
-        try:
-            pdf_bytes = pdf_file.read()
-            pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
-            text = ""
-            
-            for page_num in range(pdf_document.page_count):
-                page = pdf_document[page_num]
-                page_text = page.get_text()
-                text += page_text + "\n"
-            
-            pdf_document.close()
-            
-            # Check if we got meaningful text
-            if text.strip() and len(text.strip()) > 10:
-                print(f"[SUCCESS] PyMuPDF extracted {len(text)} characters")
-                return text.strip()
-            else:
-                print("[INFO] PyMuPDF extracted minimal text, trying OCR...")
-        except Exception as e:
-            print(f"[WARNING] PyMuPDF failed: {e}")
-        
-        # Method 3: OCR on PDF pages (for image-based PDFs)
-        pdf_file.seek(0)
-        try:
-            pdf_bytes = pdf_file.read()
-            pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
-            text = ""
-            
-            print(f"[INFO] PDF has {pdf_document.page_count} pages, performing OCR...")
-            
-            for page_num in range(min(pdf_document.page_count, 5)):  # Limit to first 5 pages
-                print(f"[INFO] Processing page {page_num + 1} with OCR...")
-                page = pdf_document[page_num]
-                
-                # Convert PDF page to image
-                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x zoom for better OCR
-                img_data = pix.tobytes("png")
-                
-                # Perform OCR on the image
-                img = Image.open(io.BytesIO(img_data))
-                page_text = pytesseract.image_to_string(img)
-                text += page_text + "\n"
-            
-            pdf_document.close()
-            
-            if text.strip() and len(text.strip()) > 10:
-                print(f"[SUCCESS] OCR extracted {len(text)} characters from PDF")
-                return text.strip()
-            else:
-                print("[WARNING] OCR extracted minimal text from PDF")
-                
-        except Exception as e:
-            print(f"[ERROR] PDF OCR failed: {e}")
-        
+        # Spooled uploads and stored files are opened by path; only small in-memory uploads are read
+        pdf_source = local_path(pdf_file)
+        if pdf_source is None:
+            pdf_file.seek(0)  # Reset file pointer
+            pdf_source = pdf_file.read()
+
+        with open_pdf(pdf_source) as pdf_document:
+            page_texts = [page.get_text() for page in pdf_document]
+
+        min_chars = settings.REPORT_PAGE_MIN_TEXT_CHARS
+        scanned_pages = [number for number, text in enumerate(page_texts) if len(text.strip()) < min_chars]
+        print(f"[INFO] PDF has {len(page_texts)} pages, {len(scanned_pages)} without a usable text layer")
+
+        if scanned_pages:
+            if on_stage:
+                on_stage(ReportJob.OCR)
+            try:
+                # Pages are rendered and OCR'd in parallel, see ocr.py
+                for number, text in ocr_pdf(pdf_source, scanned_pages).items():
+                    if len(text.strip()) > len(page_texts[number].strip()):
+                        page_texts[number] = text
+            except Exception as e:
+                print(f"[ERROR] PDF OCR failed: {e}")
+
+        # Pages are separated by form feeds so headers and footers can be told apart (see text_prep.py)
+        text = "\f".join(page_texts)
+        if text.strip() and len(text.strip()) > 10:
+            print(f"[SUCCESS] Extracted {len(text)} characters from PDF")
+            return text.strip()
+
+        print("[WARNING] Extracted minimal text from PDF")
         return None
-        
+
     except Exception as e:
         print(f"❌ ERROR: Failed to extract text from PDF: {e}")
         return None
@@ -119,10 +89,8 @@ def extract_text_from_image(image_file):
         print("[INFO] Performing OCR on image...")
         img = Image.open(image_file)
         
-        # Enhance image for better OCR (optional)
-        # img = img.convert('L')  # Convert to grayscale
-        
-        extracted_text = pytesseract.image_to_string(img)
+        # Resize, grayscale/binarize and deskew as configured (REPORT_OCR_* settings)
+        extracted_text = ocr_image(img, ocr_options())
         
         if extracted_text.strip():
             print(f"[SUCCESS] OCR extracted {len(extracted_text)} characters from image")
@@ -135,17 +103,9 @@ def extract_text_from_image(image_file):
         print(f"❌ ERROR: Failed to extract text from image: {e}")
         return None
 
-def analyze_report_with_gemini(report_text: str) -> str:
-    """Sends the report text to the Gemini API for a safe and structured analysis."""
-    
-    api_key = os.getenv('GEMINI_API_KEY')  
-    if not api_key:
-        print("❌ ERROR: GEMINI_API_KEY not found in environment variables.")
-        return "Sorry, API key is missing. Please check your .env file."
-    
-    api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={api_key}"
-
-    prompt = f"""
+def build_analysis_prompt(report_text: str) -> str:
+    """The instructions and report text sent to Gemini."""
+    return f"""
     You are a helpful and extremely cautious AI Medical Assistant. Your role is to help a patient understand their lab report in simple, clear language.
     Analyze the provided medical report text. Your analysis MUST follow these strict rules:
     1. NEVER provide a definitive diagnosis. Only discuss POSSIBLE conditions in general terms.
@@ -171,90 +131,602 @@ def analyze_report_with_gemini(report_text: str) -> str:
     {report_text}
     ---
     """
-    
-    payload = { "contents": [{ "parts": [{ "text": prompt }] }] }
-    headers = { 'Content-Type': 'application/json' }
 
+
+def build_section_prompt(section_text: str, number: int, total: int) -> str:
+    """Prompt that condenses one part of a long report into notes for the final analysis."""
+    return f"""
+    You are reading part {number} of {total} of a patient's medical report.
+    List every test or finding in this part with its value, unit and reference range, one per line,
+    and mark values outside their reference range as HIGH or LOW. Keep the patient details and dates.
+    Do not interpret the results and do not give any advice.
+    ---
+    {section_text}
+    ---
+    """
+
+
+class AnalysisError(Exception):
+    """A Gemini call failed; the message is the apology shown to the user."""
+
+
+def build_report_prompt(report_text: str) -> str:
+    """
+    The final analysis prompt for a report. The text is cleaned first (see
+    text_prep.py); if it is still over REPORT_LLM_MAX_INPUT_TOKENS it is split
+    into chunks that are condensed into notes by concurrent Gemini calls, and
+    the prompt is built from the combined notes, so latency is bounded by the
+    slowest chunk rather than by one huge prompt. Raises AnalysisError if a
+    chunk call fails (the combining call is then never made).
+    """
+    text = prepare_report_text(report_text)
+    tokens = estimate_tokens(text)
+    if tokens <= settings.REPORT_LLM_MAX_INPUT_TOKENS:
+        return build_analysis_prompt(text)
+
+    chunks = split_into_chunks(text, settings.REPORT_LLM_CHUNK_TOKENS)
+    print(f"[INFO] Report is ~{tokens} tokens, analyzing it in {len(chunks)} parts...")
+    prompts = [build_section_prompt(chunk, number, len(chunks)) for number, chunk in enumerate(chunks, start=1)]
+    workers = max(1, min(settings.REPORT_LLM_MAX_PARALLEL_CALLS, len(prompts)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        notes = list(executor.map(generate_with_gemini, prompts))
+
+    combined = "\n\n".join(f"Part {number}:\n{note.strip()}" for number, note in enumerate(notes, start=1))
+    return build_analysis_prompt(f"(Long report, condensed into notes per part)\n\n{combined}")
+
+
+def analyze_report_with_gemini(report_text: str) -> str:
+    """
+    Sends the report text to the Gemini API for a safe and structured analysis.
+    Raises AnalysisError if a call fails.
+    """
+    return generate_with_gemini(build_report_prompt(report_text))
+
+
+# What the user sees for each kind of LLMError
+LLM_APOLOGIES = {
+    'config': "Sorry, API key is missing. Please check your .env file.",
+    'format': "Sorry, the analysis response was in an unexpected format. Please try again.",
+    'timeout': "Sorry, the analysis is taking too long right now. Please try again in a few minutes.",
+    'busy': "Sorry, the analysis is taking too long right now. Please try again in a few minutes.",
+}
+
+
+def generate_with_gemini(prompt: str) -> str:
+    """
+    Sends one prompt to the LLM and returns the text of the answer; raises
+    AnalysisError, carrying the apology to show, if the call failed.
+    """
     try:
         print("[INFO] Sending extracted text to Gemini for analysis...")
-        response = requests.post(api_url, headers=headers, json=payload)
-        response.raise_for_status()
-        
-        result = response.json()
-        
-        # Handle different possible response structures
-        analysis_text = "Sorry, the analysis could not be generated."
-        
-        try:
-            analysis_text = result['candidates'][0]['content']['parts'][0]['text']
-            print("[SUCCESS] Analysis received.")
-            return analysis_text
-        except (KeyError, IndexError, TypeError) as parse_error:
-            print(f"❌ ERROR: Could not parse Gemini response structure: {parse_error}")
-            return "Sorry, the analysis response was in an unexpected format. Please try again."
-        
-    except requests.exceptions.RequestException as e:
+        analysis_text = llm_client.get_client().generate(prompt)
+        print("[SUCCESS] Analysis received.")
+        return analysis_text
+    except LLMError as e:
         print(f"❌ ERROR: An error occurred during Gemini API call: {e}")
-        return "Sorry, an error occurred while analyzing the report."
+        raise AnalysisError(LLM_APOLOGIES.get(e.kind, "Sorry, an error occurred while analyzing the report.")) from e
     except Exception as e:
         print(f"❌ ERROR: Unexpected error during analysis: {e}")
-        return "Sorry, an unexpected error occurred during analysis."
+        raise AnalysisError("Sorry, an unexpected error occurred during analysis.") from e
+
+
+class ReportProcessingError(Exception):
+    """A report could not be processed; the message is safe to show to the user."""
+    status_code = status.HTTP_400_BAD_REQUEST
+
+
+class ReportTooLargeError(ReportProcessingError):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+
+# Multipart boundaries and headers around the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+def too_large_error():
+    limit_mb = settings.REPORT_UPLOAD_MAX_BYTES / (1024 * 1024)
+    return ReportTooLargeError(f"The file is too large. Please upload a report smaller than {limit_mb:g} MB.")
+
+
+def get_report_upload(request):
+    """
+    Return the uploaded report file after checking its size and type, before any
+    parsing. Oversized requests are refused from their Content-Length, so the
+    body is never read.
+    """
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        content_length = 0
+    if content_length > settings.REPORT_UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD_BYTES:
+        raise too_large_error()
+
+    if 'report_file' not in request.FILES:
+        raise ReportProcessingError("No file provided.")
+    uploaded_file = request.FILES['report_file']
+    if uploaded_file.size > settings.REPORT_UPLOAD_MAX_BYTES:
+        raise too_large_error()
+    check_report_file(uploaded_file)
+    return uploaded_file
+
+
+def check_report_file(report_file):
+    """Return PDF or IMAGE from the file's magic bytes; raise ReportProcessingError for anything else."""
+    kind = sniff_report_type(report_file)
+    if kind is None:
+        raise ReportProcessingError("Unsupported file format. Please upload an image (JPG, PNG, etc.) or PDF file.")
+    return kind
+
+
+def extract_report_text(report_file, file_name, on_stage):
+    """Extract the text of a PDF or image report; raises ReportProcessingError when nothing readable is found."""
+    kind = check_report_file(report_file)
+
+    # Determine file type and extract text accordingly
+    on_stage(ReportJob.EXTRACTING)
+    if kind == PDF:
+        print(f"[INFO] Processing PDF file '{file_name}'...")
+        extracted_text = extract_text_from_pdf(report_file, on_stage=on_stage)
+    else:
+        print(f"[INFO] Processing image file '{file_name}'...")
+        on_stage(ReportJob.OCR)
+        extracted_text = extract_text_from_image(report_file)
+
+    # Check if text extraction was successful
+    if not extracted_text or len(extracted_text.strip()) < 10:
+        error_msg = "Could not extract readable text from the uploaded file. "
+        if kind == PDF:
+            error_msg += "This PDF might be password-protected, corrupted, or contain only images. Try converting it to an image first."
+        else:
+            error_msg += "The image might be too blurry, low resolution, or contain unreadable text."
+        raise ReportProcessingError(error_msg)
+
+    print("[SUCCESS] Text extracted from file.")
+    print(f"[DEBUG] Extracted text preview: {extracted_text[:200]}...")
+    return extracted_text
+
+
+def stream_report_analysis(report_text):
+    """
+    Yield the analysis as the LLM generates it (Gemini's streamGenerateContent
+    endpoint in SSE mode). Raises LLMError, or requests exceptions from a
+    stream that breaks midway, so the caller can report the failure.
+    """
+    try:
+        prompt = build_report_prompt(report_text)
+    except AnalysisError as e:
+        raise LLMError(str(e), 'http')
+
+    print("[INFO] Streaming analysis from Gemini...")
+    yield from llm_client.get_client().stream(prompt)
+
+
+def sse_event(event, data):
+    """One Server-Sent Event with a JSON payload (JSON keeps newlines in the markdown intact)."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def text_preview(extracted_text):
+    return extracted_text[:500] + "..." if len(extracted_text) > 500 else extracted_text
+
+
+def stored_report_text(digest):
+    """The text of an earlier upload of the same file, from the cache or else the database (re-cached), or None."""
+    extracted_text = result_cache.get_text(digest)
+    if extracted_text is None:
+        blob = ReportText.objects.filter(content_hash=digest).first()
+        if blob is not None:
+            print(f"[INFO] Loaded stored text for report {digest[:12]}")
+            extracted_text = blob.text
+            result_cache.set_text(digest, extracted_text)
+    return extracted_text
+
+
+def stored_llm_analysis(digest):
+    """The LLM analysis of an earlier upload of the same file, from the cache or else the database, or None."""
+    cached = result_cache.get_analysis(digest)
+    if cached is not None:
+        return cached["analysis"]
+    return Report.objects.latest_llm_analysis(digest)
+
+
+def get_report_text(report_file, file_name, digest, on_stage):
+    """The report's text as stored for an earlier upload, or freshly extracted (and stored)."""
+    extracted_text = stored_report_text(digest)
+    if extracted_text is None:
+        extracted_text = extract_report_text(report_file, file_name, on_stage)
+        result_cache.set_text(digest, extracted_text)
+        ReportText.store(digest, extracted_text)
+    else:
+        print(f"[INFO] Reusing stored text for report {digest[:12]}")
+    return extracted_text
+
+
+class StageTimer:
+    """Wraps an on_stage callback and records the seconds spent in each stage."""
+
+    def __init__(self, on_stage=None):
+        self.on_stage = on_stage or (lambda stage: None)
+        self.timings = {}
+        self.stage = None
+        self.started = self.stage_started = time.perf_counter()
+
+    def __call__(self, stage):
+        self.end_stage()
+        self.stage = stage
+        self.on_stage(stage)
+
+    def end_stage(self):
+        now = time.perf_counter()
+        if self.stage is not None:
+            self.timings[self.stage] = round(self.timings.get(self.stage, 0) + now - self.stage_started, 3)
+        self.stage, self.stage_started = None, now
+
+    def finish(self):
+        self.end_stage()
+        return {**self.timings, "total": round(time.perf_counter() - self.started, 3)}
+
+
+ENRICH_MODES = ('auto', 'always', 'never')
+
+# LLM calls run here so a request can stop waiting for them (see process_report)
+_llm_executor = None
+_llm_executor_lock = threading.Lock()
+
+
+def patient_details(user):
+    """Sex and age from the user's profile, for choosing reference ranges (None when unknown)."""
+    profile = getattr(user, 'profile', None)
+    if profile is None:
+        return {"sex": None, "age": None}
+    return {"sex": profile.gender, "age": profile.age}
+
+
+def get_enrich_mode(request):
+    """
+    Whether to ask the LLM: 'auto' (only when no lab values were recognised),
+    'always' or 'never'. Defaults to REPORT_LLM_ENRICHMENT.
+    """
+    enrich = request.data.get('enrich') or settings.REPORT_LLM_ENRICHMENT
+    if enrich not in ENRICH_MODES:
+        raise ReportProcessingError(f"enrich must be one of: {', '.join(ENRICH_MODES)}.")
+    return enrich
+
+
+def wants_llm(enrich, lab_values):
+    return enrich == 'always' or (enrich == 'auto' and not lab_values)
+
+
+def local_report_result(extracted_text, lab_values):
+    """Response payload built from the locally flagged lab values alone, without an LLM call."""
+    return {
+        "analysis": format_lab_summary(lab_values),
+        "analysis_source": "local",
+        "lab_values": lab_values,
+        "extracted_text_preview": text_preview(extracted_text),
+    }
+
+
+def cached_report_result(digest, patient, enrich):
+    """
+    The response payload for an upload whose text is already stored, when it needs
+    no LLM call or the LLM analysis is stored too; otherwise None. Lab values are
+    always flagged afresh since the ranges depend on the patient.
+    """
+    extracted_text = stored_report_text(digest)
+    if extracted_text is None:
+        return None
+    lab_values = parse_lab_values(extracted_text, **patient)
+    if not wants_llm(enrich, lab_values):
+        return local_report_result(extracted_text, lab_values)
+    analysis = stored_llm_analysis(digest)
+    if analysis is None:
+        return None
+    print(f"[INFO] Serving stored analysis for report {digest[:12]}")
+    return {
+        "analysis": analysis,
+        "analysis_source": "llm",
+        "lab_values": lab_values,
+        "extracted_text_preview": text_preview(extracted_text),
+    }
+
+
+def llm_executor():
+    global _llm_executor
+    with _llm_executor_lock:
+        if _llm_executor is None:
+            _llm_executor = ThreadPoolExecutor(max_workers=settings.REPORT_LLM_MAX_CONCURRENT_CALLS,
+                                               thread_name_prefix='report-llm')
+        return _llm_executor
+
+
+def analyze_and_cache(extracted_text, digest):
+    """Run the LLM analysis and cache it (AnalysisError propagates); runs on the llm_executor threads."""
+    analysis = analyze_report_with_gemini(extracted_text)
+    result_cache.set_analysis(digest, {"analysis": analysis, "extracted_text_preview": text_preview(extracted_text)})
+    return analysis
+
+
+def process_report(report_file, file_name, on_stage=None, digest=None, patient=None, enrich=None, on_fallback=None):
+    """
+    Extract the text of an uploaded report, flag its lab values and, depending on
+    `enrich` (see get_enrich_mode), analyze it with the LLM. on_stage(stage) is
+    called as processing moves through extracting, ocr and analyzing; the
+    payload's `timings` holds the seconds spent in each. Text and LLM analyses
+    are cached and stored under the SHA-256 of the file (`digest`, computed if
+    not given), so a repeat upload does no extraction, OCR or LLM work.
+
+    If the LLM has not answered within REPORT_LLM_LATENCY_BUDGET_SECONDS, the
+    local summary is returned with llm_pending set, and on_fallback(future) is
+    called with the still running call so the caller can attach its answer to
+    a job (see jobs.attach_late_analysis). Returns the response payload; raises
+    ReportProcessingError for problems the user can fix.
+    """
+    timer = StageTimer(on_stage)
+    result = report_result(report_file, file_name, timer, digest, patient or {},
+                           enrich or settings.REPORT_LLM_ENRICHMENT, on_fallback)
+    return {**result, "timings": timer.finish()}
+
+
+def report_result(report_file, file_name, on_stage, digest, patient, enrich, on_fallback):
+    check_report_file(report_file)
+    digest = digest or result_cache.content_hash(report_file)
+
+    cached = cached_report_result(digest, patient, enrich)
+    if cached is not None:
+        return cached
+
+    extracted_text = get_report_text(report_file, file_name, digest, on_stage)
+    lab_values = parse_lab_values(extracted_text, **patient)
+    if not wants_llm(enrich, lab_values):
+        print(f"[INFO] {len(lab_values)} lab value(s) flagged locally, no LLM call needed")
+        return local_report_result(extracted_text, lab_values)
+
+    # Get AI Analysis, but do not wait for it longer than the latency budget
+    on_stage(ReportJob.ANALYZING)
+    future = llm_executor().submit(analyze_and_cache, extracted_text, digest)
+    budget = settings.REPORT_LLM_LATENCY_BUDGET_SECONDS
+    try:
+        analysis, source = future.result(timeout=budget or None), "llm"
+    except FutureTimeoutError:
+        print(f"[WARNING] No LLM answer within {budget:g}s, returning the local summary for now")
+        if on_fallback:
+            on_fallback(future)
+        return {**local_report_result(extracted_text, lab_values), "llm_pending": True}
+    except AnalysisError as e:
+        if lab_values:
+            print("[WARNING] LLM analysis failed, returning the local lab-value summary instead")
+            return local_report_result(extracted_text, lab_values)
+        # A failed call is saved to the history as such, never served again as a stored analysis
+        analysis, source = str(e), "failed"
+
+    return {
+        "analysis": analysis,
+        "analysis_source": source,
+        "lab_values": lab_values,
+        "extracted_text_preview": text_preview(extracted_text),
+    }
+
 
 class ReportAnalysisView(APIView):
     """
     API view to upload a medical report (image or PDF), perform text extraction,
-    and get an AI-powered analysis.
+    flag its lab values and, when needed, get an AI-powered analysis in the same
+    request. If the LLM misses its latency budget the local summary is returned
+    with a job_id whose job receives the LLM answer later. Prefer
+    ReportJobListView, which returns at once and does the work in the background.
     """
     permission_classes = [IsAuthenticated]
     parser_classes = (MultiPartParser, FormParser)
 
     def post(self, request, *args, **kwargs):
-        if 'report_file' not in request.FILES:
-            return Response({"error": "No file provided."}, status=status.HTTP_400_BAD_REQUEST)
-
-        uploaded_file = request.FILES['report_file']
-        file_name = uploaded_file.name.lower()
-
         try:
-            extracted_text = None
-            
-            # Determine file type and extract text accordingly
-            if file_name.endswith('.pdf'):
-                print(f"[INFO] Processing PDF file '{uploaded_file.name}'...")
-                extracted_text = extract_text_from_pdf(uploaded_file)
-                
-            elif any(file_name.endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif']):
-                print(f"[INFO] Processing image file '{uploaded_file.name}'...")
-                extracted_text = extract_text_from_image(uploaded_file)
-                
-            else:
-                return Response({
-                    "error": "Unsupported file format. Please upload an image (JPG, PNG, etc.) or PDF file."
-                }, status=status.HTTP_400_BAD_REQUEST)
-
-            # Check if text extraction was successful
-            if not extracted_text or len(extracted_text.strip()) < 10:
-                error_msg = "Could not extract readable text from the uploaded file. "
-                if file_name.endswith('.pdf'):
-                    error_msg += "This PDF might be password-protected, corrupted, or contain only images. Try converting it to an image first."
-                else:
-                    error_msg += "The image might be too blurry, low resolution, or contain unreadable text."
-                    
-                return Response({"error": error_msg}, status=status.HTTP_400_BAD_REQUEST)
-            
-            print("[SUCCESS] Text extracted from file.")
-            print(f"[DEBUG] Extracted text preview: {extracted_text[:200]}...")
-            
-            # Get AI Analysis
-            analysis = analyze_report_with_gemini(extracted_text)
-            
+            uploaded_file = get_report_upload(request)
+            digest = result_cache.content_hash(uploaded_file)
+            pending = []
+            result = process_report(uploaded_file, uploaded_file.name, digest=digest, patient=patient_details(request.user),
+                                    enrich=get_enrich_mode(request), on_fallback=pending.append)
+            report = Report.objects.record(request.user, uploaded_file.name, digest, result)
+            result["report_id"] = str(report.id)
+            if pending:
+                # The LLM answer lands on a job the client can poll for
+                job = create_finished_job(request.user, uploaded_file.name, digest, result, report=report)
+                attach_late_analysis(job.id, pending[0])
+                result["job_id"] = str(job.id)
+                result["status_url"] = request.build_absolute_uri(reverse('report-job-detail', args=[job.id]))
+            return Response(result, status=status.HTTP_200_OK)
+        except ReportProcessingError as e:
+            return Response({"error": str(e)}, status=e.status_code)
+        except Exception as e:
+            print(f"❌ ERROR: An unexpected error occurred: {e}")
             return Response({
-                "analysis": analysis,
-                "extracted_text_preview": extracted_text[:500] + "..." if len(extracted_text) > 500 else extracted_text
-            }, status=status.HTTP_200_OK)
+                "error": "An internal error occurred during processing."
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+
+def stream_analysis_events(extracted_text, digest, lab_values, on_done=None):
+    """
+    SSE events for one report: meta (text preview, lab values), chunk per piece of
+    markdown, then done or error. on_done(result) receives the finished result.
+    """
+    preview = text_preview(extracted_text)
+    yield sse_event('meta', {"extracted_text_preview": preview, "lab_values": lab_values})
+
+    chunks = []
+    try:
+        for chunk in stream_report_analysis(extracted_text):
+            chunks.append(chunk)
+            yield sse_event('chunk', {"text": chunk})
+    except Exception as e:
+        print(f"❌ ERROR: An error occurred while streaming the Gemini analysis: {e}")
+        yield sse_event('error', {"error": "Sorry, an error occurred while analyzing the report."})
+        return
+
+    analysis = "".join(chunks)
+    if analysis:
+        result_cache.set_analysis(digest, {"analysis": analysis, "extracted_text_preview": preview})
+    if on_done:
+        on_done({"analysis": analysis, "analysis_source": "llm", "lab_values": lab_values,
+                 "extracted_text_preview": preview})
+    print("[SUCCESS] Streamed analysis finished.")
+    yield sse_event('done', {"analysis": analysis, "analysis_source": "llm"})
+
+
+class ReportAnalysisStreamView(APIView):
+    """
+    Like ReportAnalysisView, but relays the analysis to the client as Server-Sent
+    Events while Gemini is still generating it, so the first words show up
+    after the first chunk instead of after the whole answer. The locally
+    flagged lab values arrive in the first (meta) event. Text extraction
+    happens before the stream starts; its errors are plain JSON responses.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = (MultiPartParser, FormParser)
+
+    def post(self, request, *args, **kwargs):
+        try:
+            uploaded_file = get_report_upload(request)
+            enrich = get_enrich_mode(request)
+            patient = patient_details(request.user)
+            digest = result_cache.content_hash(uploaded_file)
+            result = cached_report_result(digest, patient, enrich)
+            if result is None:
+                extracted_text = get_report_text(uploaded_file, uploaded_file.name, digest, on_stage=lambda stage: None)
+                lab_values = parse_lab_values(extracted_text, **patient)
+                if not wants_llm(enrich, lab_values):
+                    result = local_report_result(extracted_text, lab_values)
+        except ReportProcessingError as e:
+            return Response({"error": str(e)}, status=e.status_code)
         except Exception as e:
             print(f"❌ ERROR: An unexpected error occurred: {e}")
             return Response({
                 "error": "An internal error occurred during processing."
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        def record(result):
+            Report.objects.record(request.user, uploaded_file.name, digest, result)
+
+        if result is not None:
+            record(result)
+            events = iter([
+                sse_event('meta', {"extracted_text_preview": result["extracted_text_preview"],
+                                   "lab_values": result["lab_values"]}),
+                sse_event('chunk', {"text": result["analysis"]}),
+                sse_event('done', {"analysis": result["analysis"], "analysis_source": result["analysis_source"]}),
+            ])
+        else:
+            events = stream_analysis_events(extracted_text, digest, lab_values, on_done=record)
+
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+        return response
+
+
+def serialize_job(job):
+    data = {
+        "job_id": str(job.id),
+        "file_name": job.original_name,
+        "status": job.status,
+        "stage": job.get_status_display(),
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+        "finished_at": job.finished_at,
+        "report_id": str(job.report_id) if job.report_id else None,
+    }
+    if job.status == ReportJob.DONE:
+        data["analysis"] = job.analysis
+        data["analysis_source"] = job.analysis_source
+        data["llm_pending"] = job.llm_pending
+        data["lab_values"] = job.lab_values
+        data["extracted_text_preview"] = job.extracted_text_preview
+    elif job.status == ReportJob.FAILED:
+        data["error"] = job.error
+    return data
+
+
+class ReportJobListView(APIView):
+    """
+    Queues an uploaded report for analysis and returns the job id straight away
+    (202). The client polls ReportJobDetailView until the job is done or failed.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = (MultiPartParser, FormParser)
+
+    def post(self, request, *args, **kwargs):
+        try:
+            uploaded_file = get_report_upload(request)
+            enrich = get_enrich_mode(request)
+        except ReportProcessingError as e:
+            return Response({"error": str(e)}, status=e.status_code)
+
+        job = enqueue_report(request.user, uploaded_file, enrich)
+        data = serialize_job(job)
+        data["status_url"] = request.build_absolute_uri(reverse('report-job-detail', args=[job.id]))
+        return Response(data, status=status.HTTP_202_ACCEPTED)
+
+
+class ReportJobDetailView(APIView):
+    """Returns the current stage of one of the user's report jobs, and the analysis once done."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id, *args, **kwargs):
+        job = get_object_or_404(ReportJob, pk=job_id, user=request.user)
+        return Response(serialize_job(job))
+
+
+
+class LLMMetricsView(APIView):
+    """Admin-only view exposing this process's LLM call counters: latency, tokens, retries and errors."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        client = llm_client.get_client()
+        return Response({"backend": getattr(client.backend, 'name', type(client.backend).__name__), **client.metrics.snapshot()})
+
+
+class ReportHistoryPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+def serialize_report(report):
+    return {
+        "report_id": str(report.id),
+        "file_name": report.original_name,
+        "analysis_source": report.analysis_source,
+        "text_length": report.text.length if report.text_id else None,
+        "created_at": report.created_at,
+    }
+
+
+class ReportHistoryView(APIView):
+    """
+    The user's analyzed reports, newest first, paginated (?page=, ?page_size=).
+    Only the summary columns are loaded; the stored text and the analysis are
+    left to ReportHistoryDetailView.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        reports = (Report.objects.filter(user=request.user).select_related('text')
+                   .only('id', 'original_name', 'analysis_source', 'created_at', 'text__length'))
+        paginator = ReportHistoryPagination()
+        page = paginator.paginate_queryset(reports, request, view=self)
+        return paginator.get_paginated_response([serialize_report(report) for report in page])
+
+
+class ReportHistoryDetailView(APIView):
+    """One report from the user's history, served from the database without any extraction or LLM work."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, report_id, *args, **kwargs):
+        report = get_object_or_404(Report.objects.select_related('text'), pk=report_id, user=request.user)
+        return Response({
+            **serialize_report(report),
+            "analysis": report.analysis,
+            "lab_values": report.lab_values,
+            "timings": report.timings,
+            "extracted_text": report.text.text if report.text_id else report.extracted_text_preview,
+        })
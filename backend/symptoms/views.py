@@ -4,12 +4,33 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
+from medicines.models import DiseaseMedicine
 from .ml_model import ModelService
 
 # Create an instance of the service, but DO NOT initialize the model yet.
 # This line is safe to run at startup.
 model_service = ModelService()
 
+TREATMENT_FIELDS = ['medicine_name', 'frequency', 'meal_relation', 'routine', 'side_effects', 'contraindications']
+
+def treatment_from_link(link):
+    """
+    Treatment block for the response, built from the disease's DiseaseMedicine row
+    (or N/A if missing). Links indexed before they carried details fall back to
+    the Medicine row.
+    """
+    if link is None:
+        return {field: 'N/A' for field in TREATMENT_FIELDS}
+    details = link if any(getattr(link, field) for field in TREATMENT_FIELDS[1:]) else link.medicine
+    return {'medicine_name': link.medicine_id,
+            **{field: (getattr(details, field) or 'N/A') for field in TREATMENT_FIELDS[1:]}}
+
+def treatment_from_row(treatment_info, prefix):
+    """Treatment block for the response, built from a dataset row with allopathic_/ayurvedic_ columns."""
+    columns = {field: f'{prefix}_{field}' for field in TREATMENT_FIELDS}
+    columns['medicine_name'] = f'{prefix}_medicine'
+    return {field: treatment_info.get(column, 'N/A') for field, column in columns.items()}
+
 class SymptomCheckerView(APIView):
     """
     API view that uses the improved disease prediction model.
@@ -65,34 +86,33 @@ class SymptomCheckerView(APIView):
             return Response({"error": f"An unexpected error occurred during prediction: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
         # --- 4. Retrieve Treatment Information ---
-        match = predictor.full_dataset_df[predictor.full_dataset_df['prognosis'] == predicted_disease]
+        # Prefer the disease -> medicine index (one indexed query); fall back to
+        # scanning the training DataFrame if load_medicines has not been run.
+        links = list(DiseaseMedicine.objects.for_disease(predicted_disease))
+        allopathic = next((link for link in links if link.medicine.medicine_type == 'Allopathic'), None)
+        ayurvedic = next((link for link in links if link.medicine.medicine_type == 'Ayurvedic'), None)
 
-        if match.empty:
-            treatment_info = {} # No treatment found, prepare empty dict
+        if allopathic or ayurvedic:
+            allopathic_treatment = treatment_from_link(allopathic)
+            ayurvedic_treatment = treatment_from_link(ayurvedic)
         else:
-            treatment_info = match.iloc[0].fillna('N/A').to_dict()
+            match = predictor.full_dataset_df[predictor.full_dataset_df['prognosis'] == predicted_disease]
+
+            if match.empty:
+                treatment_info = {} # No treatment found, prepare empty dict
+            else:
+                treatment_info = match.iloc[0].fillna('N/A').to_dict()
+
+            allopathic_treatment = treatment_from_row(treatment_info, 'allopathic')
+            ayurvedic_treatment = treatment_from_row(treatment_info, 'ayurvedic')
 
         # --- 5. Prepare and Send the Final Response ---
         result = {
             'predicted_disease': predicted_disease,
             'confidence': prediction_result["confidence"],
             'top_3_predictions': prediction_result["top_3_predictions"],
-            'allopathic_treatment': {
-                'medicine_name': treatment_info.get('allopathic_medicine', 'N/A'),
-                'frequency': treatment_info.get('allopathic_frequency', 'N/A'),
-                'meal_relation': treatment_info.get('allopathic_meal_relation', 'N/A'),
-                'routine': treatment_info.get('allopathic_routine', 'N/A'),
-                'side_effects': treatment_info.get('allopathic_side_effects', 'N/A'),
-                'contraindications': treatment_info.get('allopathic_contraindications', 'N/A'),
-            },
-            'ayurvedic_treatment': {
-                'medicine_name': treatment_info.get('ayurvedic_medicine', 'N/A'),
-                'frequency': treatment_info.get('ayurvedic_frequency', 'N/A'),
-                'meal_relation': treatment_info.get('ayurvedic_meal_relation', 'N/A'),
-                'routine': treatment_info.get('ayurvedic_routine', 'N/A'),
-                'side_effects': treatment_info.get('ayurvedic_side_effects', 'N/A'),
-                'contraindications': treatment_info.get('ayurvedic_contraindications', 'N/A'),
-            }
+            'allopathic_treatment': allopathic_treatment,
+            'ayurvedic_treatment': ayurvedic_treatment,
         }
 
         return Response(result, status=status.HTTP_200_OK)
\ No newline at end of file
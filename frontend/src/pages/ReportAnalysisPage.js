@@ -4,12 +4,15 @@ import ReactMarkdown from 'react-markdown';
 import api from '../api/axiosConfig';
 import './ReportAnalysisPage.css'; // Import CSS file
 
+const JOB_POLL_INTERVAL_MS = 2000;
+
 const ReportAnalysisPage = () => {
     const [selectedFile, setSelectedFile] = useState(null);
     const [preview, setPreview] = useState(null);
     const [loading, setLoading] = useState(false);
     const [error, setError] = useState('');
     const [result, setResult] = useState(null);
+    const [stage, setStage] = useState('');
     const fileInputRef = useRef();
 
     const handleFileChange = (e) => {
@@ -33,6 +36,14 @@ const ReportAnalysisPage = () => {
         }
     };
 
+    const refreshPendingAnalysis = async (job) => {
+        while (job.llm_pending) {
+            await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+            job = (await api.get(`/reports/jobs/${job.job_id}/`)).data;
+        }
+        setResult(job.analysis);
+    };
+
     const handleSubmit = async (e) => {
         e.preventDefault();
         if (!selectedFile) {
@@ -48,16 +59,32 @@ const ReportAnalysisPage = () => {
         formData.append('report_file', selectedFile);
 
         try {
-            const response = await api.post('/reports/analyze/', formData, {
+            // The upload only queues the report; poll the job until it is done
+            const response = await api.post('/reports/jobs/', formData, {
                 headers: {
                     'Content-Type': 'multipart/form-data',
                 },
             });
-            setResult(response.data.analysis);
+            let job = response.data;
+            while (job.status !== 'done' && job.status !== 'failed') {
+                setStage(job.stage);
+                await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+                job = (await api.get(`/reports/jobs/${job.job_id}/`)).data;
+            }
+            if (job.status === 'done') {
+                setResult(job.analysis);
+                if (job.llm_pending) {
+                    // A quick local summary is shown; swap in the detailed analysis once it arrives
+                    refreshPendingAnalysis(job).catch(() => {});
+                }
+            } else {
+                setError(job.error || 'Failed to analyze the report.');
+            }
         } catch (err) {
             setError(err.response?.data?.error || 'Failed to analyze the report.');
         } finally {
             setLoading(false);
+            setStage('');
         }
     };
 
@@ -161,7 +188,7 @@ const ReportAnalysisPage = () => {
                                             {loading ? (
                                                 <>
                                                     <Spinner as="span" animation="border" size="sm" className="me-2" />
-                                                    Analyzing Report...
+                                                    {stage ? `${stage}...` : 'Analyzing Report...'}
                                                 </>
                                             ) : (
                                                 <>